@@ -0,0 +1,24 @@
+"""
+Algorithms used by the benchmark topologies.
+
+Every node of a generated config needs its own registered name, so the configs declare each name against one of
+these classes (see Factory.declare) instead of registering them here.
+"""
+
+
+class Transform():
+    """ A cheap vectorised column transform, so the measurements are dominated by DataPipes itself. """
+
+    def update(self, subject):
+        data = subject.pubsub_message['data']
+        self.PubSub.pubsub_message['data'] = data.assign(score=data['x'] * 2.0 + data['y'])
+        self.notify()
+
+
+class Aggregate():
+    """ Publishes the per-key mean of each message, the shape of a typical reducing step. """
+
+    def update(self, subject):
+        data = subject.pubsub_message['data']
+        self.PubSub.pubsub_message['data'] = data.groupby('key', as_index=False)[['x', 'y']].mean()
+        self.notify()
@@ -0,0 +1,133 @@
+"""
+DataPipes benchmark suite.
+
+Generates synthetic inputs, builds a config per topology and format, times DataSpigot.on end to end, then runs each
+config once more with tracing on for the per-stage breakdown, and writes everything to a JSON results file.
+
+    python benchmarks/bench.py --rows 1000000 --size 8 --out results.json
+    python benchmarks/compare.py baseline.json results.json
+"""
+import json, os, platform, shutil, statistics, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+from importlib import metadata
+
+import click
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+from datapipes.run import DataSpigot
+from topologies import TOPOLOGIES, build_config, write_inputs
+
+
+def _versions():
+    versions = {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count()}
+    try:
+        versions['datapipes'] = metadata.version('DataPipes')
+    except metadata.PackageNotFoundError:
+        versions['datapipes'] = None
+    for module in ('pandas', 'numpy', 'pyarrow'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    try:
+        versions['commit'] = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True, text=True,
+                                            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        versions['commit'] = None
+    return versions
+
+
+def _write_config(cfg, file_name):
+    with open(file_name, 'w') as fp:
+        yaml.safe_dump(cfg, fp, sort_keys=False)
+    return file_name
+
+
+def _stages(trace_path):
+    """ The per-node summaries of every run's trace, keyed 'run/node'. """
+    stages = {}
+    for file_name in sorted(os.listdir(trace_path)):
+        if file_name.endswith('.trace.json'):
+            run = file_name[:-len('.trace.json')]
+            with open(os.path.join(trace_path, file_name)) as fp:
+                for node, summary in json.load(fp)['summary'].items():
+                    stages[f'{run}/{node}'] = summary
+    return stages
+
+
+def run_case(cfg, workdir, name, rows, repeat):
+    """ Times one config end to end `repeat` times, then once traced. """
+    out_path = cfg['independent_runs'][next(iter(cfg['independent_runs']))]['data_output']
+    out_path = next(iter(out_path.values()))['path']
+
+    timings = []
+    cfg_file = _write_config(cfg, os.path.join(workdir, f'{name}.yml'))
+    for _ in range(repeat):
+        shutil.rmtree(out_path, ignore_errors=True)
+        start = time.perf_counter()
+        DataSpigot(cfg_file).on()
+        timings.append(time.perf_counter() - start)
+
+    trace_path = os.path.join(workdir, f'{name}_trace')
+    shutil.rmtree(out_path, ignore_errors=True)
+    traced = _write_config(dict(cfg, trace={'path': trace_path}), os.path.join(workdir, f'{name}_traced.yml'))
+    DataSpigot(traced).on()
+
+    runs = len(cfg['independent_runs'])
+    return {'wall_seconds': timings,
+            'min_seconds': min(timings),
+            'median_seconds': statistics.median(timings),
+            'rows_per_second': rows * runs / min(timings),
+            'stages': _stages(trace_path)}
+
+
+@click.command()
+@click.option('--rows', default=100000, help='Rows of synthetic input.')
+@click.option('--columns', default=8, help='Columns of synthetic input.')
+@click.option('--size', default=4, help='Width of fanout and diamond, depth of chain, number of independent runs.')
+@click.option('--topology', 'topologies', multiple=True, default=TOPOLOGIES, help=f'Topologies to run: {", ".join(TOPOLOGIES)}.')
+@click.option('--format', 'formats', multiple=True, default=('csv', 'parquet'), help='Input/output formats: csv, parquet.')
+@click.option('--data-mode', default='batch', help='batch or stream.')
+@click.option('--executor', default='sync', help='Batch executor: sync, thread or process.')
+@click.option('--chunksize', default=None, type=int, help='Read sources in chunks of this many rows.')
+@click.option('--max-parallel-runs', default=1, help='Worker processes for the independent runs.')
+@click.option('--repeat', default=3, help='Timed repetitions per case.')
+@click.option('--seed', default=0, help='Seed of the synthetic input.')
+@click.option('--workdir', default=None, help='Where inputs, configs and outputs go. A temporary directory by default.')
+@click.option('--out', default='benchmark_results.json', help='The JSON results file.')
+def bench(rows, columns, size, topologies, formats, data_mode, executor, chunksize, max_parallel_runs, repeat, seed,
+          workdir, out):
+    workdir = workdir or tempfile.mkdtemp(prefix='datapipes_bench_')
+    data_path = os.path.join(workdir, 'data')
+    write_inputs(data_path, rows, columns, tuple(formats), seed)
+
+    results = []
+    for topology in topologies:
+        for data_format in formats:
+            name = f'{topology}_{data_format}'
+            cfg, nodes = build_config(topology, size, data_format, data_path, os.path.join(workdir, 'out', name), chunksize)
+            cfg.update({'data_mode': data_mode, 'executor': executor, 'max_parallel_runs': max_parallel_runs})
+
+            result = run_case(cfg, workdir, name, rows, repeat)
+            result.update({'topology': topology, 'format': data_format, 'nodes': nodes})
+            results.append(result)
+            click.echo(f'{name:<20} {nodes:>4} nodes  min {result["min_seconds"]:8.3f}s  '
+                       f'median {result["median_seconds"]:8.3f}s  {result["rows_per_second"]:12.0f} rows/s')
+
+    report = {'created': datetime.now(timezone.utc).isoformat(),
+              'versions': _versions(),
+              'parameters': {'rows': rows, 'columns': columns, 'size': size, 'data_mode': data_mode,
+                             'executor': executor, 'chunksize': chunksize, 'max_parallel_runs': max_parallel_runs,
+                             'repeat': repeat, 'seed': seed},
+              'results': results}
+    with open(out, 'w') as fp:
+        json.dump(report, fp, indent=2)
+    click.echo(f'results written to {out} (inputs and outputs in {workdir})')
+
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,31 @@
+"""
+Compares two benchmark results files case by case.
+
+    python benchmarks/compare.py baseline.json results.json
+"""
+import json
+
+import click
+
+
+@click.command()
+@click.argument('baseline', type=click.Path(exists=True))
+@click.argument('candidate', type=click.Path(exists=True))
+@click.option('--threshold', default=0.05, help='Relative change reported as a regression or an improvement.')
+def compare(baseline, candidate, threshold):
+    with open(baseline) as fp:
+        before = {(result['topology'], result['format']): result for result in json.load(fp)['results']}
+    with open(candidate) as fp:
+        after = {(result['topology'], result['format']): result for result in json.load(fp)['results']}
+
+    for case in sorted(before.keys() & after.keys()):
+        old, new = before[case]['min_seconds'], after[case]['min_seconds']
+        change = (new - old) / old if old else 0.0
+        verdict = 'slower' if change > threshold else 'faster' if change < -threshold else ''
+        click.echo(f'{case[0] + "_" + case[1]:<20} {old:8.3f}s -> {new:8.3f}s  {change:+7.1%}  {verdict}')
+    for case in sorted(before.keys() ^ after.keys()):
+        click.echo(f'{case[0] + "_" + case[1]:<20} only in {"baseline" if case in before else "candidate"}')
+
+
+if __name__ == '__main__':
+    compare()
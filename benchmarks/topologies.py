@@ -0,0 +1,115 @@
+"""
+Synthetic inputs and the YAML configurations of the benchmarked graph topologies.
+"""
+import os
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+TOPOLOGIES = ('fanout', 'chain', 'diamond', 'runs')
+
+_ALGORITHMS = 'algorithms:Transform'
+_AGGREGATE = 'algorithms:Aggregate'
+
+
+def make_frame(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+    """ A reproducible frame with a low-cardinality 'key', float columns 'x', 'y' and columns-3 more floats. """
+    rng = np.random.default_rng(seed)
+    data = {'key': rng.integers(0, 1000, rows), 'x': rng.random(rows), 'y': rng.random(rows)}
+    for i in range(max(0, columns - 3)):
+        data[f'c{i}'] = rng.random(rows)
+    return pd.DataFrame(data)
+
+
+def write_inputs(path: str, rows: int, columns: int, formats: Tuple[str, ...], seed: int = 0) -> Dict[str, str]:
+    """ Writes the synthetic input once per format. Returns each format's file name. """
+    os.makedirs(path, exist_ok=True)
+    frame = make_frame(rows, columns, seed)
+    files = {}
+    for data_format in formats:
+        file_name = os.path.join(path, f'input.{data_format}')
+        if data_format == 'csv':
+            frame.to_csv(file_name, index=False)
+        elif data_format == 'parquet':
+            frame.to_parquet(file_name, index=False)
+        else:
+            raise NotImplementedError(f'Format {data_format} not implemented for the benchmarks. Format options include: "csv" or "parquet"')
+        files[data_format] = file_name
+    return files
+
+
+def _source(data_format: str, data_path: str, observers, chunksize: int = None) -> Dict[str, Any]:
+    source = {'format': data_format, 'key': 'input', 'path': data_path, 'observers': observers}
+    if chunksize:
+        source['chunksize'] = chunksize
+    return source
+
+
+def _output(data_format: str, out_path: str, key: str) -> Dict[str, Any]:
+    return {'format': data_format, 'key': key, 'path': out_path}
+
+
+def build_config(topology: str, size: int, data_format: str, data_path: str, out_path: str,
+                 chunksize: int = None) -> Tuple[Dict[str, Any], int]:
+    """
+    The YAML configuration of one topology.
+
+    Args:
+        topology: 'fanout' (one source feeding `size` algorithms), 'chain' (`size` algorithms in a line), 'diamond'
+        (a split into `size` branches joined by an aggregate) or 'runs' (`size` independent runs).
+        size: the width, depth or number of runs.
+        data_format: 'csv' or 'parquet', for the source and the outputs.
+        data_path: the directory holding the synthetic input.
+        out_path: the directory the outputs are written to.
+        chunksize: (optional) read the source in chunks of this many rows.
+
+    Returns:
+        The configuration and its number of algorithm nodes.
+    """
+    plugins = {}
+    runs = {}
+
+    if topology == 'fanout':
+        names = [f'fanout_{i}' for i in range(size)]
+        plugins.update({name: _ALGORITHMS for name in names})
+        runs['fanout'] = {'data_sources': {'src': _source(data_format, data_path, names, chunksize)},
+                          'algorithms': {name: {'observers': [f'out_{i}']} for i, name in enumerate(names)},
+                          'data_output': {f'out_{i}': _output(data_format, out_path, f'fanout_{i}') for i in range(size)}}
+
+    elif topology == 'chain':
+        names = [f'chain_{i}' for i in range(size)]
+        plugins.update({name: _ALGORITHMS for name in names})
+        algorithms = {name: {'observers': [names[i + 1] if i + 1 < size else 'out']} for i, name in enumerate(names)}
+        runs['chain'] = {'data_sources': {'src': _source(data_format, data_path, names[:1], chunksize)},
+                         'algorithms': algorithms,
+                         'data_output': {'out': _output(data_format, out_path, 'chain')}}
+
+    elif topology == 'diamond':
+        names = [f'diamond_{i}' for i in range(size)]
+        plugins.update({name: _ALGORITHMS for name in ['diamond_split'] + names})
+        plugins['diamond_join'] = _AGGREGATE
+        algorithms = {'diamond_split': {'observers': names}}
+        algorithms.update({name: {'observers': ['diamond_join']} for name in names})
+        algorithms['diamond_join'] = {'observers': ['out']}
+        runs['diamond'] = {'data_sources': {'src': _source(data_format, data_path, ['diamond_split'], chunksize)},
+                           'algorithms': algorithms,
+                           'data_output': {'out': _output(data_format, out_path, 'diamond')}}
+
+    elif topology == 'runs':
+        for i in range(size):
+            plugins[f'run_{i}'] = _ALGORITHMS
+            runs[f'run_{i}'] = {'data_sources': {'src': _source(data_format, data_path, [f'run_{i}'], chunksize)},
+                                'algorithms': {f'run_{i}': {'observers': ['out']}},
+                                'data_output': {'out': _output(data_format, out_path, f'run_{i}')}}
+
+    else:
+        raise NotImplementedError(f'Topology {topology} not implemented for the benchmarks. Topology options include: {TOPOLOGIES}')
+
+    cfg = {'run_strategy': 'local',
+           'data_mode': 'batch',
+           'log_level': 'warning',
+           'log_format': 'text',
+           'plugins': plugins,
+           'independent_runs': runs}
+    return cfg, len(plugins)
@@ -0,0 +1,121 @@
+"""
+Streaming gzip and zstd file handles for the strategies.
+
+Reads decompress as they go, without a temporary file. Writes compress blocks in parallel: zstd with its own worker
+threads, gzip as independently compressed members (which any gzip reader concatenates), like pigz.
+"""
+import gzip, io, os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = (None, 'gzip', 'zstd')
+EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+LEVELS = {'gzip': 6, 'zstd': 3}
+BLOCK_SIZE = 4 << 20
+
+
+def infer_compression(file_name: str):
+    """ The compression of a file from its extension: 'gzip' for .gz, 'zstd' for .zst, otherwise None. """
+    for compression, extension in EXTENSIONS.items():
+        if compression and file_name.endswith(extension):
+            return compression
+    return None
+
+
+def _require(compression: str) -> None:
+    if compression not in COMPRESSIONS:
+        raise NotImplementedError(f'Compression {compression} not implemented. Compression options include: "gzip" or "zstd"')
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError('zstd compression requires zstandard. Install it with "pip install zstandard".')
+
+
+def open_read(file_name: str, compression: str = None) -> BinaryIO:
+    """ A binary handle that decompresses the file as it is read. Every gzip member or zstd frame is read. """
+    _require(compression)
+    if compression == 'gzip':
+        return gzip.open(file_name, 'rb')
+    if compression == 'zstd':
+        raw = open(file_name, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader, BLOCK_SIZE)
+    return open(file_name, 'rb')
+
+
+def open_write(file_name: str, compression: str = None, append: bool = False, level: int = None,
+               threads: int = None) -> BinaryIO:
+    """
+    A binary handle that compresses what is written to it. Appending adds a new gzip member or zstd frame.
+
+    Args:
+        level: (optional) the compression level. Defaults to 6 for gzip and 3 for zstd.
+        threads: (optional) compression threads. Defaults to the number of CPUs.
+    """
+    _require(compression)
+    mode = 'ab' if append else 'wb'
+    if compression is None:
+        return open(file_name, mode)
+
+    level = LEVELS[compression] if level is None else level
+    threads = threads or os.cpu_count() or 1
+    if compression == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+        return compressor.stream_writer(open(file_name, mode), closefd=True)
+    return ParallelGzipWriter(open(file_name, mode), level, threads)
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """
+    Splits what is written into blocks and compresses each block as its own gzip member on a thread pool (zlib
+    releases the GIL), writing the members in order. At most two blocks per thread are in flight.
+
+    Args:
+        fp: the binary file the members are written to. Closed with the writer.
+        level: the gzip compression level.
+        threads: the number of compression threads.
+        block_size: (optional) the uncompressed size of each member. Defaults to 4MB.
+    """
+
+    def __init__(self, fp: BinaryIO, level: int, threads: int, block_size: int = BLOCK_SIZE):
+        super().__init__()
+        self._fp = fp
+        self._level = level
+        self._threads = threads
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='datapipes-gzip')
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._pool.submit(gzip.compress, block, self._level))
+        while len(self._pending) > 2 * self._threads:
+            self._fp.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._fp.write(self._pending.popleft().result())
+        finally:
+            self._pool.shutdown()
+            self._fp.close()
+            super().close()
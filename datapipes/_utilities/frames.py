@@ -0,0 +1,129 @@
+"""
+Helpers for the DataFrames published through the PubSub network.
+"""
+import hashlib, pickle
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+FANOUT_MODES = ('shared', 'readonly', 'copy_on_write')
+
+
+@contextmanager
+def copy_on_write(enabled: bool = True):
+    """
+    Switches on pandas copy-on-write inside the block and restores the previous setting on exit (pandas 1.5 and 2.x;
+    it is always on from pandas 3). The option is process-wide, so other threads see it while the block runs.
+    """
+    if not enabled or int(pd.__version__.split('.')[0]) >= 3:
+        yield
+        return
+    with pd.option_context('mode.copy_on_write', True):
+        yield
+
+
+def readonly_view(data):
+    """
+    A new DataFrame (or Series) object over the same column buffers, with those buffers marked read-only.
+    Observers may add, drop or reorder columns of their view, but writing values in place raises a ValueError.
+    The buffers are shared with the publisher, so its own frame becomes read-only too.
+    Extension-array columns (categoricals, nullable and Arrow dtypes) are shared as they are.
+    """
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        view = data.copy(deep=False)
+        for array in view._mgr.arrays:
+            if isinstance(array, np.ndarray):
+                array.flags.writeable = False
+        return view
+    if isinstance(data, np.ndarray):
+        view = data.view()
+        view.flags.writeable = False
+        return view
+    return data
+
+
+def fanout_view(data, mode: str = 'shared'):
+    """
+    What one observer receives of a published payload.
+
+    Args:
+        data: the published payload.
+        mode: 'shared' hands every observer the same object, 'readonly' a read-only view and 'copy_on_write' a
+        shallow copy that pandas copies on first write (see copy_on_write).
+    """
+    if mode == 'readonly':
+        return readonly_view(data)
+    if mode == 'copy_on_write' and isinstance(data, (pd.DataFrame, pd.Series)):
+        return data.copy(deep=False)
+    return data
+
+
+def fingerprint(data) -> str:
+    """
+    A sha256 hex digest of a published payload's content: the values, index, column names and dtypes of a
+    DataFrame or Series, the bytes, dtype and shape of an array, or the pickle of anything else.
+    """
+    digest = hashlib.sha256(type(data).__name__.encode())
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        dtypes = data.dtypes if isinstance(data, pd.DataFrame) else (data.name, data.dtype)
+        digest.update(repr(dtypes).encode())
+        try:
+            digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+        except TypeError:  # unhashable cells, e.g. lists
+            digest.update(pickle.dumps(data))
+    elif isinstance(data, np.ndarray):
+        digest.update(f'{data.dtype}{data.shape}'.encode())
+        digest.update(np.ascontiguousarray(data).data)
+    else:
+        digest.update(pickle.dumps(data))
+    return digest.hexdigest()
+
+
+def payload_size(data) -> tuple:
+    """ The number of records and the in-memory bytes of a published payload (shallow for object columns). """
+    if isinstance(data, pd.DataFrame):
+        return len(data), int(data.memory_usage(index=True, deep=False).sum())
+    if isinstance(data, (pd.Series, np.ndarray)):
+        return len(data), int(data.nbytes)
+    try:
+        return len(data), 0
+    except TypeError:
+        return 0, 0
+
+
+_FILTER_OPS = {'==': '__eq__', '=': '__eq__', '!=': '__ne__', '<': '__lt__', '<=': '__le__', '>': '__gt__',
+               '>=': '__ge__'}
+
+
+def row_mask(frame: pd.DataFrame, where) -> np.ndarray:
+    """
+    The boolean mask of the frame's rows a subscription selects, computed over whole columns at once.
+
+    Args:
+        frame: the published DataFrame.
+        where: a DataFrame.eval expression such as 'price > 10 and region == "EU"', a callable taking the frame and
+        returning a boolean mask, or filters in the format of the data source option: [column, op, value] triples
+        that are all required, or a list of such lists of which any one is enough.
+    """
+    if isinstance(where, str):
+        return np.asarray(frame.eval(where), dtype=bool)
+    if callable(where):
+        return np.asarray(where(frame), dtype=bool)
+
+    disjunction = [where] if isinstance(where[0][0], str) else where
+    mask = np.zeros(len(frame), dtype=bool)
+    for conjunction in disjunction:
+        selected = np.ones(len(frame), dtype=bool)
+        for column, op, value in conjunction:
+            values = frame[column]
+            if op == 'in':
+                selected &= values.isin(value).to_numpy()
+            elif op == 'not in':
+                selected &= ~values.isin(value).to_numpy()
+            elif op in _FILTER_OPS:
+                selected &= np.asarray(getattr(values, _FILTER_OPS[op])(value), dtype=bool)
+            else:
+                raise NotImplementedError(f'Filter op {op} not implemented for row_mask. Filter op options include: '
+                                          f'{tuple(_FILTER_OPS) + ("in", "not in")}')
+        mask |= selected
+    return mask
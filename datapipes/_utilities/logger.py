@@ -1,36 +1,154 @@
-import logging
+import atexit, json, logging, os, queue, threading, time
+from logging.handlers import QueueHandler, QueueListener
 
 LOGGER_NAME = 'features'
 
+_HANDLER = None
+_LISTENER = None
 
-def configure_logger(level: str = 'info', output_format: str = 'json'):
+
+class JsonFormatter(logging.Formatter):
+    """ Formats each record as one JSON object per line, escaping the message and any traceback properly. """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'level': record.levelname,
+                 'filename': record.filename,
+                 'time': self.formatTime(record),
+                 'function': record.funcName,
+                 'line': record.lineno,
+                 'message': record.getMessage()}
+        if getattr(record, 'node', None) is not None:
+            entry['node'] = record.node
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Thins out debug records, per node (records logged with extra={'node': name}) or otherwise per call site.
+    Records above debug level always pass.
+
+    Args:
+        rate_limit: (optional) the most debug records per second let through for each node or call site.
+        sample: (optional) let through only one in every `sample` debug records of each node or call site.
+    """
+
+    def __init__(self, rate_limit: float = None, sample: int = None):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.sample = sample
+        self._windows = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        key = getattr(record, 'node', None) or (record.pathname, record.lineno)
+        with self._lock:
+            if self.sample:
+                count = self._counts.get(key, 0)
+                self._counts[key] = count + 1
+                if count % self.sample:
+                    return False
+            if self.rate_limit:
+                now = time.monotonic()
+                start, passed = self._windows.get(key, (now, 0))
+                if now - start >= 1.0:
+                    start, passed = now, 0
+                if passed >= self.rate_limit:
+                    self._windows[key] = (start, passed)
+                    return False
+                self._windows[key] = (start, passed + 1)
+        return True
+
+
+class _LocalQueueHandler(QueueHandler):
     """
-    Configures the package logger.
+    Hands records to the listener thread. The records stay in this process, so only the message is merged here and
+    the formatting is left to the listener.
     """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _stop_listener():
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
+def _after_fork_in_child():
+    """ The listener thread does not survive a fork, so forked workers write their records synchronously. """
+    global _HANDLER, _LISTENER
+    if _LISTENER is None:
+        return
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.removeHandler(_HANDLER)
+    stream_handler = _LISTENER.handlers[0]
+    for record_filter in _HANDLER.filters:
+        if isinstance(record_filter, RateLimitFilter):
+            record_filter._lock = threading.Lock()
+        stream_handler.addFilter(record_filter)
+    logger.addHandler(stream_handler)
+    _HANDLER, _LISTENER = stream_handler, None
+
+
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def configure_logger(level: str = 'info', output_format: str = 'json', background: bool = True,
+                     rate_limit: float = None, sample: int = None):
+    """
+    Configures the package logger. Calling it again replaces the handler it installed before instead of adding another.
+
+    Args:
+        level: (optional) the logging level name. Defaults to 'info'.
+        output_format: (optional) 'json' (one JSON object per line) or 'text'. Defaults to 'json'.
+        background: (optional) format and write records on a background QueueListener thread, so logging calls
+        only enqueue. Defaults to True. The queue is flushed at exit or when the logger is reconfigured.
+        rate_limit: (optional) the most debug records per second per node or call site, see RateLimitFilter.
+        sample: (optional) keep one in every `sample` debug records per node or call site.
+    """
+    global _HANDLER, _LISTENER
     logger = logging.getLogger(LOGGER_NAME)
 
     logger.setLevel(logging.INFO)
     if isinstance(level, str):
         logger.setLevel(getattr(logging, level.upper(), logging.INFO))
 
-    format_str = (
-        '{'
-        + '"level": "%(levelname)s",'
-        + '"filename": "%(filename)s",'
-        + '"time": "%(asctime)s",'
-        + '"function": "%(funcName)s",'
-        + '"line": %(lineno)d,'
-        + '"message": "%(message)s"'
-        + '}'
-    )
     if output_format == 'text':
-        format_str = '%(levelname)s | %(asctime)s | %(filename)s.%(funcName)s:%(lineno)d | %(message)s'
-
-    formatter = logging.Formatter(format_str)
+        formatter = logging.Formatter('%(levelname)s | %(asctime)s | %(filename)s.%(funcName)s:%(lineno)d | %(message)s')
+    else:
+        formatter = JsonFormatter()
 
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(formatter)
 
-    logger.addHandler(stream_handler)
+    if _HANDLER is not None:
+        logger.removeHandler(_HANDLER)
+    _stop_listener()
+
+    handler = stream_handler
+    if background:
+        records = queue.SimpleQueue()
+        handler = _LocalQueueHandler(records)
+        _LISTENER = QueueListener(records, stream_handler)
+        _LISTENER.start()
+
+    if rate_limit or sample:
+        # Filtered on the calling side, so dropped records are never queued.
+        handler.addFilter(RateLimitFilter(rate_limit, sample))
+
+    logger.addHandler(handler)
+    _HANDLER = handler
 
     return logger
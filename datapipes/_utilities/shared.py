@@ -0,0 +1,224 @@
+"""
+Shared-memory transport of DataFrames between the processes of a run's pools.
+
+Instead of pickling a large DataFrame through a pipe, the sender copies its column buffers once into a
+multiprocessing.shared_memory segment and sends a small SharedFrame handle. The receiver rebuilds the frame on top of
+the segment without copying. Columns without a plain numpy dtype (strings, categoricals, nullable and
+timezone-aware columns and other extension dtypes) travel inside the handle with their dtype, pickled as before.
+
+Segments sent to pool workers are reference counted by the sender and unlinked once the last task reading them is
+done. Segments a worker sends back are unlinked by the receiver as soon as it has mapped them.
+"""
+import logging, sys, threading, uuid
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes._utilities.utilities import parse_size
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+SHARED_KINDS = 'biufcmM'  # numpy dtype kinds whose buffers are placed in shared memory
+ALIGNMENT = 64
+
+_settings = {'enabled': True, 'min_bytes': 1 << 20}
+_owned: Dict[str, list] = {}      # segment name -> [SharedMemory, readers left], in the sending process
+_attached: List[Any] = []         # SharedMemory mappings frames of this process may still use
+_lock = threading.Lock()
+
+
+def configure(enabled: bool = True, min_bytes: Any = 1 << 20) -> None:
+    """ Switches the transport on or off, and sets the smallest frame (e.g. 1048576 or '1MB') worth sharing. """
+    _settings.update(enabled=enabled, min_bytes=parse_size(min_bytes))
+
+
+def prepare() -> None:
+    """
+    Starts the resource tracker in this process before it starts a pool, so every worker shares it and segments
+    created, mapped and unlinked by different processes are tracked once.
+    """
+    if sys.platform != 'win32':
+        resource_tracker.ensure_running()
+
+
+class SharedFrame():
+    """
+    A picklable handle on a DataFrame in a shared memory segment.
+
+    Attributes:
+        name: the segment.
+        columns: the frame's column labels.
+        buffers: per column, the (dtype, offset, rows) of its values in the segment, or None for inline columns.
+        inline: the numpy or extension arrays of the columns that are not in the segment, by position.
+        index: ('range', start, stop, step, name), ('shared', dtype, offset, rows, name) or ('inline', index).
+        rows: the (start, stop) slice of rows this handle reads.
+        handed_over: whether the receiver unlinks the segment, rather than the sender.
+    """
+    __slots__ = ('name', 'columns', 'buffers', 'inline', 'index', 'rows', 'attrs', 'handed_over')
+
+    def partition(self, start: int, stop: int) -> 'SharedFrame':
+        """ A handle on rows start:stop of the same segment. """
+        handle = SharedFrame()
+        for slot in self.__slots__:
+            setattr(handle, slot, getattr(self, slot))
+        handle.rows = (self.rows[0] + start, self.rows[0] + min(stop, self.rows[1] - self.rows[0]))
+        return handle
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+
+def shareable(data: Any) -> bool:
+    """ Whether data is a DataFrame large enough to go through shared memory. """
+    return (_settings['enabled'] and isinstance(data, pd.DataFrame)
+            and int(data.memory_usage(index=True, deep=False).sum()) >= _settings['min_bytes'])
+
+
+def _values(values: Any) -> Any:
+    """
+    A column's or index's numpy array if its dtype is a numpy dtype, otherwise its extension array, as .values would
+    drop the dtype (e.g. turn a timezone-aware column into naive UTC datetimes).
+    """
+    return values.to_numpy() if isinstance(values.dtype, np.dtype) else values.array
+
+
+def share(frame: pd.DataFrame, readers: int = 1) -> SharedFrame:
+    """
+    Copies the frame's numpy column buffers (and index) into a new segment.
+
+    Args:
+        frame: the DataFrame.
+        readers: the number of release() calls after which the segment is unlinked. 0 hands the segment over to the
+        receiving process, which unlinks it in take().
+    """
+    arrays = [frame.iloc[:, position] for position in range(frame.shape[1])]
+    index = frame.index
+    layout, offset = [], 0
+    values_list = [_values(column) for column in arrays] + [_values(index)]
+    for values in values_list:
+        if isinstance(values, np.ndarray) and values.dtype.kind in SHARED_KINDS:
+            layout.append((values.dtype.str, offset, len(values)))
+            offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+        else:
+            layout.append(None)
+
+    segment = shared_memory.SharedMemory(name=f'dp_{uuid.uuid4().hex[:24]}', create=True, size=max(offset, 1))
+    _LOGGER.debug('   SHARED MEMORY              | %d rows, %d bytes in %s for %d readers', len(frame), offset,
+                  segment.name, readers)
+    for values, place in zip(values_list, layout):
+        if place is not None:
+            np.frombuffer(segment.buf, dtype=place[0], count=place[2], offset=place[1])[:] = values
+
+    handle = SharedFrame()
+    handle.name = segment.name
+    handle.columns = frame.columns
+    handle.buffers = layout[:-1]
+    handle.inline = {position: values for position, (values, place) in enumerate(zip(values_list, layout[:-1]))
+                     if place is None}
+    if isinstance(index, pd.RangeIndex):
+        handle.index = ('range', index.start, index.stop, index.step, index.name)
+    elif layout[-1] is not None:
+        handle.index = ('shared',) + layout[-1] + (index.name,)
+    else:
+        handle.index = ('inline', index)
+    handle.rows = (0, len(frame))
+    handle.attrs = dict(frame.attrs)
+    handle.handed_over = not readers
+
+    if readers:
+        with _lock:
+            _owned[segment.name] = [segment, readers]
+    else:
+        segment.close()
+    return handle
+
+
+def release(handle: Any) -> None:
+    """ Called by the sender once a reader is done with the segment. The last release unlinks it. """
+    if not isinstance(handle, SharedFrame):
+        return
+    with _lock:
+        entry = _owned.get(handle.name)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        del _owned[handle.name]
+    entry[0].close()
+    entry[0].unlink()
+
+
+def attach(handle: SharedFrame) -> pd.DataFrame:
+    """ The handle's rows as a DataFrame whose numpy columns are views of the segment. Nothing is copied. """
+    _close_unused()
+    segment = shared_memory.SharedMemory(name=handle.name)
+    with _lock:
+        _attached.append(segment)
+
+    start, stop = handle.rows
+    columns = {}
+    for position, place in enumerate(handle.buffers):
+        if place is None:
+            columns[position] = handle.inline[position][start:stop]
+        else:
+            columns[position] = np.frombuffer(segment.buf, dtype=place[0], count=place[2], offset=place[1])[start:stop]
+
+    kind = handle.index[0]
+    if kind == 'range':
+        _, first, last, step, name = handle.index
+        index = pd.RangeIndex(first, last, step, name=name)[start:stop]
+    elif kind == 'shared':
+        _, dtype, offset, rows, name = handle.index
+        index = pd.Index(np.frombuffer(segment.buf, dtype=dtype, count=rows, offset=offset)[start:stop], name=name,
+                         copy=False)
+    else:
+        index = handle.index[1][start:stop]
+
+    frame = pd.DataFrame(columns, index=index, copy=False)
+    frame.columns = handle.columns
+    frame.attrs.update(handle.attrs)
+    return frame
+
+
+def take(handle: SharedFrame) -> pd.DataFrame:
+    """ Attaches a segment handed over by share(frame, readers=0) and unlinks it, as this is its only reader. """
+    frame = attach(handle)
+    with _lock:
+        segment = next(segment for segment in reversed(_attached) if segment.name == handle.name)
+    segment.unlink()
+    return frame
+
+
+def _close_unused() -> None:
+    """ Unmaps the segments no frame of this process refers to any more. Mappings still in use refuse to close. """
+    with _lock:
+        still_used = []
+        for segment in _attached:
+            try:
+                segment.close()
+            except BufferError:
+                still_used.append(segment)
+        _attached[:] = still_used
+
+
+def pack(pubsub_message: Dict, readers: int = 1) -> Dict:
+    """ A copy of the message whose DataFrame data is replaced by a SharedFrame, if worth it. """
+    if not shareable(pubsub_message.get('data')):
+        return pubsub_message
+    return dict(pubsub_message, data=share(pubsub_message['data'], readers))
+
+
+def unpack(pubsub_message: Dict) -> Dict:
+    """ A copy of the message whose SharedFrame data is attached. Handed-over segments are taken. """
+    data = pubsub_message.get('data')
+    if not isinstance(data, SharedFrame):
+        return pubsub_message
+    return dict(pubsub_message, data=take(data) if data.handed_over else attach(data))
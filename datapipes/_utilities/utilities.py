@@ -1,5 +1,6 @@
 import json
 import os
+import re
 from pathlib import Path
 from inspect import isclass
 from pkgutil import iter_modules
@@ -20,6 +21,68 @@ def Dict2DictDot(d):
 def verifyConfiguration(cfg):
     return True
 
+_SIZE_UNITS = {'': 1, 'b': 1, 'k': 1024, 'kb': 1024, 'm': 1024**2, 'mb': 1024**2, 'g': 1024**3, 'gb': 1024**3}
+
+def parse_size(size) -> int:
+    """
+    Converts a configured size such as 65536, '64KB' or '1.5 GB' to a number of bytes.
+
+    :param size: an integer number of bytes, or a string with an optional B/KB/MB/GB unit
+    :type size: int or str
+    """
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r'\s*([0-9.]+)\s*([a-zA-Z]*)\s*', str(size))
+    if match is None or match.group(2).lower() not in _SIZE_UNITS:
+        raise ValueError(f'Cannot interpret "{size}" as a size in bytes. Use e.g. 1048576, "512KB" or "64MB".')
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+def topological_order(nodes, edges) -> list:
+    """
+    Orders the nodes of a graph so every node comes after all of its subjects (Kahn's algorithm).
+    Ties keep the order the nodes were given in.
+
+    :param nodes: the node keys
+    :type nodes: iterable of str
+    :param edges: the ('from', 'to') connections between nodes
+    :type edges: iterable of tuples
+    """
+    nodes = list(nodes)
+    indegree = {node: 0 for node in nodes}
+    observers = {node: [] for node in nodes}
+    for subject, observer in edges:
+        observers[subject].append(observer)
+        indegree[observer] += 1
+
+    ready = [node for node in nodes if indegree[node] == 0]
+    order = []
+    while ready:
+        node = ready.pop(0)
+        order.append(node)
+        for observer in observers[node]:
+            indegree[observer] -= 1
+            if indegree[observer] == 0:
+                ready.append(observer)
+
+    if len(order) != len(nodes):
+        # What is left is the cycles plus everything downstream of them; report only the nodes that reach themselves.
+        left = {node for node in nodes if indegree[node] > 0}
+
+        def reaches_itself(start):
+            seen, stack = set(), [observer for observer in observers[start] if observer in left]
+            while stack:
+                node = stack.pop()
+                if node == start:
+                    return True
+                if node not in seen:
+                    seen.add(node)
+                    stack.extend(observer for observer in observers[node] if observer in left)
+            return False
+
+        cycle = [node for node in nodes if node in left and reaches_itself(node)]
+        raise ValueError(f'The configured graph has a cycle through: {cycle}')
+    return order
+
 def class_import(name):
     components = name.split('.')
     mod = __import__(components[0])
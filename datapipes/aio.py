@@ -0,0 +1,203 @@
+"""
+asyncio execution of a run's PubSub graph (run_strategy: local_async).
+
+Every data source and every algorithm or output runs as a task on one event loop, so I/O-bound sources and sinks
+overlap instead of waiting on each other. Strategies may provide async aload/asave, and algorithms may define
+`async def update`; these run on the loop itself. Synchronous loads, saves and updates run on an executor, so they
+never block the loop.
+"""
+import asyncio, copy, inspect, logging, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List
+
+from datapipes._utilities import shared
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes._utilities.utilities import topological_order
+from datapipes.observer import Observer, PubSubMessage
+from datapipes.scheduler import _update_in_process
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+_END_OF_STREAM = object()
+
+
+class _AsyncStage(Observer):
+    """
+    Wraps one algorithm or output. Publishers put a snapshot of their message onto the stage's queue (from the loop,
+    or from an executor thread), and the stage's task hands the snapshots to the node one at a time.
+
+    Attributes:
+        upstream: the number of publishers of this node. The stage ends once all of them have closed it.
+        error: the exception raised by the node, if any.
+    """
+
+    def __init__(self, name: str, node: Any, kind: str, in_process: bool, queue_size: int):
+        self.name = name
+        self.node = node
+        self.kind = kind
+        self.in_process = in_process
+        self.queue_size = queue_size
+        self.upstream = 0
+        self.error = None
+        self.messages = 0
+        self._closed = 0
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._queue = asyncio.Queue()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+    def update(self, subject) -> None:
+        self.put(PubSubMessage(subject.pubsub_message))
+
+    def put(self, message) -> None:
+        if threading.get_ident() == self._loop_thread:
+            self._enqueue(message)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, message)
+
+    def _enqueue(self, message) -> None:
+        self._queue.put_nowait(message)
+        if self._queue.qsize() >= self.queue_size:
+            self._not_full.clear()
+
+    def close(self) -> None:
+        self.put(_END_OF_STREAM)
+
+    async def ready(self) -> None:
+        """ Waits while the queue is full. Sources wait on it, so a slow stage throttles reading. """
+        await self._not_full.wait()
+
+    def downstream(self) -> List['_AsyncStage']:
+        pubsub = getattr(self.node, 'PubSub', None)
+        observers = pubsub._observers if pubsub is not None else []
+        return [observer for observer in observers if isinstance(observer, _AsyncStage)]
+
+
+class AsyncEngine():
+    """
+    Runs a graph built by RunLocal._build_graph on the running event loop.
+
+    Args:
+        graph: the 'sources', 'algorithms', 'outputs' and 'edges' of one run.
+        executor: 'thread' runs synchronous updates on a thread pool. 'process' runs synchronous algorithm updates
+        on a process pool (algorithms must be picklable); outputs and loads still use threads.
+        max_workers: (optional) the size of the pools. Defaults to the pools' own default.
+        queue_size: the number of messages a stage may have waiting before the sources feeding it pause.
+    """
+
+    EXECUTORS = ('thread', 'process')
+    QUEUE_SIZE = 8
+
+    def __init__(self, graph: Dict[str, Any], executor: str = 'thread', max_workers: int = None,
+                 queue_size: int = QUEUE_SIZE):
+        if executor not in self.EXECUTORS:
+            raise NotImplementedError(f'Executor {executor} not implemented for {type(self).__name__}. Executor options include: "thread" or "process"')
+        self._graph = graph
+        self._executor = executor
+        self._max_workers = max_workers
+        self._queue_size = queue_size
+        self.order = graph.get('order') or topological_order(
+            {**graph['sources'], **graph['algorithms'], **graph['outputs']}.keys(), graph['edges'])
+
+    async def run(self) -> Dict[str, int]:
+        """ Runs the graph to completion. Returns the number of messages each algorithm and output handled. """
+        _LOGGER.debug('   ASYNC ENGINE               | running %d nodes on the event loop: %s', len(self.order), self.order)
+        graph = self._graph
+        self._stages: Dict[str, _AsyncStage] = {}
+        for name, node in graph['algorithms'].items():
+            in_process = (self._executor == 'process' and not inspect.iscoroutinefunction(node.update)
+                          and 'update' not in vars(node))
+            self._stages[name] = _AsyncStage(name, node, 'algorithm', in_process, self._queue_size)
+        for name, node in graph['outputs'].items():
+            self._stages[name] = _AsyncStage(name, node, 'output', False, self._queue_size)
+
+        publishers = {**graph['sources'], **graph['algorithms']}
+        for subject, observer in graph['edges']:
+            stage = self._stages[observer]
+            publishers[subject].PubSub.replace(stage.node, stage)
+            stage.upstream += 1
+
+        self._threads = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='datapipes')
+        self._processes = None
+        if self._executor == 'process':
+            shared.prepare()
+            self._processes = ProcessPoolExecutor(max_workers=self._max_workers)
+        errors = []
+        try:
+            tasks = [self._run_source(name, source) for name, source in graph['sources'].items()]
+            tasks += [self._run_stage(stage) for stage in self._stages.values()]
+            errors = [error for error in await asyncio.gather(*tasks) if error is not None]
+        finally:
+            self._threads.shutdown()
+            if self._processes is not None:
+                self._processes.shutdown()
+
+        if errors:
+            raise errors[0]
+        return {name: stage.messages for name, stage in self._stages.items()}
+
+    async def _run_source(self, name: str, source: Any):
+        downstream = [observer for observer in source.PubSub._observers if isinstance(observer, _AsyncStage)]
+        error = None
+        try:
+            async for key, data in source.aload(self._threads):
+                source.PubSub.pubsub_message['data'] = data
+                source.notify()
+                source.PubSub.pubsub_message['data'] = None
+                for stage in downstream:
+                    await stage.ready()
+        except Exception as failure:
+            error = failure
+            _LOGGER.error(f'   ASYNC SOURCE FAILED        | {name}: {error!r}')
+        for stage in downstream:
+            stage.close()
+        return error
+
+    async def _run_stage(self, stage: _AsyncStage):
+        while stage._closed < stage.upstream:
+            message = await stage._queue.get()
+            if stage._queue.qsize() < stage.queue_size:
+                stage._not_full.set()
+            if message is _END_OF_STREAM:
+                stage._closed += 1
+                continue
+            if stage.error is not None:
+                continue  # keep draining, so publishers never wait on a failed stage
+
+            try:
+                await self._update(stage, message)
+            except Exception as error:
+                stage.error = error
+                _LOGGER.error(f'   ASYNC STAGE FAILED         | {stage.name}: {error!r}')
+            stage.messages += 1
+
+        for downstream in stage.downstream():
+            downstream.close()
+        return stage.error
+
+    async def _update(self, stage: _AsyncStage, message: PubSubMessage) -> None:
+        node = stage.node
+        loop = asyncio.get_running_loop()
+        if stage.kind == 'output':
+            await node.aupdate(message, self._threads)
+        elif inspect.iscoroutinefunction(node.update):
+            await node.update(message)
+        elif stage.in_process:
+            copied = copy.copy(node)
+            del copied.PubSub
+            sent = shared.pack(message.pubsub_message)
+            try:
+                state, published = await loop.run_in_executor(self._processes, _update_in_process, copied,
+                                                              node.PubSub.pubsub_message, PubSubMessage(sent))
+            finally:
+                shared.release(sent.get('data'))
+            vars(node).update(state)
+            for pubsub_message in published:
+                node.PubSub.pubsub_message = shared.unpack(pubsub_message)
+                node.PubSub.notify()
+        else:
+            # Anything the update publishes from the executor thread is queued back onto the loop in order, ahead of
+            # the completion of this await.
+            await loop.run_in_executor(self._threads, partial(node.update, message))
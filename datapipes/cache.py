@@ -0,0 +1,249 @@
+"""
+Content-addressed cache of algorithm results.
+
+An algorithm's update is keyed by a fingerprint of the data it receives, its node's config, its pubsub_message['cfg']
+and the version of its code. When the same key comes around again (e.g. a config re-run with unchanged inputs), the
+outputs recorded last time are published straight to the downstream observers and the algorithm is not run. Each
+recorded output is a whole published message, so its topic and any other fields are published again with the data.
+
+Only updates that depend on nothing but their input can be replayed like this. An algorithm that keeps state between
+updates (e.g. a join holding on to its first input until the second arrives) stops being cached as soon as an update
+changes its state, and the runner does not cache nodes with more than one subject at all.
+"""
+import hashlib, inspect, json, logging, os, pickle, shutil, sys, threading, time, uuid
+from typing import Any, Dict, List, Optional
+
+from datapipes._utilities.frames import fingerprint
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes._utilities.utilities import parse_size
+
+import pandas as pd
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def code_version(algorithm: type) -> str:
+    """
+    The version of an algorithm class's code: its __version__ attribute if it declares one, otherwise a hash of the
+    source of the module defining it (falling back to the class source, then its qualified name).
+    """
+    declared = getattr(algorithm, '__version__', None)
+    if declared is not None:
+        return str(declared)
+
+    module = sys.modules.get(algorithm.__module__)
+    for target in (module, algorithm):
+        try:
+            return hashlib.sha256(inspect.getsource(target).encode()).hexdigest()
+        except (OSError, TypeError):
+            continue
+    return f'{algorithm.__module__}.{algorithm.__qualname__}'
+
+
+class ResultCache():
+    """
+    Stores the outputs each algorithm update published, on local disk, under a content-addressed key.
+    DataFrames are stored as Parquet (when pyarrow is installed), anything else is pickled.
+    Every hit refreshes an entry's modification time, and the least recently used entries are evicted once the
+    cache grows beyond max_bytes.
+
+    Args:
+        path: (optional) the cache directory. Defaults to '.datapipes_cache'.
+        max_bytes: (optional) the size limit, e.g. 1073741824 or '1GB'. Unlimited by default.
+    """
+
+    PATH = '.datapipes_cache'
+
+    def __init__(self, path: str = PATH, max_bytes: Any = None):
+        self.path = path
+        self.max_bytes = parse_size(max_bytes) if max_bytes is not None else None
+        self._versions: Dict[type, str] = {}
+        self._lock = threading.Lock()
+
+    def key(self, algorithm: Any, data: Any, node_cfg: Dict[str, Any] = None) -> str:
+        """ The cache key of an algorithm update on the given data, for a node configured with node_cfg. """
+        algorithm_class = type(algorithm)
+        if algorithm_class not in self._versions:
+            self._versions[algorithm_class] = code_version(algorithm_class)
+
+        digest = hashlib.sha256()
+        digest.update(f'{algorithm_class.__module__}.{algorithm_class.__qualname__}'.encode())
+        digest.update(self._versions[algorithm_class].encode())
+        digest.update(json.dumps(algorithm.PubSub.pubsub_message.get('cfg'), sort_keys=True, default=str).encode())
+        digest.update(json.dumps(node_cfg, sort_keys=True, default=str).encode())
+        digest.update(fingerprint(data).encode())
+        return digest.hexdigest()
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """ The published messages stored under key, in publication order, or None on a miss. """
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, 'manifest.json')) as fp:
+                manifest = json.load(fp)
+            outputs = []
+            for names in manifest:
+                data_name, fields_name = names if isinstance(names, list) else (names, None)
+                message = self._read(os.path.join(entry, fields_name)) if fields_name else {}
+                message['data'] = self._read(os.path.join(entry, data_name))
+                outputs.append(message)
+        except (OSError, ValueError, pickle.UnpicklingError):
+            return None
+        os.utime(entry)
+        return outputs
+
+    def stage(self, key: str) -> str:
+        """ A new temporary directory to write the outputs for key into, before commit renames it into place. """
+        staging = os.path.join(self.path, f'.{key}.{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        return staging
+
+    def add(self, staging: str, message: Dict[str, Any]) -> List[str]:
+        """
+        Write one published message into a staging directory: its data, and the rest of its fields (topic, ...).
+        Returns their file names for the manifest.
+        """
+        file_name = os.path.join(staging, str(len(os.listdir(staging)) // 2))
+        fields = {field: value for field, value in message.items() if field != 'data'}
+        return [self._write(file_name, message.get('data')), self._write(f'{file_name}.message', fields, pickled=True)]
+
+    def commit(self, key: str, staging: str, manifest: List[List[str]]) -> None:
+        """ Store the staged outputs, listed in manifest, under key. """
+        with open(os.path.join(staging, 'manifest.json'), 'w') as fp:
+            json.dump(manifest, fp)
+
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        try:
+            os.replace(staging, entry)
+        except OSError:  # another run stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+        if self.max_bytes is not None:
+            self.evict()
+
+    @staticmethod
+    def _write(file_name: str, data: Any, pickled: bool = False) -> str:
+        if isinstance(data, pd.DataFrame) and not pickled:
+            try:
+                data.to_parquet(f'{file_name}.parquet')
+                return os.path.basename(f'{file_name}.parquet')
+            except (ImportError, ValueError, TypeError):
+                pass
+        with open(f'{file_name}.pkl', 'wb') as fp:
+            pickle.dump(data, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        return os.path.basename(f'{file_name}.pkl')
+
+    @staticmethod
+    def _read(file_name: str) -> Any:
+        if file_name.endswith('.parquet'):
+            return pd.read_parquet(file_name)
+        with open(file_name, 'rb') as fp:
+            return pickle.load(fp)
+
+    def evict(self) -> None:
+        """ Remove the least recently used entries until the cache fits in max_bytes. """
+        with self._lock:
+            entries = []
+            for shard in os.scandir(self.path) if os.path.isdir(self.path) else []:
+                if not shard.is_dir() or shard.name.startswith('.'):
+                    continue
+                for entry in os.scandir(shard.path):
+                    size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                _LOGGER.debug('   CACHE EVICTED              | %s (%d bytes)', entry, size)
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def clear(self) -> None:
+        """ Remove every entry. """
+        _LOGGER.debug('   CACHE CLEARED              | %s', self.path)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def wrap(self, algorithm: Any, name: str = None, node_cfg: Dict[str, Any] = None) -> Any:
+        """
+        Route the algorithm's updates through the cache. node_cfg is the node's config, whose options (all but its
+        observers) are part of every key.
+        """
+        node_cfg = {option: value for option, value in (node_cfg or {}).items() if option != 'observers'}
+        algorithm.update = _CachedUpdate(self, algorithm, name or type(algorithm).__name__, node_cfg)
+        return algorithm
+
+
+class _CachedUpdate():
+    """
+    Replaces an algorithm's update. On a hit it publishes the stored messages, on a miss it runs the algorithm's own
+    update and stores every message the algorithm publishes, one per notify. An update that changes the algorithm's
+    attributes is not stored, and from then on the algorithm's updates run uncached.
+    """
+
+    def __init__(self, cache: ResultCache, algorithm: Any, name: str, node_cfg: Dict[str, Any] = None):
+        self._cache = cache
+        self._algorithm = algorithm
+        self._update = algorithm.update
+        self._name = name
+        self._node_cfg = node_cfg
+        self._stateful = False
+
+    def _state(self) -> Optional[str]:
+        """ A fingerprint of the algorithm's attributes, or None if they cannot be pickled. """
+        state = {name: value for name, value in vars(self._algorithm).items() if name not in ('PubSub', 'update')}
+        try:
+            return fingerprint(state)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+
+    def __call__(self, subject) -> None:
+        if self._stateful:
+            return self._update(subject)
+
+        publisher = self._algorithm.PubSub
+        key = self._cache.key(self._algorithm, subject.pubsub_message.get('data'), self._node_cfg)
+
+        outputs = self._cache.get(key)
+        if outputs is not None:
+            _LOGGER.debug('   CACHE HIT                  | %s: publishing %d cached outputs', self._name, len(outputs),
+                          extra={'node': self._name})
+            for message in outputs:
+                publisher.pubsub_message = message
+                publisher.notify()
+            return
+
+        # Outputs are written as they are published, before downstream observers can touch them.
+        staging = self._cache.stage(key)
+        manifest = []
+        notify = publisher.notify
+        shadowed = 'notify' in vars(publisher)
+
+        def record():
+            manifest.append(self._cache.add(staging, publisher.pubsub_message))
+            return notify()
+
+        start = time.perf_counter()
+        state = self._state()
+        publisher.notify = record
+        try:
+            self._update(subject)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        finally:
+            if shadowed:
+                publisher.notify = notify
+            else:
+                del publisher.notify
+        _LOGGER.debug('   CACHE MISS                 | %s: ran in %.3fs', self._name, time.perf_counter() - start,
+                      extra={'node': self._name})
+        if state is None or self._state() != state:
+            _LOGGER.debug('   CACHE DISABLED             | %s: keeps state between updates', self._name,
+                          extra={'node': self._name})
+            self._stateful = True
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        self._cache.commit(key, staging, manifest)
@@ -1,24 +1,83 @@
-import os, psycopg2
+import asyncio, glob, io, os, queue, shutil, subprocess, threading, uuid
 from abc import ABC, abstractmethod
-from typing import Generator, Dict, BinaryIO
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from psycopg2 import pool as pg_pool, sql as pg_sql
+from typing import Generator, Dict, BinaryIO, List
+from datapipes._utilities.compression import COMPRESSIONS, EXTENSIONS, infer_compression, open_read, open_write
 from datapipes._utilities.logger import LOGGER_NAME
+from datapipes._utilities.utilities import parse_size
 from datapipes.observer import PubSub
 import logging
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
 
 class _DataStrategy(ABC):
     """ Abstract Base Class for Data I/O strategies. Sets the required class methods and variable types.
+    A strategy may also define `async def aload(self)` (an async generator of (key, data), like load) and
+    `async def asave(self, result, append=False)`, which the local_async runner awaits on its event loop instead of
+    running load and save on an executor.
+
+    PUSHDOWN names the read options ('columns', 'filters') the strategy applies itself, which the runner may fill in
+    from what the source's observers declared.
     """
+    PUSHDOWN = ()
     @abstractmethod
     def load(cls,context:str,data:Dict) -> Dict:
         pass
     @abstractmethod
     def save(cls,context:str,data:Dict) -> Dict:
         pass
+    def close(self) -> None:
+        """ Finishes any output still open once a run is done. Strategies without open outputs need not override it. """
+        pass
+    def abort(self) -> None:
+        """ Discards outputs that are not finished, after a failed write. Defaults to close(). """
+        self.close()
+    def inputs(self) -> List[str]:
+        """ The local files the strategy reads, so they can be watched for changes. """
+        return []
+
+def _temporary_name(file_name:str) -> str:
+    """ A hidden name next to file_name to write to before renaming into place. """
+    directory, base_name = os.path.split(file_name)
+    return os.path.join(directory, f'.{base_name}.{uuid.uuid4().hex}.tmp')
+
+def _partition_columns(partition_by) -> List[str]:
+    """ The partition_by option as a list of column names. """
+    if not partition_by:
+        return []
+    return [partition_by] if isinstance(partition_by, str) else list(partition_by)
+
+def _partition_values(file_name:str) -> Dict:
+    """ The hive partition values (the col=value directories) in a file's path, as ints, floats or strings. """
+    values = {}
+    for part in os.path.dirname(file_name).split(os.sep):
+        column, equals, value = part.partition('=')
+        if not equals or not column:
+            continue
+        for kind in (int, float):
+            try:
+                value = kind(value)
+                break
+            except ValueError:
+                pass
+        values[column] = value
+    return values
+
 
 class StrategyCSV(_DataStrategy):
     """
@@ -26,94 +85,735 @@ class StrategyCSV(_DataStrategy):
     publishes that data according to the config.yml PubSub graph.
 
     Args:
-        key: filename of the csv.
+        key: filename of the csv. If path/key is a directory, every .csv file in it is read.
         path: filepath of the csv.
+        glob: (optional) read every file matching this pattern under path instead, e.g. 'daily/*.csv' or '**/*.csv'.
+        shard_mode: (optional) for a directory or glob, 'concat' (default) publishes all files as one frame and
+        'each' publishes one frame per file, in file name order.
+        read_workers: (optional) threads reading the files of a directory or glob concurrently.
+        file_column: (optional) add a column with the name of the file each row came from.
+        chunksize: (optional) number of rows per chunk. When set, the csv is read and published chunk by chunk
+        (the files of a directory or glob one after another).
+        chunk_bytes: (optional) approximate size of each chunk, e.g. 67108864 or '64MB'. Converted to rows
+        from the average line length at the top of the file. Ignored when chunksize is set.
+        columns: (optional) only parse these columns.
+        compression: (optional) 'gzip' or 'zstd': read and write key.csv.gz or key.csv.zst. Files are decompressed
+        as they are read; writes compress blocks on compression_threads threads. The files of a directory or glob
+        are otherwise decompressed according to their extension.
+        compression_level: (optional) defaults to 6 for gzip and 3 for zstd.
+        compression_threads: (optional) defaults to the number of CPUs.
+        atomic: (optional) write to a temporary file, renamed to key.csv by close(), so readers never see a
+        partial file. On by default for write_behind outputs.
+        partition_by: (optional) for outputs, a column or list of columns. The output becomes the directory path/key
+        holding a col=value subdirectory per distinct value (hive partitioning), written without those columns.
+        Reading the directory adds them back, and a glob such as 'key/region=eu/**/*.csv' reads only some partitions.
+        partition_rows: (optional) for outputs, at most this many rows per file, also making path/key a directory.
+        write_workers: (optional) threads writing the files of a partitioned output concurrently.
 
     Returns:
         key: filename of the csv.
-        data: a Pandas dataframe of the csv.
+        data: a Pandas dataframe of the csv, or of one chunk of it. Its attrs['files'] lists the file, bytes,
+        modification time, rows and first row of each file it holds.
 
     Attributes:
         key: String
         data: a Pandas dataframe.
     """
 
+    _SAMPLE_LINES = 1000
+    SHARD_MODES = ('concat', 'each')
+    PUSHDOWN = ('columns',)
+
     def __init__(self,**kwargs): #,key,path):
         self.key = kwargs['key']
         self.path = kwargs['path']
+        self.glob = kwargs.get('glob')
+        self.shard_mode = kwargs.get('shard_mode', 'concat')
+        self.read_workers = kwargs.get('read_workers')
+        self.file_column = kwargs.get('file_column')
+        self.chunksize = kwargs.get('chunksize')
+        self.chunk_bytes = kwargs.get('chunk_bytes')
+        self.columns = kwargs.get('columns')
+        self.compression = kwargs.get('compression')
+        self.compression_level = kwargs.get('compression_level')
+        self.compression_threads = kwargs.get('compression_threads')
+        self.atomic = kwargs.get('atomic', False)
+        self.partition_by = _partition_columns(kwargs.get('partition_by'))
+        self.partition_rows = kwargs.get('partition_rows')
+        self.write_workers = kwargs.get('write_workers')
+        self._temp = None
+        self._batches = 0
+        if self.compression not in COMPRESSIONS:
+            raise NotImplementedError(f'Compression {self.compression} not implemented for {type(self).__name__}. Compression options include: "gzip" or "zstd"')
+        if self.shard_mode not in self.SHARD_MODES:
+            raise NotImplementedError(f'Shard mode {self.shard_mode} not implemented for {type(self).__name__}. Shard mode options include: "concat" or "each"')
 
     def load(self) -> Dict:
+        if self._sharded():
+            return self.shard_read(self.files())
+        if self.chunksize or self.chunk_bytes:
+            return self.chunk_read(key=self.key,path=self.path)
         return self.batch_read(key=self.key,path=self.path)
 
-    def save(self,result:Dict=None) -> Dict:
-        return self.batch_write(result)
+    def save(self,result:Dict=None,append:bool=False) -> Dict:
+        if self.partition_by or self.partition_rows:
+            return self.partitioned_write(result,append=append)
+        return self.batch_write(result,append=append)
+
+    def inputs(self) -> List[str]:
+        return self.files()
+
+    def _sharded(self) -> bool:
+        return bool(self.glob) or os.path.isdir(os.path.join(self.path, self.key))
+
+    def files(self) -> List[str]:
+        """ The files the source reads: path/key.csv, the .csv files in the directory path/key, or the glob matches. """
+        if self.glob:
+            return sorted(glob.glob(os.path.join(self.path, self.glob), recursive=True))
+        directory = os.path.join(self.path, self.key)
+        if os.path.isdir(directory):
+            extensions = tuple(f'.csv{extension}' for extension in EXTENSIONS.values())
+            return sorted(os.path.join(root, name) for root, _, names in os.walk(directory)
+                          for name in names if name.endswith(extensions) and not name.startswith('.'))
+        return [self._file_name(self.path, self.key)]
+
+    def _file_name(self, path:str, key:str) -> str:
+        return os.path.join(path, f'{key}.csv{EXTENSIONS[self.compression]}')
+
+    def _open(self, file_name:str):
+        """ A binary handle on the file, decompressing it as it is read. """
+        return open_read(file_name, self.compression or infer_compression(file_name))
 
     def batch_read(self,key=None,path=None) -> Generator:
         """
         Provides all examples in a CSV file in a single batch.
         """
         _LOGGER.debug('   CREATING BATCH             | creating batch from csv file contents: %s', path)
-        data = pd.read_csv(os.path.join(path, f'{key}.csv'))
+        with self._open(self._file_name(path, key)) as fp:
+            data = pd.read_csv(fp, usecols=self.columns)
         yield key, data
 
-    def batch_write(self, data:pd.DataFrame=None): #, key:str=None, output_path:str='output', output_name:str=uuid.uuid1()):
+    def chunk_read(self,key=None,path=None,file_name=None) -> Generator:
+        """
+        Provides the examples in a CSV file as consecutive chunks, so only one chunk is held in memory at a time.
+        """
+        file_name = file_name or self._file_name(path, key)
+        rows = self._chunk_rows(file_name)
+        _LOGGER.debug('   CREATING CHUNKS            | reading csv file %s in chunks of %d rows', file_name, rows)
+        with self._open(file_name) as fp:
+            reader = pd.read_csv(fp, chunksize=rows, usecols=self.columns)
+            try:
+                for data in reader:
+                    yield key, self._with_partitions(data, file_name)
+            finally:
+                reader.close()
+
+    def shard_read(self, files:List[str]) -> Generator:
+        """
+        Provides the examples in many CSV files, read concurrently on a thread pool, so the read takes about as long
+        as the slowest file rather than all of them in turn. With shard_mode 'each' at most two files per thread are
+        read ahead of the one being published.
+        """
+        if not files:
+            raise FileNotFoundError(f'No csv files found for {self.key} in {os.path.join(self.path, self.glob or self.key)}')
+
+        if self.chunksize or self.chunk_bytes:
+            for file_name in files:
+                for key, data in self.chunk_read(key=self.key, file_name=file_name):
+                    yield key, self._describe(data, [(file_name, len(data))])
+            return
+
+        workers = self.read_workers or min(32, (os.cpu_count() or 1) + 4)
+        _LOGGER.debug('   CREATING SHARDS            | reading %d csv files for %s on %d threads', len(files), self.key, workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='datapipes-csv') as pool:
+            if self.shard_mode == 'concat':
+                frames = list(pool.map(self._read_shard, files))
+                data = pd.concat(frames, ignore_index=True)
+                yield self.key, self._describe(data, [(file_name, len(frame)) for file_name, frame in zip(files, frames)])
+                return
+
+            pending = deque()
+            for file_name in files:
+                pending.append((file_name, pool.submit(self._read_shard, file_name)))
+                if len(pending) >= 2 * workers:
+                    file_name, future = pending.popleft()
+                    frame = future.result()
+                    yield self.key, self._describe(frame, [(file_name, len(frame))])
+            while pending:
+                file_name, future = pending.popleft()
+                frame = future.result()
+                yield self.key, self._describe(frame, [(file_name, len(frame))])
+
+    def _read_shard(self, file_name:str) -> pd.DataFrame:
+        with self._open(file_name) as fp:
+            data = pd.read_csv(fp, usecols=self.columns)
+        data = self._with_partitions(data, file_name)
+        if self.file_column:
+            data[self.file_column] = file_name
+        return data
+
+    def _with_partitions(self, data:pd.DataFrame, file_name:str) -> pd.DataFrame:
+        """ Adds the hive partition columns of a file below path back to its rows. """
+        for column, value in _partition_values(os.path.relpath(file_name, self.path)).items():
+            if self.columns is None or column in self.columns:
+                data[column] = value
+        return data
+
+    @staticmethod
+    def _describe(data:pd.DataFrame, files:List[tuple]) -> pd.DataFrame:
+        """ Records each file's name, size, modification time, rows and first row in data.attrs['files']. """
+        described, first_row = [], 0
+        for file_name, rows in files:
+            stat = os.stat(file_name)
+            described.append({'file': file_name, 'bytes': stat.st_size, 'modified': stat.st_mtime,
+                              'rows': rows, 'first_row': first_row})
+            first_row += rows
+        data.attrs['files'] = described
+        return data
+
+    def _chunk_rows(self, file_name:str) -> int:
+        """
+        Number of rows per chunk, estimating rows from chunk_bytes when no row count is configured.
+        For compressed files chunk_bytes is the uncompressed size.
+        """
+        if self.chunksize:
+            return int(self.chunksize)
+
+        chunk_bytes = parse_size(self.chunk_bytes)
+        sampled_bytes, sampled_lines = 0, 0
+        with self._open(file_name) as fp:
+            fp.readline()  # header
+            for line in fp:
+                sampled_bytes += len(line)
+                sampled_lines += 1
+                if sampled_lines >= self._SAMPLE_LINES:
+                    break
+        if sampled_lines == 0:
+            return 1
+        return max(1, chunk_bytes * sampled_lines // sampled_bytes)
+
+    def batch_write(self, data:pd.DataFrame=None, append:bool=False): #, key:str=None, output_path:str='output', output_name:str=uuid.uuid1()):
         """
-        Write all examples as a batch.
+        Write all examples as a batch. With append=True the examples are added to the end of an existing file
+        (without repeating the header), which is how chunked results are accumulated. A compressed file gets a new
+        gzip member or zstd frame per append.
         """
-        _LOGGER.debug(f'   WRITING CSV                | writing csv file from batch for {self.key}')
+        _LOGGER.debug('   WRITING CSV                | writing csv file from batch for %s', self.key, extra={'node': self.key})
 
         os.makedirs(self.path, exist_ok=True)
-        out_path_name = os.path.join(self.path, f'{self.key}.csv')
-        data.to_csv( out_path_name, index=False)
+        out_path_name = self._file_name(self.path, self.key)
+        if self.atomic:
+            self._temp = self._temp or _temporary_name(out_path_name)
+            out_path_name = self._temp
+        append = append and os.path.isfile(out_path_name)
+        with open_write(out_path_name, self.compression, append, self.compression_level, self.compression_threads) as fp:
+            data.to_csv(fp, mode='ab' if append else 'wb', header=not append, index=False)
         # data.to_csv(os.path.join(self._path, f'{key}.csv'), index=False)
 
+    def partitioned_write(self, data:pd.DataFrame=None, append:bool=False):
+        """
+        Write the examples as a directory of files, one set per partition_by value and at most partition_rows rows
+        each, on a thread pool. The first write replaces the directory; appends add new files beside the existing
+        ones, so streamed chunks never rewrite what is already written. Each file is written under a temporary name
+        and renamed once complete.
+        """
+        directory = os.path.join(self.path, self.key)
+        if not append:
+            shutil.rmtree(directory, ignore_errors=True)
+            self._batches = 0
+        os.makedirs(directory, exist_ok=True)
+
+        if self.partition_by:
+            groups = data.groupby(self.partition_by, sort=False, dropna=False, observed=True)
+            partitions = [(os.path.join(directory, *(f'{column}={value}' for column, value in
+                                                     zip(self.partition_by, values if isinstance(values, tuple) else (values,)))),
+                           frame.drop(columns=self.partition_by))
+                          for values, frame in groups]
+        else:
+            partitions = [(directory, data)]
+        rows = int(self.partition_rows) if self.partition_rows else None
+        parts = [(partition_path, frame.iloc[start:start + rows] if rows else frame)
+                 for partition_path, frame in partitions
+                 for start in range(0, max(len(frame), 1), rows or max(len(frame), 1))]
+
+        batch, self._batches = self._batches, self._batches + 1
+        workers = self.write_workers or min(32, (os.cpu_count() or 1) + 4)
+        _LOGGER.debug('   WRITING CSV PARTITIONS     | writing %d csv files for %s on %d threads', len(parts), self.key,
+                      workers, extra={'node': self.key})
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='datapipes-csv') as pool:
+            futures = [pool.submit(self._write_part, self._file_name(partition_path, f'part-{batch:05d}-{index:05d}'), frame)
+                       for index, (partition_path, frame) in enumerate(parts)]
+            for future in futures:
+                future.result()
+
+    def _write_part(self, file_name:str, data:pd.DataFrame) -> None:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        temp = _temporary_name(file_name)
+        with open_write(temp, self.compression, False, self.compression_level, self.compression_threads) as fp:
+            data.to_csv(fp, mode='wb', index=False)
+        os.replace(temp, file_name)
+
+    def close(self) -> None:
+        """ Renames an atomic output into place. """
+        if self._temp is not None:
+            os.replace(self._temp, self._file_name(self.path, self.key))
+            self._temp = None
+
+    def abort(self) -> None:
+        if self._temp is not None:
+            os.remove(self._temp)
+            self._temp = None
+
+class _StrategyDataset(_DataStrategy):
+    """
+    Base for the columnar file strategies, read through pyarrow datasets so column projection and row filters are
+    pushed down into the reader and only the needed bytes are decoded.
+
+    Args:
+        key: filename of the file, without extension, or of a directory holding a (hive partitioned) dataset.
+        path: filepath of the file.
+        columns: (optional) only read these columns.
+        filters: (optional) only read the rows matching these filters, given as [column, op, value] triples that
+        are all required, or a list of such lists of which any one is enough. Ops are those of pyarrow, e.g.
+        '==', '!=', '<', '>=', 'in' or 'not in'.
+        chunksize: (optional) number of rows per chunk. When set, record batches are published one at a time.
+        atomic: (optional) write to a temporary file, renamed into place by close(). On by default for write_behind
+        outputs.
+        partition_by: (optional) for outputs, a column or list of columns. The output becomes the hive partitioned
+        dataset path/key, which filters on those columns read partition by partition.
+        partition_rows: (optional) for outputs, at most this many rows per file, also making path/key a dataset.
+
+    Returns:
+        key: filename of the file.
+        data: a Pandas dataframe of the (projected and filtered) file, or of one chunk of it.
+    """
+
+    FORMAT = None
+    EXTENSION = None
+    PUSHDOWN = ('columns', 'filters')
+
+    def __init__(self,**kwargs):
+        if ds is None:
+            raise ImportError(f'{type(self).__name__} requires pyarrow. Install it with "pip install pyarrow".')
+        self.key = kwargs['key']
+        self.path = kwargs['path']
+        self.columns = kwargs.get('columns')
+        self.filters = kwargs.get('filters')
+        self.chunksize = kwargs.get('chunksize')
+        self.atomic = kwargs.get('atomic', False)
+        self.partition_by = _partition_columns(kwargs.get('partition_by'))
+        self.partition_rows = kwargs.get('partition_rows')
+        self._writer = None
+        self._temp = None
+        self._batches = 0
+
+    def load(self) -> Dict:
+        if self.chunksize:
+            return self.chunk_read(key=self.key,path=self.path)
+        return self.batch_read(key=self.key,path=self.path)
+
+    def save(self,result:Dict=None,append:bool=False) -> Dict:
+        if self.partition_by or self.partition_rows:
+            return self.partitioned_write(result,append=append)
+        return self.batch_write(result,append=append)
+
+    def inputs(self) -> List[str]:
+        location = os.path.join(self.path, self.key)
+        if os.path.isdir(location):
+            return sorted(os.path.join(root, name) for root, _, names in os.walk(location) for name in names)
+        return [f'{location}{self.EXTENSION}']
+
+    def _dataset(self, key:str, path:str):
+        location = os.path.join(path, key)
+        if not os.path.isdir(location):
+            location = f'{location}{self.EXTENSION}'
+        return ds.dataset(location, format=self.FORMAT, partitioning='hive')
+
+    def _filter(self):
+        return pq.filters_to_expression(self.filters) if self.filters else None
+
+    def batch_read(self,key=None,path=None) -> Generator:
+        """
+        Provides the projected and filtered examples in a single batch.
+        """
+        _LOGGER.debug('   CREATING BATCH             | creating batch from %s %s, columns %s, filters %s', self.FORMAT, key,
+                      self.columns, self.filters)
+        table = self._dataset(key, path).to_table(columns=self.columns, filter=self._filter())
+        yield key, table.to_pandas()
+
+    def chunk_read(self,key=None,path=None) -> Generator:
+        """
+        Provides the projected and filtered examples as consecutive record batches of at most chunksize rows.
+        """
+        _LOGGER.debug('   CREATING CHUNKS            | reading %s %s in chunks of %s rows', self.FORMAT, key, self.chunksize)
+        for batch in self._dataset(key, path).to_batches(columns=self.columns, filter=self._filter(),
+                                                         batch_size=int(self.chunksize)):
+            if batch.num_rows:
+                yield key, batch.to_pandas()
+
+    def batch_write(self, data:pd.DataFrame=None, append:bool=False):
+        """
+        Write all examples as a batch. Appended batches are added to the same file, which is finished by close().
+        """
+        _LOGGER.debug('   WRITING %-19s| writing %s file from batch for %s', self.FORMAT.upper(), self.FORMAT, self.key,
+                      extra={'node': self.key})
+
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        if not append or self._writer is None:
+            self.close()
+            os.makedirs(self.path, exist_ok=True)
+            out_path_name = os.path.join(self.path, f'{self.key}{self.EXTENSION}')
+            self._temp = _temporary_name(out_path_name) if self.atomic else None
+            self._writer = self._open_writer(self._temp or out_path_name, table.schema)
+        self._writer.write_table(table)
+
+    def partitioned_write(self, data:pd.DataFrame=None, append:bool=False):
+        """
+        Write the examples as a hive partitioned dataset, with pyarrow writing the files of the partitions on its
+        thread pool. The first write replaces the dataset; appends add new files to it.
+        """
+        _LOGGER.debug('   WRITING %-19s| writing partitioned %s dataset for %s', self.FORMAT.upper(), self.FORMAT,
+                      self.key, extra={'node': self.key})
+
+        directory = os.path.join(self.path, self.key)
+        if not append:
+            shutil.rmtree(directory, ignore_errors=True)
+            self._batches = 0
+        batch, self._batches = self._batches, self._batches + 1
+        options = {}
+        if self.partition_rows:
+            rows = int(self.partition_rows)
+            options = {'max_rows_per_file': rows, 'max_rows_per_group': min(rows, 1 << 20)}
+        ds.write_dataset(pa.Table.from_pandas(data, preserve_index=False), directory, format=self.FORMAT,
+                         partitioning=self.partition_by or None, partitioning_flavor='hive' if self.partition_by else None,
+                         basename_template=f'part-{batch:05d}-{{i}}{self.EXTENSION}',
+                         existing_data_behavior='overwrite_or_ignore', **options)
+
+    def _open_writer(self, out_path_name:str, schema):
+        raise NotImplementedError(f'{type(self).__name__} does not write files.')
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._temp is not None:
+            os.replace(self._temp, os.path.join(self.path, f'{self.key}{self.EXTENSION}'))
+            self._temp = None
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._temp is not None:
+            os.remove(self._temp)
+            self._temp = None
+
+
+class StrategyParquet(_StrategyDataset):
+    """
+    Reads and writes Parquet files. Filters prune whole row groups using their statistics before any decoding.
+    """
+
+    FORMAT = 'parquet'
+    EXTENSION = '.parquet'
+
+    def _open_writer(self, out_path_name:str, schema):
+        return pq.ParquetWriter(out_path_name, schema)
+
+
+class StrategyArrow(_StrategyDataset):
+    """
+    Reads and writes Arrow IPC (Feather v2) files, given the extension '.arrow'.
+    """
+
+    FORMAT = 'ipc'
+    EXTENSION = '.arrow'
+
+    def _open_writer(self, out_path_name:str, schema):
+        return pa.ipc.new_file(out_path_name, schema)
+
+
+class StrategyMemmap(_DataStrategy):
+    """
+    Opens large dense numeric data memory-mapped instead of parsing it. The OS pages the data in lazily as it is
+    read, and processes mapping the same file share those pages rather than each holding a copy.
+
+    Supports '.npy' arrays (published as read-only numpy memmaps, whose chunks are views into the mapping, so
+    nothing is materialised until an observer computes on it) and Arrow IPC '.arrow' files (published as Pandas
+    dataframes like the other Arrow strategies, one per record batch of the file). An Arrow record batch is converted
+    without copying where pandas can use its buffers as they are (numeric columns without nulls), so those columns
+    stay views into the mapping. A chunk never spans two record batches, as joining them would copy.
+
+    Args:
+        key: filename of the file, without extension.
+        path: filepath of the file.
+        extension: (optional) '.npy' or '.arrow'. Defaults to whichever of the two exists.
+        chunksize: (optional) number of rows per chunk. Each record batch of an Arrow file is split into chunks of at
+        most chunksize rows.
+        as_frame: (optional) publish Pandas dataframes of a .npy array instead. Zero-copy for a 2-D array.
+        column_names: (optional) the labels of a 2-D .npy array's columns, for its dataframes and for columns.
+        columns: (optional) only read these columns: names of an Arrow file's columns, or of column_names (else
+        positions) of a 2-D .npy array. Selecting columns of a .npy array copies them.
+
+    Returns:
+        key: filename of the file.
+        data: a numpy memmap or Pandas dataframe of the file or of one chunk of it.
+    """
+
+    EXTENSIONS = ('.npy', '.arrow')
+
+    def __init__(self,**kwargs):
+        self.key = kwargs['key']
+        self.path = kwargs['path']
+        self.extension = kwargs.get('extension') or next(
+            (extension for extension in self.EXTENSIONS
+             if os.path.isfile(os.path.join(self.path, f'{self.key}{extension}'))), self.EXTENSIONS[0])
+        self.chunksize = kwargs.get('chunksize')
+        self.as_frame = kwargs.get('as_frame', False)
+        self.column_names = kwargs.get('column_names')
+        self.columns = kwargs.get('columns')
+        if self.extension not in self.EXTENSIONS:
+            raise NotImplementedError(f'Extension {self.extension} not implemented for {type(self).__name__}. Extension options include: {self.EXTENSIONS}')
+        if self.extension == '.arrow' and pa is None:
+            raise ImportError(f'{type(self).__name__} requires pyarrow for .arrow files. Install it with "pip install pyarrow".')
+
+    def load(self) -> Dict:
+        return self.batch_read(key=self.key,path=self.path)
+
+    def save(self,result:Dict=None,append:bool=False) -> Dict:
+        raise NotImplementedError(f'{type(self).__name__} only reads data. Use the "arrow" or "parquet" strategy for outputs.')
+
+    def inputs(self) -> List[str]:
+        return [os.path.join(self.path, f'{self.key}{self.extension}')]
+
+    def _map(self, file_name:str):
+        if self.extension == '.npy':
+            return np.load(file_name, mmap_mode='r')
+        return pa.ipc.open_file(pa.memory_map(file_name, 'r'))
+
+    def _frame(self, data):
+        """ What is published of the mapped data (or a chunk of it): projected, and converted to a dataframe. """
+        if self.extension == '.arrow':
+            # One block per column, so no columns are consolidated (copied) into a 2-D block.
+            return (data.select(self.columns) if self.columns else data).to_pandas(split_blocks=True,
+                                                                                   self_destruct=True)
+
+        names = self.column_names
+        if self.columns:
+            positions = [names.index(column) for column in self.columns] if names else list(self.columns)
+            data = data[:, positions]
+            names = list(self.columns) if names else None
+        if not self.as_frame:
+            return data
+        return pd.DataFrame(data, columns=names, copy=False)
+
+    def batch_read(self,key=None,path=None) -> Generator:
+        """
+        Provides the mapped file whole (an Arrow file record batch by record batch), or as consecutive views of
+        chunksize rows.
+        """
+        file_name = os.path.join(path, f'{key}{self.extension}')
+        _LOGGER.debug('   MAPPING FILE               | memory-mapping %s', file_name)
+        data = self._map(file_name)
+        if self.extension == '.arrow':
+            for position in range(data.num_record_batches):
+                batch = data.get_batch(position)
+                chunksize = int(self.chunksize or batch.num_rows or 1)
+                for start in range(0, batch.num_rows, chunksize):
+                    yield key, self._frame(batch.slice(start, chunksize))
+            return
+
+        if not self.chunksize:
+            yield key, self._frame(data)
+            return
+
+        rows, chunksize = len(data), int(self.chunksize)
+        for start in range(0, rows, chunksize):
+            yield key, self._frame(data[start:start + chunksize])
+
+
 class StrategyPostgres(_DataStrategy):
     """
     This strategy connects to the specified Postgres database and
-    publishes the table as a pandas dataframe according to the config.yml PubSub graph.
+    publishes the table (or query) as pandas dataframes according to the config.yml PubSub graph.
+    Rows are streamed from the server in batches, so the result never has to fit in memory at once.
+    Connections are borrowed from a pool shared by every StrategyPostgres with the same connection settings in
+    the process, so parallel sources and runs on threads reuse connections instead of each opening their own.
 
     Args:
-        key: filename of the csv.
-        path: filepath of the csv.
+        key: name of the table, optionally schema qualified ('schema.table').
+        query: (optional) the SQL query to read instead of the whole table.
+        dsn: (optional) a libpq connection string. Otherwise the connection is made from
+        host, port, user, password and dbname (libpq environment variables fill in the rest).
+        chunksize: (optional) number of rows per batch. Defaults to 10000.
+        read_via: (optional) 'cursor' (default) fetches through a named server-side cursor. 'copy' streams
+        'COPY (query) TO STDOUT' as CSV, which is faster for wide results.
+        pool_size: (optional) the maximum number of pooled connections. Defaults to 8.
+        upsert_keys: (optional) when writing, merge rows into the table on these key columns instead of inserting.
+        truncate: (optional) when writing, empty the table before the first batch of a run.
 
     Returns:
-        key: filename of the csv.
-        data: a Pandas dataframe of the csv.
+        key: name of the table.
+        data: a Pandas dataframe for each batch of rows.
 
     Attributes:
         key: String
         data: a Pandas dataframe.
     """
 
-    def __init__(self,user,dbname,host):
-        self._PGDB = None
-        self.user = user
-        self.dbname = dbname
-        self.host = host
-        self._pg_connect()
+    CONNECT_KEYS = ('dsn', 'host', 'port', 'user', 'password', 'dbname')
+    _POOLS = {}
+    _POOLS_LOCK = threading.Lock()
+
+    def __init__(self,**kwargs):
+        self.key = kwargs.get('key')
+        self.query = kwargs.get('query')
+        self.chunksize = int(kwargs.get('chunksize', 10000))
+        self.read_via = kwargs.get('read_via', 'cursor')
+        self.pool_size = int(kwargs.get('pool_size', 8))
+        self.upsert_keys = kwargs.get('upsert_keys')
+        self.truncate = kwargs.get('truncate', False)
+        self._connect_kwargs = {name: kwargs[name] for name in self.CONNECT_KEYS if name in kwargs}
 
+    def load(self) -> Dict:
+        return self.batch_read()
+
+    def save(self,result:Dict=None,append:bool=False) -> Dict:
+        return self.batch_write(result,append=append)
+
+    def _pool(self) -> pg_pool.ThreadedConnectionPool:
+        """ The connection pool for these connection settings in this process (forked processes make their own). """
+        pool_key = (os.getpid(),) + tuple(sorted(self._connect_kwargs.items()))
+        with self._POOLS_LOCK:
+            pool = self._POOLS.get(pool_key)
+            if pool is None or pool.closed:
+                _LOGGER.debug('  CONNECTING TO DATABASE   | opening a pool of up to %d connections', self.pool_size)
+                pool = pg_pool.ThreadedConnectionPool(1, self.pool_size, **self._connect_kwargs)
+                self._POOLS[pool_key] = pool
+        return pool
+
+    @contextmanager
     def _pg_connect(self):
-        """ Return an active database connection."""
+        """ Borrow an active database connection from the pool, rolling back anything left uncommitted on error."""
+        pool = self._pool()
+        conn = pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
 
-        if self._PGDB is None:
-            _LOGGER.debug(f'  CONNECTING TO PROVENANCE DATABASE  | Connecting to Picnic Provenance Database')
-            self._PGDB =  psycopg2.connect( user='sean@picnicscore.com',
-                                            dbname='provenance',
-                                            host='35.196.161.37')  # password='password',
-        return self._PGDB
+    def _select(self) -> pg_sql.Composable:
+        if self.query:
+            return pg_sql.SQL(self.query)
+        return pg_sql.SQL('SELECT * FROM {}').format(pg_sql.Identifier(*self.key.split('.')))
 
-    def batch_read(self):
-        """Unimplemented"""
-        pass
+    def batch_read(self) -> Generator:
+        """
+        Provides the table or query as consecutive batches of chunksize rows.
+        """
+        _LOGGER.debug('   CREATING BATCHES           | streaming %s from postgres via %s in batches of %d rows', self.key,
+                      self.read_via, self.chunksize)
+        with self._pg_connect() as conn:
+            if self.read_via == 'copy':
+                yield from self._copy_read(conn)
+                return
+
+            with conn.cursor(name=f'datapipes_{uuid.uuid4().hex}') as cursor:
+                cursor.itersize = self.chunksize
+                cursor.execute(self._select())
+                columns = None
+                while True:
+                    rows = cursor.fetchmany(self.chunksize)
+                    if not rows:
+                        break
+                    columns = columns or [column[0] for column in cursor.description]
+                    yield self.key, pd.DataFrame(rows, columns=columns)
+            conn.commit()
+
+    def _copy_read(self, conn) -> Generator:
+        """
+        Streams 'COPY ... TO STDOUT' through a pipe: a thread writes the server's CSV into one end while pandas
+        parses chunks from the other.
+        """
+        copy = pg_sql.SQL('COPY ({}) TO STDOUT WITH (FORMAT csv, HEADER true)').format(self._select())
+        read_fd, write_fd = os.pipe()
+        errors = []
+
+        def produce():
+            try:
+                with os.fdopen(write_fd, 'wb') as sink, conn.cursor() as cursor:
+                    cursor.copy_expert(copy, sink)
+            except Exception as error:
+                errors.append(error)
+
+        writer = threading.Thread(target=produce, name=f'datapipes-copy-{self.key}', daemon=True)
+        writer.start()
+        try:
+            with os.fdopen(read_fd, 'rb') as source:
+                reader = pd.read_csv(source, chunksize=self.chunksize)
+                for data in reader:
+                    yield self.key, data
+        finally:
+            writer.join()
+        if errors:
+            raise errors[0]
+        conn.commit()
+
+    def batch_write(self, data:pd.DataFrame=None, append:bool=False):
+        """
+        Write the dataframe into the table with COPY ... FROM STDIN, chunksize rows at a time, committing each batch.
+        With upsert_keys every batch is copied into a temporary staging table and merged with
+        INSERT ... ON CONFLICT DO UPDATE, so rows with existing keys are updated. Keys must be unique within a batch.
+        """
+        _LOGGER.debug('   WRITING POSTGRES           | copying %d rows into %s in batches of %d', len(data), self.key,
+                      self.chunksize, extra={'node': self.key})
+
+        table = pg_sql.Identifier(*self.key.split('.'))
+        columns = pg_sql.SQL(', ').join(map(pg_sql.Identifier, data.columns))
+        with self._pg_connect() as conn:
+            with conn.cursor() as cursor:
+                if self.truncate and not append:
+                    cursor.execute(pg_sql.SQL('TRUNCATE {}').format(table))
+                for start in range(0, len(data), self.chunksize):
+                    buffer = io.StringIO()
+                    data.iloc[start:start + self.chunksize].to_csv(buffer, index=False, header=False)
+                    buffer.seek(0)
+                    if self.upsert_keys:
+                        self._copy_upsert(cursor, table, data.columns, buffer)
+                    else:
+                        self._copy(cursor, table, columns, buffer)
+                    conn.commit()
+                conn.commit()
+
+    @staticmethod
+    def _copy(cursor, table:pg_sql.Composable, columns:pg_sql.Composable, buffer:io.StringIO):
+        cursor.copy_expert(pg_sql.SQL('COPY {} ({}) FROM STDIN WITH (FORMAT csv)').format(table, columns), buffer)
 
-    def batch_write(self,sql):
+    def _copy_upsert(self, cursor, table:pg_sql.Composable, column_names, buffer:io.StringIO):
+        stage = pg_sql.Identifier(f'datapipes_stage_{uuid.uuid4().hex}')
+        columns = pg_sql.SQL(', ').join(map(pg_sql.Identifier, column_names))
+        keys = pg_sql.SQL(', ').join(map(pg_sql.Identifier, self.upsert_keys))
+        updates = [pg_sql.SQL('{0} = EXCLUDED.{0}').format(pg_sql.Identifier(column))
+                   for column in column_names if column not in self.upsert_keys]
+        on_conflict = (pg_sql.SQL('DO UPDATE SET {}').format(pg_sql.SQL(', ').join(updates)) if updates
+                       else pg_sql.SQL('DO NOTHING'))
+
+        cursor.execute(pg_sql.SQL('CREATE TEMPORARY TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP').format(stage, table))
+        self._copy(cursor, stage, columns, buffer)
+        cursor.execute(pg_sql.SQL('INSERT INTO {0} ({1}) SELECT {1} FROM {2} ON CONFLICT ({3}) {4}').format(
+            table, columns, stage, keys, on_conflict))
+
+    def write_provenance(self):
         """
         Need to test the SQL injections.
         """
-        _LOGGER.debug(f'  PROVENANCE DATABASE WRITE     | writing to Picnic Provenance Database')
+        _LOGGER.debug('  PROVENANCE DATABASE WRITE     | writing to Picnic Provenance Database')
 
-        repository = subprocess.check_output(["basename", "`git", "rev-parse", "--show-toplevel`"])
-        commit = subprocess.check_output(["git", "describe", "--always"]).strip()
+        repository = os.path.basename(subprocess.check_output(["git", "rev-parse", "--show-toplevel"], text=True).strip())
+        commit = subprocess.check_output(["git", "describe", "--always"], text=True).strip()
         self._create_row(VERSION=f'{commit}',
                          created_date=datetime.now(),
                          has_individual_manual=True,
@@ -129,6 +829,7 @@ class StrategyPostgres(_DataStrategy):
         ##############################################################
 
     def _create_row(
+        self,
         VERSION: str,
         created_date: datetime = 'NOW()',  # this ensures always use docker tz if tz not passed in manually
         has_individual_manual: bool = False,
@@ -192,17 +893,17 @@ class StrategyPostgres(_DataStrategy):
             name,
         )
 
-        with _pg_connect() as conn:
+        with self._pg_connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(sql, VALUES)
                 conn.commit()
                 id = cursor.fetchone()[0]
 
-        _LOGGER.debug(f'  PROVENANCE ROW CREATED   | created new row with id: {id}')
+        _LOGGER.debug('  PROVENANCE ROW CREATED   | created new row with id: %s', id)
 
         return id
 
-    def finish_row(id: int) -> None:
+    def finish_row(self, id: int) -> None:
         """
         :param id: the id of the dataset
         :type id: int
@@ -213,12 +914,12 @@ class StrategyPostgres(_DataStrategy):
                    status = 'COMPLETED'
                WHERE id = %s;
            '''
-        with _pg_connect() as conn:
+        with self._pg_connect() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, (id,))
                 conn.commit()
 
-        _LOGGER.debug(f'{id} FINISHED')
+        _LOGGER.debug('%s FINISHED', id)
 
 
 class DataContext(_DataStrategy): #,Observer,ConcreteSubject):
@@ -232,16 +933,35 @@ class DataContext(_DataStrategy): #,Observer,ConcreteSubject):
         _config.format: The initialization dictionary must include a key:value pair where key='format'
         and value is a string choosing one of the following options:
         'csv' -> chooses the CSV Strategy
+        'parquet' -> chooses the Parquet Strategy
+        'arrow' -> chooses the Arrow IPC Strategy
+        'memmap' -> chooses the memory-mapped .npy / Arrow IPC Strategy
         'postgres' -> chooses the Postgres Strategy
+        _config.write_behind: (optional) for outputs, true or {buffer: n}. Each update hands the payload to a
+        background writer through a buffer of n payloads (default 4), and only waits when the buffer is full. File
+        outputs are then written atomically. close() waits for the pending writes and raises the first write error.
 
     Returns:
         data: each strategy returns data their way. (See each Strategy above)
     """
 
+    STRATEGIES = {'csv': StrategyCSV, 'parquet': StrategyParquet, 'arrow': StrategyArrow, 'memmap': StrategyMemmap,
+                  'postgres': StrategyPostgres}
+    FORMATS = tuple(STRATEGIES)
+    WRITE_BEHIND_BUFFER = 4
+
     def __init__(self,_config:Dict=None): #,strategy:_DataStrategy=None):
         """Initialized to no strategy unless specified."""
         self._config = _config
-        self.setStrategy(self._config['format'],**self._config)
+        self._saved = False
+        write_behind = self._config.get('write_behind')
+        self._write_behind = (dict({'buffer': self.WRITE_BEHIND_BUFFER}, **write_behind) if isinstance(write_behind, dict)
+                              else {'buffer': self.WRITE_BEHIND_BUFFER} if write_behind else None)
+        self._writer = None
+        self._pending = None
+        self._write_error = None
+        self._aborted = False
+        self.setStrategy(self._config['format'],**dict({'atomic': True} if write_behind else {}, **self._config))
         self.PubSub = PubSub()
         self.PubSub.pubsub_message = {'type':'spigot_data'}
         self.PubSub.pubsub_message['cfg'] = self._config
@@ -252,29 +972,123 @@ class DataContext(_DataStrategy): #,Observer,ConcreteSubject):
 
     def setStrategy(self, strategy:str, **kwargs):
         """Used primarily by the constructor, but could be called by the user."""
-        if strategy=='csv':
-            self.strategy = StrategyCSV(**kwargs)
-        elif strategy=='postgres':
-            self.strategy = StrategyPostgres(**kwargs)
-        else:
-            raise NotImplementedError(f'Strategy {strategy} not implemented for {type(self).__name__}. Strategy options include: "csv" or "postgres"')
-            return 1
+        if strategy not in self.STRATEGIES:
+            raise NotImplementedError(f'Strategy {strategy} not implemented for {type(self).__name__}. Strategy options include: {self.FORMATS}')
+        self.strategy = self.STRATEGIES[strategy](**kwargs)
         return 0
 
+    @classmethod
+    def pushdown(cls, strategy:str) -> tuple:
+        """ The read options the strategy of a format applies itself (see _DataStrategy.PUSHDOWN). """
+        return getattr(cls.STRATEGIES.get(strategy), 'PUSHDOWN', ())
+
     def on(self):
-        key, data = next(self.load())
-        self.PubSub.pubsub_message['data'] = data
-        self.notify()
+        """ Publishes every batch (or chunk) the strategy yields, one at a time, through the PubSub graph. """
+        for key, data in self.load():
+            self.PubSub.pubsub_message['data'] = data
+            self.notify()
+            self.PubSub.pubsub_message['data'] = None
         return 0
 
     def load(self) -> BinaryIO:
         return self.strategy.load()
 
-    def save(self,result:Dict=None) -> BinaryIO:
-        return self.strategy.save(result)
+    async def aload(self, executor=None):
+        """ Yields the strategy's (key, data) pairs from its aload, or from its load run on the executor. """
+        if hasattr(self.strategy, 'aload'):
+            async for key, data in self.strategy.aload():
+                yield key, data
+            return
+
+        loop = asyncio.get_running_loop()
+        chunks = iter(self.load())
+        while True:
+            chunk = await loop.run_in_executor(executor, next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def asave(self, result:Dict=None, append:bool=False, executor=None):
+        """ Awaits the strategy's asave, or runs its save on the executor. """
+        if hasattr(self.strategy, 'asave'):
+            return await self.strategy.asave(result, append=append)
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(self.save, result, append=append))
+
+    async def aupdate(self, subjectPubSub=None, executor=None):
+        """ The async counterpart of update. """
+        if self._write_behind:
+            return await asyncio.get_running_loop().run_in_executor(executor, self.update, subjectPubSub)
+        await self.asave(subjectPubSub.pubsub_message['data'], append=self._saved, executor=executor)
+        self._saved = True
+
+    def save(self,result:Dict=None,append:bool=False) -> BinaryIO:
+        return self.strategy.save(result,append=append)
+
+    def close(self) -> None:
+        """
+        Finishes the strategy's outputs once the run is done, after waiting for any pending write-behind writes.
+        If one of them failed, the unfinished outputs are discarded and its error is raised.
+        """
+        self.flush()
+        if self._write_error is not None:
+            error, self._write_error = self._write_error, None
+            self.strategy.abort()
+            raise error
+        return self.strategy.close()
+
+    def abort(self) -> None:
+        """ Discards the strategy's unfinished outputs after a failed run. Pending write-behind writes are dropped. """
+        self._aborted = True
+        self.flush()
+        self._write_error = None
+        self.strategy.abort()
+
+    def flush(self) -> None:
+        """ Waits until the write-behind writer has written every pending payload. """
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = self._pending = None
+
+    def inputs(self) -> List[str]:
+        """ The local files the strategy reads. """
+        return self.strategy.inputs()
+
+    def reset(self) -> None:
+        """ Makes the next update write afresh instead of appending, e.g. before the graph is run again. """
+        self._saved = False
+        self._aborted = False
 
     def notify(self):
         return self.PubSub.notify()
 
     def update(self, subjectPubSub=None):
-        self.strategy.save(subjectPubSub.pubsub_message['data'])
\ No newline at end of file
+        """ Saves the published data. The first update writes, every later update (e.g. the next chunk) appends. """
+        if self._write_behind:
+            self._write_later(subjectPubSub.pubsub_message['data'], append=self._saved)
+        else:
+            self.save(subjectPubSub.pubsub_message['data'],append=self._saved)
+        self._saved = True
+
+    def _write_later(self, data, append:bool) -> None:
+        """ Hands a payload to the write-behind writer, starting it if needed. Blocks while its buffer is full. """
+        if self._writer is None:
+            self._pending = queue.Queue(maxsize=self._write_behind['buffer'])
+            self._writer = threading.Thread(target=self._write_pending, args=(self._pending,),
+                                            name=f'datapipes-writer-{self._config.get("key")}', daemon=True)
+            self._writer.start()
+        self._pending.put((data, append))
+
+    def _write_pending(self, pending:queue.Queue) -> None:
+        """ The write-behind writer. After a failure the remaining payloads are drained without writing. """
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if self._write_error is not None or self._aborted:
+                continue
+            try:
+                self.save(*item)
+            except Exception as error:
+                self._write_error = error
+                _LOGGER.error(f'   WRITE BEHIND FAILED        | {self._config.get("key")}: {error!r}')
@@ -0,0 +1,344 @@
+"""
+Distributed execution over plain TCP (run_strategy: distributed).
+
+Workers listen on a host:port and are driven by a coordinator (RunDistributed in datapipes.run). The coordinator
+either hands whole independent runs to the workers, or splits the nodes of one run across them. Split nodes run as
+the stages of a StreamEngine on their worker, which loads its data sources locally. Only a message whose edge crosses
+to another worker is sent over the network, on a connection of its own, followed by an end-of-stream marker, just as
+stages close each other within one process. A full socket blocks the sender, so backpressure crosses workers too.
+
+Start a worker on each host with
+
+    python -m datapipes.distributed --listen 0.0.0.0:7070 --authkey <secret>
+
+or let the coordinator spawn local worker processes for testing (distributed.workers: <number>).
+"""
+import logging, os, threading
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+from importlib import import_module
+from typing import Any, Dict, List, Tuple
+
+import click
+
+from datapipes._utilities import logger
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes.factory import Factory
+from datapipes.observer import PubSubMessage
+from datapipes.stream import Stage, StreamEngine
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+CONNECT_TIMEOUT = 60.0
+
+
+def parse_address(address) -> Tuple[str, int]:
+    """ A (host, port) pair from 'host:port', or from a (host, port) pair. """
+    if isinstance(address, str):
+        host, _, port = address.rpartition(':')
+        return host or 'localhost', int(port)
+    return tuple(address)
+
+
+def run_edges(run_cfg: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """ Every ('from','to') connection of one run's config. """
+    edges = [(key, observer) for key, source in run_cfg['data_sources'].items() for observer in source['observers']]
+    edges += [(key, observer) for key, alg in run_cfg['algorithms'].items() for observer in alg['observers']]
+    return edges
+
+
+def assign_nodes(run_cfg: Dict[str, Any], workers: int, assign: Dict[str, int] = None) -> Dict[str, int]:
+    """
+    Places every node of a run on a worker index.
+
+    Args:
+        run_cfg: the run's data_sources, algorithms and data_output.
+        workers: the number of workers.
+        assign: (optional) node keys pinned to a worker index.
+
+    Returns:
+        The worker index of each node. Pinned nodes stay where they are pinned, the other sources are spread
+        round-robin, and every other node joins the worker of its first publisher, so edges only cross workers
+        where a pin puts them.
+    """
+    assignment = {key: int(index) % workers for key, index in (assign or {}).items()}
+    unpinned = [key for key in run_cfg['data_sources'] if key not in assignment]
+    for i, key in enumerate(unpinned):
+        assignment[key] = i % workers
+
+    publishers = {}
+    for subject, observer in run_edges(run_cfg):
+        publishers.setdefault(observer, []).append(subject)
+    pending = [key for key in list(run_cfg['algorithms']) + list(run_cfg['data_output']) if key not in assignment]
+    while pending:
+        placed = [key for key in pending if any(subject in assignment for subject in publishers.get(key, []))]
+        if not placed:
+            for key in pending:  # unreachable nodes have no data to follow
+                assignment[key] = 0
+            break
+        for key in placed:
+            assignment[key] = next(assignment[subject] for subject in publishers[key] if subject in assignment)
+        pending = [key for key in pending if key not in assignment]
+    return assignment
+
+
+class _RemoteStage(Stage):
+    """
+    Stands in for an observer on another worker. Publishing sends a snapshot of the message over the edge's own
+    connection, and closing sends the end-of-stream marker.
+    """
+
+    def __init__(self, name: str, address, authkey: bytes, edge: Tuple[str, str, str]):
+        super().__init__(name, None, 0)
+        self._connection = Client(address, authkey=authkey)
+        self._connection.send(('edge', edge))
+
+    def update(self, subject) -> None:
+        self._connection.send(('message', dict(subject.pubsub_message)))
+        self.messages += 1
+
+    def close(self) -> None:
+        self._connection.send(('end',))
+        self._connection.close()
+
+    def run(self) -> None:
+        pass
+
+
+def _receive(stage: Stage, connection) -> None:
+    """ Feeds a local stage the messages of one incoming edge until its publisher ends the stream. """
+    try:
+        while True:
+            message = connection.recv()
+            if message[0] == 'end':
+                break
+            stage.put(PubSubMessage(message[1]))
+    except (EOFError, OSError) as error:
+        stage.error = stage.error or ConnectionError(f'lost the connection feeding {stage.name}: {error!r}')
+        _LOGGER.error(f'   DISTRIBUTED EDGE LOST      | {stage.name}: {error!r}')
+    finally:
+        connection.close()
+        stage.close()
+
+
+class Worker():
+    """
+    Serves coordinators and the incoming edges of other workers on one address.
+
+    Args:
+        address: the (host, port) to listen on. Port 0 picks a free port, see the address attribute.
+        authkey: the key every coordinator and worker of the cluster shares.
+
+    Attributes:
+        address: the (host, port) the worker listens on.
+    """
+
+    def __init__(self, address, authkey: bytes):
+        self._listener = Listener(parse_address(address), authkey=authkey)
+        self.address = self._listener.address
+        self._authkey = authkey
+        self._edges: Dict[Tuple[str, str, str], Any] = {}
+        self._arrived = threading.Condition()
+        self._stopped = threading.Event()
+
+    def serve(self) -> None:
+        """ Accepts connections until a coordinator stops the worker. """
+        _LOGGER.info(f'   DISTRIBUTED WORKER         | listening on {self.address[0]}:{self.address[1]}')
+        while not self._stopped.is_set():
+            try:
+                connection = self._listener.accept()
+                hello = connection.recv()
+            except multiprocessing.AuthenticationError as error:
+                _LOGGER.warning(f'   DISTRIBUTED REFUSED        | {error!r}')
+                continue
+            except (EOFError, OSError):
+                continue
+
+            if hello[0] == 'edge':
+                with self._arrived:
+                    self._edges[hello[1]] = connection
+                    self._arrived.notify_all()
+            elif hello[0] == 'coordinator':
+                threading.Thread(target=self._serve_coordinator, args=(connection,), name='datapipes-coordinator',
+                                 daemon=True).start()
+        _LOGGER.info('   DISTRIBUTED WORKER         | stopped')
+
+    def _stop(self) -> None:
+        self._stopped.set()
+        try:
+            Client(self.address, authkey=self._authkey).close()  # wakes the accept loop
+        except OSError:
+            pass
+        self._listener.close()
+
+    def _serve_coordinator(self, connection) -> None:
+        """ Executes a coordinator's commands in order, replying ('done', result) or ('failed', error) to each. """
+        while True:
+            try:
+                command = connection.recv()
+            except (EOFError, OSError):
+                return
+            if command[0] == 'stop':
+                connection.send(('done', None))
+                connection.close()
+                return self._stop()
+
+            try:
+                result = getattr(self, f'_{command[0]}')(*command[1:])
+                reply = ('done', result)
+            except Exception as error:
+                _LOGGER.error(f'   DISTRIBUTED JOB FAILED     | {command[0]}: {error!r}')
+                reply = ('failed', repr(error))
+            connection.send(reply)
+
+    def _setup(self, modules: List[str], declared: Dict[str, str], log_settings: Dict[str, Any]) -> None:
+        """ Registers the coordinator's algorithms and configures the logger, as for local worker processes. """
+        for module in modules:
+            import_module(module)
+        for name, target in declared.items():
+            Factory.declare(name, target)
+        logger.configure_logger(**log_settings)
+
+    def _run(self, cfg: Dict[str, Any], key: str) -> None:
+        """ Executes a whole independent run here. """
+        from datapipes.run import RunLocal  # datapipes.run imports this module
+        RunLocal(cfg)._execute_run(key)
+
+    def _graph(self, job: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Executes this worker's share of one run: builds its nodes, connects the edges that cross to other workers
+        and runs its stages until every incoming edge has ended.
+
+        Returns:
+            The statistics of the local stages.
+        """
+        from datapipes.run import RunLocal  # datapipes.run imports this module
+
+        run = job['cfg']['independent_runs'][job['key']]
+        assignment = job['assignment']
+        mine = {key for key, index in assignment.items() if index == job['index']}
+        runner = RunLocal(job['cfg'])
+
+        local_run = {'data_sources': {}, 'algorithms': {}, 'data_output': {}}
+        for key, source in run['data_sources'].items():
+            if key in mine:
+                source = runner._pushdown(source, run['algorithms'])  # for every observer, not just the local ones
+                local_run['data_sources'][key] = dict(source, observers=[o for o in source['observers'] if o in mine])
+        for key, alg in run['algorithms'].items():
+            if key in mine:
+                local_run['algorithms'][key] = dict(alg, observers=[o for o in alg['observers'] if o in mine])
+        local_run['data_output'] = {key: out for key, out in run['data_output'].items() if key in mine}
+
+        graph = runner._build_graph(local_run)
+        engine = StreamEngine(graph, queue_size=job['queue_size'])
+
+        publishers = {**graph['sources'], **graph['algorithms']}
+        incoming = []
+        for subject, observer in run_edges(run):
+            if subject in mine and observer not in mine:
+                address = job['addresses'][assignment[observer]]
+                observer_cfg = run['algorithms'].get(observer) or run['data_output'].get(observer)
+                source = runner._pushdown(run['data_sources'][subject], run['algorithms']) \
+                    if subject in run['data_sources'] else None
+                publishers[subject].PubSub.attach(_RemoteStage(observer, address, self._authkey,
+                                                               (job['id'], subject, observer)),
+                                                  **runner._subscription(observer_cfg, source))
+            elif observer in mine and subject not in mine:
+                engine.stage(observer).upstream += 1
+                incoming.append((job['id'], subject, observer))
+
+        _LOGGER.debug('   DISTRIBUTED GRAPH          | %s: %s here, %d incoming edges', job['key'], sorted(mine),
+                      len(incoming))
+        receivers = []
+        for edge in incoming:
+            receiver = threading.Thread(target=_receive, args=(engine.stage(edge[2]), self._await_edge(edge, job['timeout'])),
+                                        name=f'datapipes-edge-{edge[1]}', daemon=True)
+            receiver.start()
+            receivers.append(receiver)
+
+        try:
+            with runner._fanout_scope():
+                stats = engine.run()
+        finally:
+            for receiver in receivers:
+                receiver.join()
+            runner._close_outputs(graph)
+        return stats
+
+    def _await_edge(self, edge: Tuple[str, str, str], timeout: float):
+        with self._arrived:
+            if not self._arrived.wait_for(lambda: edge in self._edges, timeout):
+                raise TimeoutError(f'{edge[1]} never connected to {edge[2]} within {timeout}s')
+            return self._edges.pop(edge)
+
+
+class WorkerClient():
+    """ The coordinator's connection to one worker. """
+
+    def __init__(self, address, authkey: bytes):
+        self.address = parse_address(address)
+        self._connection = Client(self.address, authkey=authkey)
+        self._connection.send(('coordinator',))
+
+    def send(self, *command) -> None:
+        self._connection.send(command)
+
+    def result(self) -> Any:
+        """ The reply to the oldest command sent. Raises RuntimeError if the worker failed it. """
+        status, result = self._connection.recv()
+        if status == 'failed':
+            raise RuntimeError(f'worker {self.address[0]}:{self.address[1]} failed: {result}')
+        return result
+
+    def call(self, *command) -> Any:
+        self.send(*command)
+        return self.result()
+
+    def close(self) -> None:
+        """ Disconnects, leaving the worker serving other coordinators. """
+        self._connection.close()
+
+    def stop(self) -> None:
+        """ Stops the worker. """
+        try:
+            self.call('stop')
+        except (EOFError, OSError):
+            pass
+        self._connection.close()
+
+
+def _serve_local(authkey: bytes, connection) -> None:
+    """ The target of a spawned local worker process. Reports its address, then serves. """
+    worker = Worker(('127.0.0.1', 0), authkey)
+    connection.send(worker.address)
+    connection.close()
+    worker.serve()
+
+
+def spawn_workers(count: int, authkey: bytes) -> List[Tuple[multiprocessing.Process, Tuple[str, int]]]:
+    """ Starts count worker processes on this machine, listening on free local ports. Returns them with their addresses. """
+    workers = []
+    for _ in range(count):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_serve_local, args=(authkey, sender), name='datapipes-worker',
+                                          daemon=True)
+        process.start()
+        sender.close()
+        workers.append((process, receiver.recv()))
+        receiver.close()
+    return workers
+
+
+@click.command()
+@click.option('--listen', default='0.0.0.0:7070', help='The host:port to listen on.')
+@click.option('--authkey', default=None, help='The key shared by the cluster. Defaults to $DATAPIPES_AUTHKEY.')
+def worker(listen, authkey):
+    authkey = authkey or os.environ.get('DATAPIPES_AUTHKEY')
+    if not authkey:
+        raise click.UsageError('A worker needs an authkey: pass --authkey or set DATAPIPES_AUTHKEY.')
+    logger.configure_logger('info', 'text')
+    Worker(listen, authkey.encode()).serve()
+
+
+if __name__ == '__main__':
+    worker()
@@ -1,7 +1,9 @@
 """
 Contains the overall factory definition.
 """
-import logging, json
+import ast, logging, json, os, sys
+from importlib import import_module
+from importlib.metadata import entry_points
 from typing import Callable, Dict
 
 from datapipes._utilities.logger import LOGGER_NAME
@@ -24,6 +26,9 @@ class Factory:
     @Factory.register('your_algorithm_name')
     class your_algorithm_name():
 
+    Algorithms may also be declared by name (Factory.declare, a manifest, or the 'datapipes.algorithms' entry point
+    group), in which case their module is only imported when the config first uses them.
+
     Args:
         Name: The name of the class/funcation/algorithm being decorated. Must match the config.py reference.
 
@@ -36,8 +41,12 @@ class Factory:
     """
 
     __registry = {}
+    __declared = {}
+    __entry_points_loaded = False
     __temp_obj = None
 
+    ENTRY_POINT_GROUP = 'datapipes.algorithms'
+
     @staticmethod
     def notify(self):
         """Adds the method 'notify' to the decorated client class"""
@@ -66,20 +75,29 @@ class Factory:
     #     return dict
 
     @classmethod
-    def register(cls, name:str=None) -> Callable:
+    def register(cls, name:str=None, partitionable:bool=False) -> Callable:
         """
         Class method to register the client algorithm to the internal registry.
         Decorate your algorithm class with your algorithm name like so:
 
         @Factory.register('your_algorithm_name')
         class your_algorithm_name():
+
+        partitionable=True declares that the algorithm's update treats rows independently, so the runner may split
+        large DataFrames and update copies of the algorithm on each partition in parallel (see datapipes.partition).
+        Defining map_partition(self, data) -> data declares the same.
+        Registering the same class again, as reloading its module does, replaces it silently.
         """
 
         def inner_wrapper(wrapped_class) -> Callable:
-            if name in cls.__registry:
+            registered = cls.__registry.get(name)
+            if registered is not None and (registered.__module__, registered.__qualname__) != (
+                    wrapped_class.__module__, wrapped_class.__qualname__):
                 _LOGGER.critical(f'DataPipes Factory class {name} already exists. Will be replaced.')
 
             cls.__registry[name] = wrapped_class
+            if partitionable:
+                wrapped_class.partitionable = True
 
             # setattr(wrapped_class, 'update', eval('update'))
             setattr(wrapped_class, 'notify', eval('cls.notify'))
@@ -90,6 +108,101 @@ class Factory:
 
         return inner_wrapper
 
+    @classmethod
+    def registered(cls) -> Dict[str, Callable]:
+        """ A copy of the registry: each registered name and its client class. """
+        return dict(cls.__registry)
+
+    @classmethod
+    def declared(cls) -> Dict[str, str]:
+        """ A copy of the declarations not imported yet: each name and its 'module' or 'module:Class' target. """
+        return dict(cls.__declared)
+
+    @classmethod
+    def declare(cls, name:str, target:str) -> None:
+        """
+        Declares a client algorithm by name without importing it. The target module is only imported when
+        Factory.create first asks for the name.
+
+        Args:
+            name: The registered name, as referenced by the config.
+            target: 'package.module' (whose import runs the @Factory.register decorator) or 'package.module:Class'.
+        """
+        if name not in cls.__registry:
+            cls.__declared[name] = target
+
+    @classmethod
+    def load_manifest(cls, path:str) -> None:
+        """ Declares every algorithm listed in a manifest written by Factory.write_manifest. """
+        with open(path, 'r') as fp:
+            for name, target in json.load(fp).items():
+                cls.declare(name, target)
+
+    @classmethod
+    def load_entry_points(cls, group:str=ENTRY_POINT_GROUP) -> None:
+        """
+        Declares the algorithms installed packages advertise as entry points, e.g. in setup.py:
+        entry_points={'datapipes.algorithms': ['your_algorithm_name = your_package.module:YourClass']}
+        Only package metadata is read; nothing is imported.
+        """
+        found = entry_points()
+        found = found.select(group=group) if hasattr(found, 'select') else found.get(group, [])
+        for entry_point in found:
+            cls.declare(entry_point.name, entry_point.value)
+        cls.__entry_points_loaded = True
+
+    @classmethod
+    def _resolve(cls, name:str) -> None:
+        """ Imports the module declared for a name, registering its class if the import did not. """
+        if name not in cls.__declared and not cls.__entry_points_loaded:
+            cls.load_entry_points()
+        if name not in cls.__declared:
+            return
+
+        # The declaration is only dropped once the import worked, so a failed import can be retried.
+        module_name, _, attribute = cls.__declared[name].partition(':')
+        _LOGGER.debug('    LAZY IMPORT                  | importing %s for %s', module_name, name)
+        module = import_module(module_name)
+        if name not in cls.__registry and attribute:
+            cls.register(name)(getattr(module, attribute))
+        cls.__declared.pop(name, None)
+
+    @staticmethod
+    def write_manifest(path:str, *package_dirs:str) -> Dict[str, str]:
+        """
+        Writes a manifest of every class decorated with @Factory.register('name') in the given package directories,
+        found by parsing their source rather than importing it. Load it with Factory.load_manifest, or with
+        plugin_manifest in the YAML configuration.
+
+        Returns:
+            The manifest: each registered name and its 'module:Class' target.
+        """
+        manifest = {}
+        for package_dir in package_dirs:
+            package_dir = os.path.abspath(package_dir)
+            root = os.path.dirname(package_dir)
+            for directory, _, file_names in os.walk(package_dir):
+                for file_name in sorted(file_names):
+                    if not file_name.endswith('.py'):
+                        continue
+                    source_file = os.path.join(directory, file_name)
+                    module_name = os.path.relpath(source_file, root)[:-len('.py')].replace(os.sep, '.')
+                    module_name = module_name[:-len('.__init__')] if module_name.endswith('.__init__') else module_name
+                    with open(source_file, 'r') as fp:
+                        tree = ast.parse(fp.read(), source_file)
+                    for node in ast.walk(tree):
+                        if not isinstance(node, ast.ClassDef):
+                            continue
+                        for decorator in node.decorator_list:
+                            if (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)
+                                    and decorator.func.attr == 'register' and decorator.args
+                                    and isinstance(decorator.args[0], ast.Constant)):
+                                manifest[decorator.args[0].value] = f'{module_name}:{node.name}'
+
+        with open(path, 'w') as fp:
+            json.dump(manifest, fp, indent=2, sort_keys=True)
+        return manifest
+
     @classmethod
     def create(cls, *args, **kwargs):
         """
@@ -106,10 +219,12 @@ class Factory:
         args = list(args)
         name = args.pop(0)
 
+        if name not in cls.__registry:
+            cls._resolve(name)
         if name not in cls.__registry:
             raise NotImplementedError(f"class {name} does not exist in the registry")
 
-        _LOGGER.debug(f'    OBJECT INSTANTIATED          | one {name} has been instantiated')
+        _LOGGER.debug('    OBJECT INSTANTIATED          | one %s has been instantiated', name)
 
         registered_obj = cls._Factory__registry[name](*args, **kwargs)
         registered_obj.PubSub = PubSub()
@@ -118,3 +233,8 @@ class Factory:
         registered_obj.PubSub.pubsub_message['data'] = None
 
         return registered_obj
+
+
+if __name__ == '__main__':
+    # python -m datapipes.factory <manifest.json> <package directory> [<package directory> ...]
+    Factory.write_manifest(sys.argv[1], *sys.argv[2:])
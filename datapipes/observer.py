@@ -1,8 +1,10 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import List, Callable, Dict
+from typing import Any, List, Callable, Dict
 from datapipes._utilities.logger import LOGGER_NAME
+from datapipes._utilities.frames import fanout_view, row_mask
 import logging
+import pandas as pd
 
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
@@ -49,11 +51,11 @@ class ConcreteSubject(Subject):
     # (updated could require tests or assertions of output passed)
     # This would be done in run.py, reading the yaml file and attaching those observers, and calling CS.dataready()
     def attach(self, observer: 'Observer') -> None:
-        _LOGGER.debug(f'   NEW PUB/SUB SUBSCRIBER       | Attached an observer to -> {self}')
+        _LOGGER.debug('   NEW PUB/SUB SUBSCRIBER       | Attached an observer to -> %s', self)
         self._observers.append(observer)
 
     def detach(self, observer: 'Observer') -> None:
-        _LOGGER.debug(f'   REMOVED PUB/SUB SUBSCRIBER   | Removed an observer from -> {self}')
+        _LOGGER.debug('   REMOVED PUB/SUB SUBSCRIBER   | Removed an observer from -> %s', self)
         self._observers.remove(observer)
 
     """
@@ -69,7 +71,8 @@ class ConcreteSubject(Subject):
 
     def notify_one(self, observer: 'Observer'=None) -> None:
         """ Trigger an update in a specific subscriber. """
-        _LOGGER.debug(f' PUBLISHING RESULTS          | {type(self).__name__} -> Notified -> {type(observer).__name__}')
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(' PUBLISHING RESULTS          | %s -> Notified -> %s', type(self).__name__, type(observer).__name__)
         observer.update(self)
 
     def dataReady(self) -> None:
@@ -87,7 +90,7 @@ class ConcreteSubject(Subject):
         """
         self._state = randrange(0, 10)
 
-        _LOGGER.debug(f"{self}: State changed to: {self._state}. \nNotifying observers.")
+        _LOGGER.debug("%s: State changed to: %s. \nNotifying observers.", self, self._state)
         self.notify()
 
 
@@ -98,15 +101,63 @@ class Observer(ABC):
     def update(self, subject: Subject) -> None:
         """ Receive update from subject.
         ...we could include common update logic here... """
-        _LOGGER.debug(f"{self}: Reacting to the event: {subject}.")
+        _LOGGER.debug('%s: Reacting to the event: %s.', self, subject)
         pass
 
 
+class PubSubMessage():
+    """
+    A snapshot of a publisher's pubsub_message.
+    Observers that are updated outside of the publisher's notify loop (on another thread, process or host) receive
+    one of these in place of the publisher's PubSub, so later publications cannot change what they read.
+    """
+    __slots__ = ('pubsub_message',)
+
+    def __init__(self, pubsub_message: Dict = None):
+        self.pubsub_message = dict(pubsub_message or {})
+
+
+class Subscription():
+    """
+    What one observer wants of a publisher's messages.
+
+    Attributes:
+        topics: the message topics (pubsub_message['topic']) the observer receives, None for every message.
+        where: (optional) only the DataFrame rows matching this DataFrame.eval expression, callable or filter list
+        (see datapipes._utilities.frames.row_mask).
+        columns: (optional) only these DataFrame columns.
+    """
+    __slots__ = ('topics', 'where', 'columns')
+
+    def __init__(self, topic: Any = None, where: Any = None, columns: List[str] = None):
+        self.topics = None if topic is None else frozenset([topic] if isinstance(topic, str) else topic)
+        self.where = where
+        self.columns = list(columns) if columns else None
+
+    @property
+    def slices(self) -> bool:
+        return self.where is not None or self.columns is not None
+
+    def where_key(self) -> Any:
+        """ Identifies the filter, so observers with the same filter share one mask per message. """
+        return id(self.where) if callable(self.where) else repr(self.where)
+
+
 # def PubSubDecorator(cls):
 class PubSub(): #ConcreteSubject,Observer):
     """
     Publish Subscribe decorator for object instantiated by the Data Factory.
+
+    Observers attached with a topic, a row filter (where) or columns only receive the messages and the slice of the
+    data they subscribed to. Subscribers are indexed by topic, so a message never visits observers of other topics,
+    and each distinct filter is evaluated once per message, over whole columns, however many observers share it.
+
+    Attributes:
+        fanout: how observers receive the published data. 'shared' (default) passes this PubSub, so every observer
+        reads the same mutable object. 'readonly' and 'copy_on_write' pass each observer a PubSubMessage holding
+        its own view of the data over one physical copy (see datapipes._utilities.frames.fanout_view).
     """
+    fanout = 'shared'
     def __init__(self): #,wrapped_class): #*args,**kwargs):
         ConcreteSubject.__init__(self)
         Observer.__init__(self)
@@ -114,27 +165,93 @@ class PubSub(): #ConcreteSubject,Observer):
 
         self._state: int = 0
         self._observers: List['Observer'] = []
+        self._subscriptions: Dict[int, Subscription] = {}  # id(observer) -> Subscription, for subscribed observers
+        self._topics: Dict[Any, List['Observer']] = {}     # topic -> observers receiving it, built on first use
 
-    def attach(self, observer: 'Observer') -> None:
-        _LOGGER.debug(f'   NEW PUB/SUB SUBSCRIBER       | Attached an observer to -> {self}')
+    def attach(self, observer: 'Observer', topic: Any = None, where: Any = None, columns: List[str] = None) -> None:
+        """
+        Attach an observer. By default it receives every message whole.
+
+        Args:
+            topic: (optional) a topic, or list of topics, the observer only receives messages of.
+            where: (optional) a row filter. The observer receives only the matching rows of DataFrame data, and is
+            not notified when no row matches.
+            columns: (optional) the DataFrame columns the observer receives.
+        """
+        _LOGGER.debug('   NEW PUB/SUB SUBSCRIBER       | Attached an observer to -> %s', self)
         self._observers.append(observer)
+        if topic is not None or where is not None or columns:
+            self._subscriptions[id(observer)] = Subscription(topic, where, columns)
+        self._topics.clear()
 
     def detach(self, observer: 'Observer') -> None:
-        _LOGGER.debug(f'   REMOVED PUB/SUB SUBSCRIBER   | Removed an observer from -> {self}')
+        _LOGGER.debug('   REMOVED PUB/SUB SUBSCRIBER   | Removed an observer from -> %s', self)
         self._observers.remove(observer)
+        self._subscriptions.pop(id(observer), None)
+        self._topics.clear()
+
+    def replace(self, observer: 'Observer', replacement: 'Observer') -> None:
+        """ Swap an attached observer for another, keeping its place in the notification order and its subscription. """
+        self._observers[self._observers.index(observer)] = replacement
+        if id(observer) in self._subscriptions:
+            self._subscriptions[id(replacement)] = self._subscriptions.pop(id(observer))
+        self._topics.clear()
+
+    def subscribers(self, topic: Any = None) -> List['Observer']:
+        """ The observers a message of this topic reaches, in notification order. """
+        if topic not in self._topics:
+            subscriptions = self._subscriptions
+            self._topics[topic] = [observer for observer in self._observers
+                                   if id(observer) not in subscriptions or subscriptions[id(observer)].topics is None
+                                   or topic in subscriptions[id(observer)].topics]
+        return self._topics[topic]
 
     def notify(self) -> None:
         """ Trigger an update in each subscriber. """
         # _LOGGER.debug(f' PUBLISHING RESULTS          | {type(self).__name__}: Notifying observers...')
-        for observer in self._observers:
-            self.notify_one(observer)
-            # observer.update(self)
+        if not self._subscriptions:
+            for observer in self._observers:
+                self.notify_one(observer)
+                # observer.update(self)
+            return
+
+        data = self.pubsub_message.get('data')
+        masks = {}
+        for observer in self.subscribers(self.pubsub_message.get('topic')):
+            subscription = self._subscriptions.get(id(observer))
+            if subscription is None or not subscription.slices or not isinstance(data, pd.DataFrame):
+                self.notify_one(observer)
+                continue
+
+            if subscription.where is None:
+                self.notify_slice(observer, data[subscription.columns])
+                continue
+            key = subscription.where_key()
+            if key not in masks:
+                masks[key] = row_mask(data, subscription.where)
+            if masks[key].any():
+                rows = data.loc[masks[key]]
+                self.notify_slice(observer, rows[subscription.columns] if subscription.columns else rows)
 
     def notify_one(self, observer: 'Observer' = None) -> None:
         """ Trigger an update in a specific subscriber. """
-        _LOGGER.debug(
-            f' PUBLISHING RESULTS          | {type(self).__name__} -> Notified -> {type(observer).__name__}')
-        observer.update(self)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(' PUBLISHING RESULTS          | %s -> Notified -> %s', type(self).__name__, type(observer).__name__)
+        if self.fanout == 'shared':
+            observer.update(self)
+        else:
+            message = PubSubMessage(self.pubsub_message)
+            message.pubsub_message['data'] = fanout_view(message.pubsub_message.get('data'), self.fanout)
+            observer.update(message)
+
+    def notify_slice(self, observer: 'Observer', data: Any) -> None:
+        """ Trigger an update in a subscriber with its own slice of the published data. """
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug(' PUBLISHING RESULTS          | %s -> Notified %d rows -> %s', type(self).__name__, len(data),
+                          type(observer).__name__)
+        message = PubSubMessage(self.pubsub_message)
+        message.pubsub_message['data'] = fanout_view(data, self.fanout)
+        observer.update(message)
 
     # def update(self, subject: Subject) -> None:
     #     """ Receive update from subject."""
@@ -156,7 +273,7 @@ class PubSub(): #ConcreteSubject,Observer):
         """
         self._state = randrange(0, 10)
 
-        _LOGGER.debug(f"{self}: State changed to: {self._state}. \nNotifying observers.")
+        _LOGGER.debug("%s: State changed to: %s. \nNotifying observers.", self, self._state)
         self.notify()
 
     # def wrap_update(self,update):
@@ -0,0 +1,135 @@
+"""
+Data-parallel execution of row-independent algorithms.
+
+An algorithm registered with Factory.register(name, partitionable=True), or defining map_partition, may have each
+DataFrame it receives split into partitions that are processed on a process pool. The results are combined, by the
+algorithm's reduce_partitions or by concatenation in the original row order, before anything is published.
+"""
+import copy, logging, math, os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Tuple
+
+import pandas as pd
+
+from datapipes._utilities import shared
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes.observer import PubSubMessage
+from datapipes.scheduler import _update_in_process
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def is_partitionable(algorithm: Any) -> bool:
+    """ Whether an algorithm (class or instance) declared itself partitionable or defines map_partition. """
+    return bool(getattr(algorithm, 'partitionable', False)) or callable(getattr(algorithm, 'map_partition', None))
+
+
+def partition_bounds(rows: int, partitions: int) -> List[Tuple[int, int]]:
+    """ The (start, stop) of consecutive row slices, at most `partitions` of them and of nearly equal length. """
+    size = max(1, math.ceil(rows / partitions))
+    return [(start, min(start + size, rows)) for start in range(0, rows, size)]
+
+
+def combine(algorithm: Any, results: List[Any]) -> Any:
+    """ The algorithm's reduce_partitions of the partition results, or their concatenation. """
+    reduce_partitions = getattr(algorithm, 'reduce_partitions', None)
+    if callable(reduce_partitions):
+        return reduce_partitions(results)
+    return pd.concat(results)
+
+
+def _map_partition(algorithm: Any, data: Any) -> Any:
+    """ Runs map_partition on one partition in a worker process, mapping and handing back shared memory frames. """
+    return shared.pack({'data': algorithm.map_partition(shared.unpack({'data': data})['data'])}, readers=0)['data']
+
+
+class PartitionPool():
+    """
+    The process pool the partitions of every partitionable algorithm of a runner share. Started on first use.
+
+    Args:
+        workers: (optional) the number of processes. Defaults to the number of CPUs.
+        min_rows: frames with fewer rows are processed whole, in this process, as splitting would cost more.
+    """
+
+    MIN_ROWS = 10000
+
+    def __init__(self, workers: int = None, min_rows: int = MIN_ROWS):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_rows = min_rows
+        self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            shared.prepare()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def wrap(self, algorithm: Any, name: str = None, partitions: int = None) -> Any:
+        """ Route the algorithm's updates through the pool, in `partitions` pieces (default one per worker). """
+        algorithm.update = _PartitionedUpdate(self, algorithm, name or type(algorithm).__name__,
+                                              partitions or self.workers)
+        return algorithm
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+class _PartitionedUpdate():
+    """
+    Replaces an algorithm's update. Large DataFrames are split, and every partition is processed on the pool by a
+    copy of the algorithm: with map_partition if it has one, otherwise with its update, whose publications are then
+    combined position by position. Partition copies cannot change the algorithm's own state.
+    """
+
+    def __init__(self, partitions: PartitionPool, algorithm: Any, name: str, count: int):
+        self._partitions = partitions
+        self._algorithm = algorithm
+        self._update = algorithm.update
+        self._name = name
+        self._count = count
+
+    def __call__(self, subject) -> None:
+        data = subject.pubsub_message.get('data')
+        if self._count < 2 or not isinstance(data, pd.DataFrame) or len(data) < max(2, self._partitions.min_rows):
+            return self._update(subject)
+
+        bounds = partition_bounds(len(data), self._count)
+        publisher = self._algorithm.PubSub
+        _LOGGER.debug('   PARTITIONED UPDATE         | %s: %d rows in %d partitions', self._name, len(data), len(bounds),
+                      extra={'node': self._name})
+
+        node = copy.copy(self._algorithm)
+        for attribute in ('PubSub', 'update'):
+            vars(node).pop(attribute, None)
+        pool = self._partitions.pool
+
+        # The whole frame goes into shared memory once, and every task maps only the rows of its partition.
+        if shared.shareable(data):
+            handle = shared.share(data, readers=len(bounds))
+            parts = [handle.partition(start, stop) for start, stop in bounds]
+        else:
+            handle = None
+            parts = [data.iloc[start:stop] for start, stop in bounds]
+
+        if callable(getattr(self._algorithm, 'map_partition', None)):
+            futures = [pool.submit(_map_partition, node, part) for part in parts]
+        else:
+            futures = [pool.submit(_update_in_process, node, dict(publisher.pubsub_message, data=None),
+                                   PubSubMessage(dict(subject.pubsub_message, data=part))) for part in parts]
+        for future in futures:
+            future.add_done_callback(lambda done: shared.release(handle))
+
+        if callable(getattr(self._algorithm, 'map_partition', None)):
+            results = [shared.unpack({'data': future.result()})['data'] for future in futures]
+            publisher.pubsub_message['data'] = combine(self._algorithm, results)
+            publisher.notify()
+            return
+
+        published = [[shared.unpack(message) for message in future.result()[1]] for future in futures]
+        for messages in zip(*published):
+            publisher.pubsub_message = dict(messages[0], data=combine(self._algorithm, [m['data'] for m in messages]))
+            publisher.notify()
@@ -0,0 +1,390 @@
+"""
+Compiles a YAML configuration into an immutable execution plan.
+
+The compiler parses the YAML (with libyaml's C loader when PyYAML was built with it), validates it, checks that
+every run's graph is acyclic and that every observer key exists, and applies the column and filter pushdown to the
+data sources. The plan is cached on disk next to the configuration file, under a hash of the file, the DataPipes
+version and the versions of the installed algorithm packages, so launching the same configuration again reads the
+plan back instead of parsing and validating the YAML, and the runner builds each run's graph from the plan. A cached
+plan is also recompiled when a plugin module or manifest it names has changed.
+
+    python -m datapipes.plan config.yml      # reports the problems of a configuration without running it
+"""
+import hashlib, json, logging, os, pickle, sys, uuid
+from importlib import metadata, util
+from typing import Any, Dict, List, Tuple
+
+import yaml
+
+from datapipes._utilities.frames import FANOUT_MODES
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes._utilities.utilities import topological_order
+from datapipes.dataio import DataContext
+from datapipes.distributed import run_edges
+from datapipes.factory import Factory
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+Loader = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+
+PLAN_CACHE = '.datapipes_plans'
+PLAN_VERSION = 1
+
+RUN_STRATEGIES = ('local', 'local_async', 'distributed')
+DATA_MODES = ('batch', 'stream')
+EXECUTORS = ('sync', 'thread', 'process')
+SECTIONS = ('data_sources', 'algorithms', 'data_output')
+SUBSCRIBE_KEYS = ('topic', 'where', 'columns')
+
+
+class ConfigurationError(ValueError):
+    """
+    A configuration that cannot run.
+
+    Attributes:
+        problems: every problem found, one sentence each.
+    """
+
+    def __init__(self, source: str, problems: List[str]):
+        self.problems = problems
+        super().__init__(f'{source} has {len(problems)} problem(s):\n' + '\n'.join(f'  - {p}' for p in problems))
+
+
+class FrozenDict(dict):
+    """ A dict that refuses changes. Pickles as a plain dict would. """
+
+    def _frozen(self, *args, **kwargs):
+        raise TypeError(f'{type(self).__name__} is immutable. Use ExecutionPlan.config() for a mutable copy.')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _frozen
+    __ior__ = _frozen
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __hash__(self):
+        return hash(tuple(sorted(self.items(), key=repr)))
+
+
+def freeze(value: Any) -> Any:
+    """ The value with every dict made a FrozenDict and every list a tuple, recursively. """
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """ A mutable deep copy of a frozen value: dicts and lists again. """
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class RunPlan():
+    """
+    The compiled graph of one independent run.
+
+    Attributes:
+        order: the node keys in topological order.
+        edges: every ('from','to') connection.
+    """
+    __slots__ = ('order', 'edges')
+
+    def __init__(self, order: Tuple[str, ...], edges: Tuple[Tuple[str, str], ...]):
+        object.__setattr__(self, 'order', order)
+        object.__setattr__(self, 'edges', edges)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable.')
+
+    def __reduce__(self):
+        return (RunPlan, (self.order, self.edges))
+
+
+class ExecutionPlan():
+    """
+    A validated configuration, ready to run. Immutable: config() gives the runner its own mutable copy.
+
+    Attributes:
+        key: the cache key the plan was compiled under.
+        cfg: the frozen configuration, with pushdown applied to the data sources.
+        runs: the RunPlan of each independent run.
+        dependencies: the (mtime, size) of the plugin modules and manifests the plan was compiled against.
+    """
+    __slots__ = ('key', 'cfg', 'runs', 'dependencies')
+
+    def __init__(self, key: str, cfg: Dict, runs: Dict[str, RunPlan], dependencies: Dict[str, Tuple]):
+        object.__setattr__(self, 'key', key)
+        object.__setattr__(self, 'cfg', freeze(cfg))
+        object.__setattr__(self, 'runs', FrozenDict(runs))
+        object.__setattr__(self, 'dependencies', freeze(dependencies))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable.')
+
+    def __reduce__(self):
+        return (ExecutionPlan, (self.key, self.cfg, dict(self.runs), self.dependencies))
+
+    def config(self) -> Dict[str, Any]:
+        return thaw(self.cfg)
+
+    def current(self) -> bool:
+        """ Whether the plugin modules and manifests the plan depends on are unchanged. """
+        return all(_stat(path) == tuple(stat) for path, stat in self.dependencies.items())
+
+
+def parse(path: str) -> Dict[str, Any]:
+    """ The YAML configuration file, parsed with the C loader when available. """
+    with open(path, 'r') as fp:
+        return yaml.load(fp, Loader=Loader)
+
+
+def _entry_points() -> list:
+    found = metadata.entry_points()
+    if hasattr(found, 'select'):
+        return list(found.select(group=Factory.ENTRY_POINT_GROUP))
+    return list(found.get(Factory.ENTRY_POINT_GROUP, []))
+
+
+def _known_algorithms(cfg: Dict[str, Any]) -> set:
+    """ The names Factory.create can resolve for this configuration, without importing any plugin. """
+    names = set(Factory.registered()) | set(Factory.declared()) | set(cfg.get('plugins') or {})
+    manifest = cfg.get('plugin_manifest')
+    if manifest and os.path.isfile(manifest):
+        with open(manifest, 'r') as fp:
+            names |= set(json.load(fp))
+    return names | {entry_point.name for entry_point in _entry_points()}
+
+
+def _check_choice(problems: List[str], cfg: Dict, key: str, options: Tuple, where: str = '', required: bool = False):
+    if key not in cfg:
+        if required:
+            problems.append(f'{where}{key} is missing. Options include: {options}')
+        return
+    if cfg[key] not in options:
+        problems.append(f'{where}{key} {cfg[key]!r} is not implemented. Options include: {options}')
+
+
+def validate(cfg: Any) -> List[str]:
+    """
+    Every problem of a configuration: missing or mistyped keys, unknown options, unknown algorithms, malformed
+    subscriptions, observer keys that lead nowhere, and cycles.
+    """
+    if not isinstance(cfg, dict):
+        return [f'the configuration must be a mapping, not {type(cfg).__name__}']
+
+    problems = []
+    _check_choice(problems, cfg, 'run_strategy', RUN_STRATEGIES, required=True)
+    _check_choice(problems, cfg, 'data_mode', DATA_MODES, required=True)
+    _check_choice(problems, cfg, 'executor', EXECUTORS)
+    _check_choice(problems, cfg, 'fanout', FANOUT_MODES)
+    if not isinstance(cfg.get('max_parallel_runs', 1), int) or cfg.get('max_parallel_runs', 1) < 1:
+        problems.append(f'max_parallel_runs must be a positive integer, not {cfg["max_parallel_runs"]!r}')
+    if not isinstance(cfg.get('plugins') or {}, dict):
+        problems.append('plugins must map algorithm names to "module" or "module:Class" targets')
+
+    runs = cfg.get('independent_runs')
+    if not isinstance(runs, dict) or not runs:
+        problems.append('independent_runs must map each run key to its data_sources, algorithms and data_output')
+        return problems
+
+    known = _known_algorithms(cfg)
+    for run_key, run in runs.items():
+        where = f'independent_runs.{run_key}'
+        if not isinstance(run, dict):
+            problems.append(f'{where} must be a mapping')
+            continue
+        sections = {}
+        for section in SECTIONS:
+            value = run.get(section) if run.get(section) is not None else {}
+            if not isinstance(value, dict):
+                problems.append(f'{where}.{section} must be a mapping')
+                value = {}
+            sections[section] = value
+        sources, algorithms, outputs = (sections[section] for section in SECTIONS)
+
+        for first, second in ((sources, algorithms), (sources, outputs), (algorithms, outputs)):
+            for key in set(first) & set(second):
+                problems.append(f'{where}: the key {key} is used twice')
+
+        for section, nodes in (('data_sources', sources), ('data_output', outputs)):
+            for key, node in nodes.items():
+                at = f'{where}.{section}.{key}'
+                if not isinstance(node, dict):
+                    problems.append(f'{at} must be a mapping')
+                    continue
+                _check_choice(problems, node, 'format', DataContext.FORMATS, f'{at}.', required=True)
+                if node.get('format') != 'postgres' and 'path' not in node:
+                    problems.append(f'{at}.path is missing')
+                if 'key' not in node and 'query' not in node:
+                    problems.append(f'{at}.key is missing')
+
+        for key, alg in algorithms.items():
+            if not isinstance(alg, dict):
+                problems.append(f'{where}.algorithms.{key} must be a mapping')
+            elif key not in known:
+                problems.append(f'{where}.algorithms.{key} is not a registered or declared algorithm')
+
+        for section, nodes in (('algorithms', algorithms), ('data_output', outputs)):
+            for key, node in nodes.items():
+                subscribe = node.get('subscribe') if isinstance(node, dict) else None
+                if subscribe is None:
+                    continue
+                if not isinstance(subscribe, dict) or set(subscribe) - set(SUBSCRIBE_KEYS):
+                    problems.append(f'{where}.{section}.{key}.subscribe must be a mapping of {SUBSCRIBE_KEYS}')
+
+        graph_ok = True
+        for section, nodes, targets in (('data_sources', sources, algorithms),
+                                        ('algorithms', algorithms, {**algorithms, **outputs})):
+            for key, node in nodes.items():
+                if not isinstance(node, dict):
+                    graph_ok = False
+                    continue
+                observers = node.get('observers')
+                if not isinstance(observers, list):
+                    problems.append(f'{where}.{section}.{key}.observers must be a list of keys')
+                    graph_ok = False
+                    continue
+                for observer in observers:
+                    if observer not in targets:
+                        what = 'an algorithm' if section == 'data_sources' else 'an algorithm or data_output'
+                        problems.append(f'{where}.{section}.{key} observes {observer!r}, which is not {what} of the run')
+                        graph_ok = False
+
+        if graph_ok:
+            try:
+                topological_order(list(sources) + list(algorithms) + list(outputs),
+                                  run_edges({'data_sources': sources, 'algorithms': algorithms}))
+            except ValueError as error:
+                problems.append(f'{where}: {error}')
+    return problems
+
+
+def _stat(path: str) -> Tuple:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return ()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _dependencies(cfg: Dict[str, Any]) -> Dict[str, Tuple]:
+    """ The plugin modules and manifest a configuration names, with their modification time and size. """
+    files = []
+    if cfg.get('plugin_manifest'):
+        files.append(os.path.abspath(cfg['plugin_manifest']))
+    for target in (cfg.get('plugins') or {}).values():
+        try:
+            spec = util.find_spec(str(target).split(':')[0])
+        except (ImportError, ValueError):
+            spec = None
+        if spec is not None and spec.origin and os.path.isfile(spec.origin):
+            files.append(spec.origin)
+    return {path: _stat(path) for path in files}
+
+
+def plan_key(path: str) -> str:
+    """ The cache key of a configuration file: a hash of its bytes and of the DataPipes and plugin package versions. """
+    digest = hashlib.sha256(f'plan {PLAN_VERSION}'.encode())
+    with open(path, 'rb') as fp:
+        digest.update(fp.read())
+    versions = {}
+    try:
+        versions['DataPipes'] = metadata.version('DataPipes')
+    except metadata.PackageNotFoundError:
+        pass
+    for entry_point in _entry_points():
+        dist = getattr(entry_point, 'dist', None)
+        if dist is not None:
+            versions[dist.metadata['Name']] = dist.version
+    digest.update(json.dumps(versions, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def build(cfg: Dict[str, Any], key: str = None, source: str = 'the configuration') -> ExecutionPlan:
+    """ Validates a parsed configuration and compiles its plan. Raises ConfigurationError listing every problem. """
+    problems = validate(cfg)
+    if problems:
+        raise ConfigurationError(source, problems)
+
+    from datapipes.run import RunLocal  # datapipes.run imports this module
+
+    cfg = thaw(cfg)
+    runs = {}
+    for run_key, run in cfg['independent_runs'].items():
+        for section in SECTIONS:
+            run[section] = run.get(section) or {}
+        for source_key, data_source in run['data_sources'].items():
+            run['data_sources'][source_key] = RunLocal._pushdown(data_source, run['algorithms'])
+        edges = run_edges(run)
+        order = topological_order(list(run['data_sources']) + list(run['algorithms']) + list(run['data_output']), edges)
+        runs[run_key] = RunPlan(tuple(order), tuple(edges))
+    return ExecutionPlan(key, cfg, runs, _dependencies(cfg))
+
+
+def compile_config(path: str, cache: str = PLAN_CACHE) -> ExecutionPlan:
+    """
+    The execution plan of a YAML configuration file, read from the plan cache when the same file was compiled
+    before (and none of its plugins changed), otherwise parsed, validated and written to the cache.
+
+    Args:
+        path: the YAML configuration file.
+        cache: (optional) the plan cache directory. A relative directory is placed next to the configuration file,
+        so the cache does not depend on where the application is launched. None compiles without the cache, as does
+        a cache that cannot be read or written.
+    """
+    key = plan_key(path) if cache else None
+    if cache:
+        cache = os.path.join(os.path.dirname(os.path.abspath(path)), cache)
+    cached = os.path.join(cache, f'{key}.plan') if cache else None
+    if cached and os.path.isfile(cached):
+        try:
+            with open(cached, 'rb') as fp:
+                plan = pickle.load(fp)
+            if plan.current():
+                _LOGGER.debug('   PLAN CACHE HIT             | %s: %s', path, key)
+                return plan
+        except Exception as error:  # unpickling raises whatever the stale classes make it raise
+            _LOGGER.debug('   PLAN CACHE UNREADABLE      | %s: %r', cached, error)
+
+    plan = build(parse(path), key, path)
+    if cached:
+        # The cache only saves time: a directory that cannot be written (e.g. read-only) just goes without it.
+        temp = f'{cached}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.makedirs(cache, exist_ok=True)
+            with open(temp, 'wb') as fp:
+                pickle.dump(plan, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, cached)
+            _LOGGER.debug('   PLAN COMPILED              | %s: %s', path, key)
+        except (OSError, pickle.PicklingError) as error:
+            _LOGGER.debug('   PLAN CACHE UNWRITABLE      | %s: %r', cache, error)
+            if os.path.exists(temp):
+                os.remove(temp)
+    return plan
+
+
+def check(path: str) -> List[str]:
+    """ Compiles a configuration without the cache and reports on it. Returns its problems, none if it can run. """
+    try:
+        plan = build(parse(path), source=path)
+    except ConfigurationError as error:
+        print(error)
+        return error.problems
+    except yaml.YAMLError as error:
+        print(f'{path} is not valid YAML: {error}')
+        return [str(error)]
+
+    print(f'{path}: OK')
+    for run_key, run in plan.runs.items():
+        print(f'  {run_key}: {len(run.order)} nodes, {len(run.edges)} edges: {" -> ".join(run.order)}')
+    return []
+
+
+if __name__ == '__main__':
+    # python -m datapipes.plan <config.yml> [<config.yml> ...]
+    sys.exit(1 if any([check(path) for path in sys.argv[1:]]) else 0)
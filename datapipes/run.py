@@ -1,4 +1,5 @@
-import logging, os, yaml, click, sys, glob
+import asyncio, inspect, logging, os, queue, threading, uuid, click, sys, glob
+from collections import Counter
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, BinaryIO
 import pathlib
@@ -8,14 +9,26 @@ import json
 from pkg_resources import resource_stream
 from copy import deepcopy
 import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from importlib import import_module
 
 from datapipes._utilities.logger import LOGGER_NAME
-from datapipes._utilities import logger
-from datapipes._utilities.utilities import verifyConfiguration, class_import, importModules, import_package_modules
+from datapipes._utilities import logger, shared
+from datapipes._utilities.frames import FANOUT_MODES, copy_on_write
+from datapipes._utilities.utilities import verifyConfiguration, class_import, importModules, import_package_modules, topological_order
 
+from datapipes.aio import AsyncEngine
+from datapipes.cache import ResultCache
 from datapipes.dataio import DataContext
+from datapipes.distributed import CONNECT_TIMEOUT, WorkerClient, assign_nodes, run_edges, spawn_workers
 from datapipes.factory import Factory
+from datapipes.partition import PartitionPool, is_partitionable
+from datapipes.plan import PLAN_CACHE, ConfigurationError, check as check_config, compile_config
+from datapipes.scheduler import DagScheduler
+from datapipes.stream import StreamEngine
+from datapipes.trace import Tracer
+from datapipes.watch import Watcher
 
 _LOGGER = logging.getLogger(LOGGER_NAME)
 
@@ -42,34 +55,91 @@ class RunLocal(RunStrategy):
     Run Local has to be abstrated for anyone looking to execute a pipeline.
     This means projet specific logic and variables, if necessary, must be passed in.
     """
-    def __init__(self, cfg: Dict[str, Any]): # *args:List, **kwargs:Dict[str, Any]): #
+    def __init__(self, cfg: Dict[str, Any], plan: Any = None): # *args:List, **kwargs:Dict[str, Any]): #
+        """ plan is the config's compiled ExecutionPlan (see datapipes.plan), whose runs are built as compiled. """
 
         if not verifyConfiguration(cfg): raise NotImplementedError(f'Congiguration {cfg} not implemented for {type(self).__name__}. You must configure the pipeline first!')
         else: self._cfg = cfg #Dict2DictDot(cfg)
+        self._plan = plan
+
+        cache_cfg = self._cfg.get('cache')
+        self._cache = ResultCache(**(cache_cfg if isinstance(cache_cfg, dict) else {})) if cache_cfg else None
+        self._partitions = PartitionPool(**self._cfg.get('partition', {}))
+        shared_cfg = self._cfg.get('shared_memory', True)
+        shared.configure(**shared_cfg) if isinstance(shared_cfg, dict) else shared.configure(enabled=bool(shared_cfg))
 
     def execute(self):  # , cfg: Dict[str, Any]):
         _LOGGER.debug('       LOCAL ENVIRONMENT            | running in local environment mode')
 
+        run_keys = list(self._cfg['independent_runs'].keys())
+        max_parallel_runs = self._cfg.get('max_parallel_runs', 1)
+        if max_parallel_runs > 1 and len(run_keys) > 1:
+            return self._execute_parallel(run_keys, max_parallel_runs)
+
         # loop over each run
-        for key in self._cfg['independent_runs'].keys():
+        try:
+            for key in run_keys:
+                self._execute_run(key)
+        finally:
+            self._partitions.shutdown()
+        return
 
-            run = self._cfg['independent_runs'][key]
+    def _execute_run(self, key: str):
+        run = self._cfg['independent_runs'][key]
 
-            # moduleName = input('Enter module name:')
-            # importlib.import_module(moduleName)
-            # decorators = run['algorithms'].keys()
-            # path = os.path.abspath('.')
-            # _LOGGER.debug(f'\n\n INITIALIZING DECORATOR    | {decorators}\n')
-            # for algorithm in decorators:
-            #     import_module(run['algorithms'][algorithm]['path'].split('/')[0])
+        # moduleName = input('Enter module name:')
+        # importlib.import_module(moduleName)
+        # decorators = run['algorithms'].keys()
+        # path = os.path.abspath('.')
+        # _LOGGER.debug(f'\n\n INITIALIZING DECORATOR    | {decorators}\n')
+        # for algorithm in decorators:
+        #     import_module(run['algorithms'][algorithm]['path'].split('/')[0])
 
-            _LOGGER.debug(f'\n\n SCORING RUN                | {run}\n')
+        _LOGGER.debug('   SCORING RUN                | %s', key)
 
+        with self._fanout_scope():
             if self._cfg['data_mode'] == 'batch':
-                self._handle_batch(run)
+                self._handle_batch(run, key)
             if self._cfg['data_mode'] == 'stream':
-                self._handle_stream(run)
-        return
+                self._handle_stream(run, key)
+
+    def _fanout_scope(self):
+        """ The context a run executes in: pandas copy-on-write is switched on for fanout copy_on_write only. """
+        return copy_on_write(self._cfg.get('fanout', 'shared') == 'copy_on_write')
+
+    def _execute_parallel(self, run_keys: List[str], max_parallel_runs: int) -> Dict[str, str]:
+        """
+        Runs each independent run in its own worker process. A failing run does not stop the others; the status of
+        every run is reported once all of them are done, and a RuntimeError lists the runs that failed.
+
+        Where the platform can fork, the workers inherit the algorithms registered (and modules imported) in this
+        process and its logger. Otherwise each worker imports the modules of the registered algorithms once and
+        configures its own logger.
+        """
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context, initargs = multiprocessing.get_context('fork'), ()
+        else:
+            modules = sorted({algorithm.__module__ for algorithm in Factory.registered().values()})
+            context = multiprocessing.get_context()
+            initargs = (modules, Factory.declared(), _logging_settings(self._cfg))
+
+        status = {}
+        with ProcessPoolExecutor(max_workers=max_parallel_runs, mp_context=context,
+                                 initializer=_init_run_worker if initargs else None, initargs=initargs) as pool:
+            futures = {pool.submit(_execute_independent_run, self._cfg, key, self._plan): key for key in run_keys}
+            for future in as_completed(futures):
+                key = futures[future]
+                error = future.exception()
+                status[key] = 'SUCCESS' if error is None else f'FAILED: {error!r}'
+                _LOGGER.debug('   INDEPENDENT RUN DONE       | %s: %s', key, status[key])
+
+        for key in run_keys:
+            _LOGGER.info(f'   INDEPENDENT RUN STATUS     | {key}: {status[key]}')
+
+        failed = [key for key in run_keys if status[key] != 'SUCCESS']
+        if failed:
+            raise RuntimeError(f'{len(failed)} of {len(run_keys)} independent runs failed: {failed}')
+        return status
 
     def _assert_experiment(self,model_name=None):
         confirmed = False
@@ -79,66 +149,401 @@ class RunLocal(RunStrategy):
             confirmed = True
         return confirmed
 
-    def _handle_batch(self,run_cfg):
-        _LOGGER.debug(' BATCH MODE                   | handling data in batch mode')
-
+    def _build_graph(self, run_cfg: Dict[str, Any], key: str = None) -> Dict[str, Any]:
+        """
+        Creates the data sources, algorithms and outputs of one run and connects them as configured.
+        Given the key of a run compiled into the runner's execution plan, the sources are configured and connected
+        as compiled (see datapipes.plan): pushdown, edges and order are not derived from the config again.
+
+        Returns:
+            A dictionary with the 'sources', 'algorithms' and 'outputs' objects (each keyed by their config key),
+            the 'input_graph' and 'algorithm_graph' connection lists, every connection as a ('from','to') pair
+            in 'edges', and the node keys in topological 'order'.
+        """
         data_sources = run_cfg['data_sources']
         algorithms   = run_cfg['algorithms']
         data_output  = run_cfg['data_output']
+        run_plan = self._plan.runs.get(key) if self._plan is not None and key is not None else None
 
-        input_objects = {}
-        algorithm_objects = {}
-        output_objects = {}
-        input_graph = []
-        algorithm_graph = []
+        if run_plan is not None:
+            source_cfgs = data_sources
+            edges = [tuple(edge) for edge in run_plan.edges]
+            order = list(run_plan.order)
+        else:
+            source_cfgs = {key: self._pushdown(source, algorithms) for key, source in data_sources.items()}
+            edges = run_edges(run_cfg)
+            order = topological_order(list(data_sources) + list(algorithms) + list(data_output), edges)
 
         # First you create all the objects.
-        for key in data_sources.keys():
-
-            source = data_sources[key]
-            input_objects[key] = DataContext(source)
-            input_graph += [{'from':key,'to':source['observers']}]
-
-        for key in algorithms.keys():
-
-            alg = algorithms[key]
-            algorithm_objects[key] = Factory.create(key)
-            algorithm_graph += [{'from':key,'to':alg['observers']}]
-
-        for key in data_output.keys():
-            out = data_output[key]
-            output_objects[key] = DataContext(out)
+        input_objects = {key: DataContext(source) for key, source in source_cfgs.items()}
+        subjects = Counter(observer for _, observer in edges)
+        algorithm_objects = {key: self._create_algorithm(key, alg, subjects[key]) for key, alg in algorithms.items()}
+        output_objects = {key: DataContext(out) for key, out in data_output.items()}
 
         # Then you connect the objects.
-        for connection in input_graph:
-            for observer in connection['to']:
-                input_objects[connection['from']].PubSub.attach(algorithm_objects[observer])
-
-        for connection in algorithm_graph:
-            subject = connection['from']
-            alg_keys = algorithm_objects.keys()
-            out_keys = output_objects.keys()
-            for key in connection['to']:
-                if key in alg_keys:
-                    observer = algorithm_objects[key]
-                elif key in out_keys:
-                    observer = output_objects[key]
-                else:
-                    raise NotImplementedError(f'key {key} not implemented for {type(self).__name__}.')
-
-                algorithm_objects[subject].PubSub.attach(observer)
+        observer_cfgs = {**algorithms, **data_output}
+        observers = {**algorithm_objects, **output_objects}
+        for subject, observer in edges:
+            if observer not in observers:
+                raise NotImplementedError(f'key {observer} not implemented for {type(self).__name__}.')
+            publisher = input_objects[subject] if subject in input_objects else algorithm_objects[subject]
+            publisher.PubSub.attach(observers[observer],
+                                    **self._subscription(observer_cfgs[observer], source_cfgs.get(subject)))
+
+        connections = {}
+        for subject, observer in edges:
+            connections.setdefault(subject, []).append(observer)
+        input_graph = [{'from': key, 'to': connections.get(key, [])} for key in input_objects]
+        algorithm_graph = [{'from': key, 'to': connections.get(key, [])} for key in algorithm_objects]
+
+        fanout = self._cfg.get('fanout', 'shared')
+        if fanout not in FANOUT_MODES:
+            raise NotImplementedError(f'Fanout {fanout} not implemented for {type(self).__name__}. Fanout options include: {FANOUT_MODES}')
+        for publisher in list(input_objects.values()) + list(algorithm_objects.values()):
+            publisher.PubSub.fanout = fanout
+
+        return {'sources': input_objects,
+                'algorithms': algorithm_objects,
+                'outputs': output_objects,
+                'input_graph': input_graph,
+                'algorithm_graph': algorithm_graph,
+                'edges': edges,
+                'order': order}
+
+    def _create_algorithm(self, key: str, alg_cfg: Dict[str, Any] = None, subjects: int = 1):
+        """
+        Instantiates the registered algorithm for a config key. Partitionable algorithms are split across the
+        partition pool (into the config's 'partitions', by default one per worker), and algorithms with a single
+        subject are routed through the result cache if enabled, keyed by their config too.
+        """
+        return self._wrap(Factory.create(key), key, alg_cfg, subjects)
+
+    def _wrap(self, algorithm: Any, key: str, alg_cfg: Dict[str, Any] = None, subjects: int = 1):
+        if is_partitionable(algorithm):
+            self._partitions.wrap(algorithm, key, (alg_cfg or {}).get('partitions'))
+        if self._cache is not None and subjects < 2:
+            self._cache.wrap(algorithm, key, alg_cfg)
+        return algorithm
+
+    @staticmethod
+    def _disjunction(filters) -> List[List]:
+        """ Filters as a list of conjunctions: [column, op, value] triples all required, of which any one is enough. """
+        return [list(map(list, conjunction)) for conjunction in ([filters] if isinstance(filters[0][0], str) else filters)]
+
+    @staticmethod
+    def _pushdown(source: Dict[str, Any], algorithms: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Adds the columns and row filters the source's observers declared to the source config, so the reader only
+        decodes what is needed, where the source's format applies them (DataContext.pushdown). A source reads the
+        union of its observers' columns (and of the columns their filters test) and the rows matching any of their
+        filters. If one observer declares no columns (or filters), the source reads all of them.
+        Columns or filters set on the source itself are kept as they are.
+        """
+        needs = [algorithms.get(observer) or {} for observer in source['observers']]
+        options = DataContext.pushdown(source.get('format'))
+        if not needs or not options:
+            return source
+
+        source = dict(source)
+        if 'columns' in options and 'columns' not in source and all(need.get('columns') for need in needs):
+            tested = [conjunct[0] for need in needs if need.get('filters')
+                      for conjunction in RunLocal._disjunction(need['filters']) for conjunct in conjunction]
+            source['columns'] = list(dict.fromkeys([column for need in needs for column in need['columns']] + tested))
+        if 'filters' in options and 'filters' not in source and all(need.get('filters') for need in needs):
+            source['filters'] = [conjunction for need in needs for conjunction in RunLocal._disjunction(need['filters'])]
+        return source
+
+    @staticmethod
+    def _subscription(node_cfg: Dict[str, Any], source: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        The PubSub.attach arguments of an algorithm or output: its 'subscribe' config, with the optional 'topic',
+        'where' and 'columns' it receives from every publisher it observes.
+        An algorithm observing a data source that declared filters gets them as its 'where', unless the source
+        reads exactly those rows, so it never receives the rows other observers asked for.
+        """
+        node_cfg = node_cfg or {}
+        subscribe = node_cfg.get('subscribe') or {}
+        subscription = {key: subscribe[key] for key in ('topic', 'where', 'columns') if key in subscribe}
+        if source is not None and node_cfg.get('filters') and 'where' not in subscription:
+            filters = RunLocal._disjunction(node_cfg['filters'])
+            if not source.get('filters') or RunLocal._disjunction(source['filters']) != filters:
+                subscription['where'] = filters
+        return subscription
+
+    @staticmethod
+    def _close_outputs(graph: Dict[str, Any]):
+        """ Closes every output, waiting for their pending writes, then raises the first error any of them had. """
+        errors = []
+        for output in graph['outputs'].values():
+            try:
+                output.close()
+            except Exception as error:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def _abort_outputs(graph: Dict[str, Any]):
+        """ Discards every output's unfinished writes after a failed run, logging (not raising) what goes wrong. """
+        for key, output in graph['outputs'].items():
+            try:
+                output.abort()
+            except Exception as error:
+                _LOGGER.error(f'   OUTPUT ABORT FAILED        | {key}: {error!r}')
+
+    def _tracer(self, graph: Dict[str, Any], key: str):
+        """ Instruments the graph when tracing is configured. Returns the Tracer, or None. """
+        if not self._cfg.get('trace'):
+            return None
+        return Tracer(key or 'run').instrument(graph)
+
+    def _finish_trace(self, tracer: Tracer) -> None:
+        if tracer is None:
+            return
+        trace_cfg = self._cfg['trace']
+        tracer.report()
+        tracer.write(trace_cfg.get('path', 'traces') if isinstance(trace_cfg, dict) else 'traces')
+
+    def _handle_batch(self, run_cfg, key: str = None):
+        _LOGGER.debug(' BATCH MODE                   | handling data in batch mode')
 
-        # Then you run everything
-        for spigot in input_objects.keys():
-            input_objects[spigot].on()
+        graph = self._build_graph(run_cfg, key)
+        tracer = self._tracer(graph, key)
 
-    def _handle_stream(self, cfg: Dict[str, Any]):
+        # Then you run everything
+        try:
+            if self._cfg.get('executor', 'sync') != 'sync':
+                DagScheduler(graph, self._cfg['executor'], self._cfg.get('max_workers'),
+                             self._cfg.get('queue_size', DagScheduler.QUEUE_SIZE)).run()
+            else:
+                input_objects = graph['sources']
+                for spigot in input_objects.keys():
+                    input_objects[spigot].on()
+        except BaseException:
+            self._abort_outputs(graph)
+            raise
+
+        self._close_outputs(graph)
+        self._finish_trace(tracer)
+
+    def _handle_stream(self, run_cfg: Dict[str, Any], key: str = None):
         _LOGGER.debug('  STREAMING MODE     | handling data in streaming mode')
 
+        stream_cfg = self._cfg.get('stream', {})
+        graph = self._build_graph(run_cfg, key)
+        tracer = self._tracer(graph, key)
+        engine = StreamEngine(graph,
+                              queue_size=stream_cfg.get('queue_size', StreamEngine.QUEUE_SIZE),
+                              report_interval=stream_cfg.get('report_interval'))
+        try:
+            stats = engine.run()
+        except BaseException:
+            self._abort_outputs(graph)
+            raise
+        self._close_outputs(graph)
+        self._finish_trace(tracer)
+        return stats
+
+
+class RunLocalAsync(RunLocal):
+    """
+    Runs every independent run on one asyncio event loop (run_strategy: local_async), see datapipes.aio.
+    Sources and outputs overlap their I/O, strategies with aload/asave and algorithms with `async def update` run on
+    the loop, and synchronous algorithms run on the executor configured under 'async' (executor, max_workers,
+    queue_size). Independent runs execute concurrently on the same loop.
+    """
+
+    def execute(self):
+        _LOGGER.debug('       LOCAL ASYNC ENVIRONMENT      | running on an asyncio event loop')
+        if self._cfg.get('trace'):
+            _LOGGER.warning('   TRACE NOT SUPPORTED        | tracing is not available with run_strategy local_async')
+        with self._fanout_scope():
+            return asyncio.run(self._execute_async())
+
+    async def _execute_async(self) -> Dict[str, str]:
+        run_keys = list(self._cfg['independent_runs'].keys())
+        results = await asyncio.gather(*(self._execute_run_async(key) for key in run_keys), return_exceptions=True)
+        if len(run_keys) == 1:
+            if isinstance(results[0], BaseException):
+                raise results[0]
+            return {run_keys[0]: 'SUCCESS'}
+
+        status = {key: 'SUCCESS' if not isinstance(result, BaseException) else f'FAILED: {result!r}'
+                  for key, result in zip(run_keys, results)}
+        for key in run_keys:
+            _LOGGER.info(f'   INDEPENDENT RUN STATUS     | {key}: {status[key]}')
+
+        failed = [key for key in run_keys if status[key] != 'SUCCESS']
+        if failed:
+            raise RuntimeError(f'{len(failed)} of {len(run_keys)} independent runs failed: {failed}')
+        return status
+
+    async def _execute_run_async(self, key: str) -> Dict[str, int]:
+        _LOGGER.debug('   SCORING RUN                | %s', key)
+        async_cfg = self._cfg.get('async', {})
+        graph = self._build_graph(self._cfg['independent_runs'][key], key)
+        engine = AsyncEngine(graph,
+                             executor=async_cfg.get('executor', 'thread'),
+                             max_workers=async_cfg.get('max_workers'),
+                             queue_size=async_cfg.get('queue_size', AsyncEngine.QUEUE_SIZE))
+        loop = asyncio.get_running_loop()
+        try:
+            stats = await engine.run()
+        except BaseException:
+            await loop.run_in_executor(None, self._abort_outputs, graph)
+            raise
+        await loop.run_in_executor(None, self._close_outputs, graph)
+        return stats
+
+    def _create_algorithm(self, key: str, alg_cfg: Dict[str, Any] = None, subjects: int = 1):
+        """ As RunLocal, except async algorithms bypass partitioning and the result cache, whose wrappers are synchronous. """
+        algorithm = Factory.create(key)
+        if inspect.iscoroutinefunction(algorithm.update):
+            return algorithm
+        return self._wrap(algorithm, key, alg_cfg, subjects)
+
+
+def _logging_settings(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """ The configure_logger arguments from the YAML configuration. """
+    return {'level': cfg.get('log_level', 'info'),
+            'output_format': cfg.get('log_format', 'json'),
+            'background': cfg.get('log_background', True),
+            'rate_limit': cfg.get('log_rate_limit'),
+            'sample': cfg.get('log_sample')}
+
+
+def _init_run_worker(modules: List[str], declared: Dict[str, str], log_settings: Dict[str, Any]):
+    """ Prepares a spawned worker process: registers the algorithms and configures the logger once. """
+    for module in modules:
+        import_module(module)
+    for name, target in declared.items():
+        Factory.declare(name, target)
+    logger.configure_logger(**log_settings)
+
+
+def _execute_independent_run(cfg: Dict[str, Any], key: str, plan: Any = None):
+    """ Executes a single independent run inside a worker process. """
+    RunLocal(cfg, plan)._execute_run(key)
+
+
+class RunDistributed(RunLocal):
+    """
+    Runs the config on workers reached over TCP (run_strategy: distributed), see datapipes.distributed.
+
+    Configured under 'distributed':
+        workers: a list of 'host:port' addresses of running workers, or a number of worker processes to spawn on
+        this machine (for testing).
+        authkey: the key shared with the workers. Defaults to $DATAPIPES_AUTHKEY; generated for spawned workers.
+        split: 'runs' (default) executes each independent run whole on the next free worker. 'graph' splits the
+        nodes of every run across all workers, which then only send messages whose edge crosses workers.
+        assign: (optional, for 'graph') node keys pinned to a worker index. Other sources are spread round-robin and
+        other nodes follow their first publisher.
+        queue_size: (optional, for 'graph') the stage queue size on the workers.
+        connect_timeout: (optional, for 'graph') seconds a worker waits for the other workers' edges.
+    """
 
-class RunGCP(RunStrategy):
-    def __init__(self):
-        pass
+    SPLITS = ('runs', 'graph')
+
+    def __init__(self, cfg: Dict[str, Any], plan: Any = None):
+        super().__init__(cfg, plan)
+        self._dist_cfg = self._cfg.get('distributed', {})
+        self._split = self._dist_cfg.get('split', 'runs')
+        if self._split not in self.SPLITS:
+            raise NotImplementedError(f'Split {self._split} not implemented for {type(self).__name__}. Split options include: "runs" or "graph"')
+
+    def execute(self):
+        _LOGGER.debug('       DISTRIBUTED ENVIRONMENT      | running on distributed workers')
+        if self._cfg.get('trace'):
+            _LOGGER.warning('   TRACE NOT SUPPORTED        | tracing is not available with run_strategy distributed')
+
+        workers = self._dist_cfg.get('workers', 2)
+        authkey = self._dist_cfg.get('authkey') or os.environ.get('DATAPIPES_AUTHKEY')
+        spawned = []
+        if isinstance(workers, int):
+            authkey = authkey.encode() if authkey else os.urandom(16)
+            spawned = spawn_workers(workers, authkey)
+            addresses = [address for _, address in spawned]
+        elif authkey:
+            authkey, addresses = authkey.encode(), list(workers)
+        else:
+            raise ValueError(f'{type(self).__name__} needs the authkey of the workers at {workers}. Set distributed.authkey or DATAPIPES_AUTHKEY.')
+
+        clients = []
+        try:
+            setup = ([algorithm.__module__ for algorithm in Factory.registered().values()], Factory.declared(),
+                     _logging_settings(self._cfg))
+            for address in addresses:
+                clients.append(WorkerClient(address, authkey))
+                clients[-1].call('setup', sorted(set(setup[0])), *setup[1:])
+
+            if self._split == 'runs':
+                return self._execute_runs(clients)
+            return {key: self._execute_graph(clients, key) for key in self._cfg['independent_runs']}
+        finally:
+            for client in clients:
+                client.stop() if spawned else client.close()
+            for process, _ in spawned:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+
+    def _execute_runs(self, clients: List[WorkerClient]) -> Dict[str, str]:
+        """ Hands each independent run to the next free worker. Reports every run's status as _execute_parallel does. """
+        run_keys = list(self._cfg['independent_runs'].keys())
+        pending = queue.Queue()
+        for key in run_keys:
+            pending.put(key)
+
+        status = {}
+        def drive(client):
+            while True:
+                try:
+                    key = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    client.call('run', self._cfg, key)
+                    status[key] = 'SUCCESS'
+                except Exception as error:
+                    status[key] = f'FAILED: {error!r}'
+                _LOGGER.debug('   INDEPENDENT RUN DONE       | %s on %s: %s', key, client.address, status[key])
+
+        threads = [threading.Thread(target=drive, args=(client,), name='datapipes-coordinator') for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for key in run_keys:
+            _LOGGER.info(f'   INDEPENDENT RUN STATUS     | {key}: {status[key]}')
+
+        failed = [key for key in run_keys if status[key] != 'SUCCESS']
+        if failed:
+            raise RuntimeError(f'{len(failed)} of {len(run_keys)} independent runs failed: {failed}')
+        return status
+
+    def _execute_graph(self, clients: List[WorkerClient], key: str) -> Dict[str, Dict[str, Any]]:
+        """ Splits one run's nodes across every worker and runs them together. Returns every stage's statistics. """
+        run = self._cfg['independent_runs'][key]
+        assignment = assign_nodes(run, len(clients), self._dist_cfg.get('assign'))
+        _LOGGER.info(f'   DISTRIBUTED RUN            | {key}: {assignment}')
+
+        job = {'id': uuid.uuid4().hex, 'key': key, 'cfg': self._cfg, 'assignment': assignment,
+               'addresses': [client.address for client in clients],
+               'queue_size': self._dist_cfg.get('queue_size', StreamEngine.QUEUE_SIZE),
+               'timeout': self._dist_cfg.get('connect_timeout', CONNECT_TIMEOUT)}
+        for index, client in enumerate(clients):
+            client.send('graph', dict(job, index=index))
+
+        stats, errors = {}, []
+        for client in clients:
+            try:
+                stats.update(client.result())
+            except RuntimeError as error:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+        return stats
 
 
 class RunContext(RunStrategy):
@@ -151,25 +556,28 @@ class RunContext(RunStrategy):
     4. Local + #Companies + MiniKube + Testing
     5-8. Remote + et al
     """
-    def __init__(self,cfg:Dict=None):
+    def __init__(self,cfg:Dict=None, plan:Any=None):
         """Initialized to no strategy unless specified."""
 
         if not verifyConfiguration(cfg): raise NotImplementedError(f'Congiguration {cfg} not implemented for {type(self).__name__}. You must configure the pipeline first!')
         else: self._cfg = cfg # Dict2DictDot(cfg)
+        self._plan = plan
 
         self.setStrategy(self._cfg['run_strategy'])
         # return self
 
     def addStrategy(self, Strategy:RunStrategy=None):
-        self.strategy = Strategy(self._cfg)
+        self.strategy = Strategy(self._cfg, self._plan)
 
     def setStrategy(self,strategy:str):
         if strategy=='local':
-            self.strategy = RunLocal(self._cfg) # In an even more complicated world, if strategies cherry pick from other modules, factory pattern may be necessary
-        elif strategy=='gcp':
-            self.strategy = RunGCP(self._cfg)
+            self.strategy = RunLocal(self._cfg, self._plan) # In an even more complicated world, if strategies cherry pick from other modules, factory pattern may be necessary
+        elif strategy=='local_async':
+            self.strategy = RunLocalAsync(self._cfg, self._plan)
+        elif strategy=='distributed':
+            self.strategy = RunDistributed(self._cfg, self._plan)
         else:
-            raise NotImplementedError(f'Strategy {strategy} not implemented for {type(self).__name__}. Strategy options include: "local" or "gcp"')
+            raise NotImplementedError(f'Strategy {strategy} not implemented for {type(self).__name__}. Strategy options include: "local", "local_async" or "distributed"')
 
     def execute(self) -> BinaryIO:
         self.strategy.execute()
@@ -178,9 +586,15 @@ class RunContext(RunStrategy):
 
 class DataSpigot():
 
-    def __init__(self,cfg:str=None, version:BinaryIO=None):
+    def __init__(self,cfg:str=None, version:BinaryIO=None, use_cache:bool=True, clear_cache:bool=False, trace:bool=False,
+                 plan_cache:str=PLAN_CACHE):
         """
         Generates Picnic Model results.
+        use_cache=False ignores the YAML's result cache for this launch, clear_cache=True empties it first.
+        trace=True traces every run even if the YAML does not configure it.
+        plan_cache is the directory compiled execution plans are cached in, relative to the config file's directory
+        (see datapipes.plan). None recompiles.
+        Raises ConfigurationError listing every problem of an invalid configuration.
         """
         if False: # version:
             metadata = json.load(resource_stream('dlasagne', 'metadata.json'))
@@ -191,12 +605,25 @@ class DataSpigot():
             print(f'"{cfg}" is not a file.  Please check that the file exists.')
             return 1
 
-        with open(cfg, 'r') as fp:
-            self._ycfg = yaml.load(fp, Loader=yaml.FullLoader)
+        self._plan = compile_config(cfg, plan_cache)
+        self._ycfg = self._plan.config()
+
+        logger.configure_logger(**_logging_settings(self._ycfg))
+
+        if self._ycfg.get('plugin_manifest'):
+            Factory.load_manifest(self._ycfg['plugin_manifest'])
+        for name, target in self._ycfg.get('plugins', {}).items():
+            Factory.declare(name, target)
 
-        logger.configure_logger(self._ycfg.get('log_level', 'info'), self._ycfg.get('log_format', 'json'))
+        cache_cfg = self._ycfg.get('cache')
+        if clear_cache:
+            ResultCache(**(cache_cfg if isinstance(cache_cfg, dict) else {})).clear()
+        if not use_cache:
+            self._ycfg.pop('cache', None)
+        if trace and not self._ycfg.get('trace'):
+            self._ycfg['trace'] = True
 
-        self._runner = RunContext(self._ycfg)
+        self._runner = RunContext(self._ycfg, self._plan)
 
     def on(self):
         self._runner.execute()
@@ -206,14 +633,36 @@ class DataSpigot():
         # runner = Factory.create(*[env, ycorp], **ycfg)
         # runner.execute()
 
+    def watch(self, interval: float = None):
+        """ Runs the config, then keeps re-executing whatever a change to its inputs or algorithms affects. """
+        interval = interval or self._ycfg.get('watch_interval', 1.0)
+        try:
+            Watcher(RunLocal(self._ycfg, self._plan), interval).watch()
+        except KeyboardInterrupt:
+            _LOGGER.info('   WATCH STOPPED              | interrupted')
+        return 0
+
     def off(self):
         pass
 
 @click.command()
 @click.option('--cfg', default='config.yml', help='The application YAML configuration file.')
 @click.option('--version', is_flag=True, help='Print the application version.')
-def dataSpigot(cfg,version):
-    DataSpigot(cfg, version=version).on()
+@click.option('--no-cache', is_flag=True, help='Run every algorithm, ignoring the result cache.')
+@click.option('--clear-cache', is_flag=True, help='Empty the result cache before running.')
+@click.option('--watch', is_flag=True, help='Keep running, re-executing what changed inputs or algorithm modules affect.')
+@click.option('--trace', is_flag=True, help='Trace every node and write a Chrome trace per run.')
+@click.option('--check', is_flag=True, help='Validate the configuration and report its problems without running it.')
+@click.option('--no-plan-cache', is_flag=True, help='Recompile the execution plan instead of reading it from the plan cache.')
+def dataSpigot(cfg,version,no_cache,clear_cache,watch,trace,check,no_plan_cache):
+    if check:
+        sys.exit(1 if check_config(cfg) else 0)
+    try:
+        spigot = DataSpigot(cfg, version=version, use_cache=not no_cache, clear_cache=clear_cache, trace=trace,
+                            plan_cache=None if no_plan_cache else PLAN_CACHE)
+    except ConfigurationError as error:
+        raise click.ClickException(str(error))
+    spigot.watch() if watch else spigot.on()
 
 if __name__ == '__main__':
     dataSpigot()
\ No newline at end of file
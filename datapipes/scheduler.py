@@ -0,0 +1,216 @@
+"""
+Concurrent execution of a run's PubSub graph.
+
+The DagScheduler turns the graph built by RunLocal._build_graph into a topologically ordered DAG and runs every
+update as a task on a thread or process pool. A node only runs once one of its subjects has published to it, and
+never runs two updates at once, so dependencies are respected while independent branches and sources overlap.
+Sources read on threads of their own and wait while a node they feed has queue_size messages pending, so a slow
+node throttles reading instead of piling up messages in memory.
+"""
+import copy, logging, threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from datapipes._utilities import shared
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes._utilities.utilities import topological_order
+from datapipes.observer import Observer, PubSub, PubSubMessage
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+class _CapturingPubSub(PubSub):
+    """ Stands in for an algorithm's PubSub inside a worker process and records what the algorithm publishes. """
+
+    def __init__(self, pubsub_message: Dict):
+        super().__init__()
+        self.pubsub_message = pubsub_message
+        self.published: List[Dict] = []
+
+    def notify(self) -> None:
+        self.published.append(dict(self.pubsub_message))
+
+
+def _update_in_process(node: Any, pubsub_message: Dict, message: PubSubMessage) -> Tuple[Dict, List[Dict]]:
+    """
+    Runs one algorithm update in a worker process. A DataFrame sent through shared memory is mapped, and large
+    DataFrames published are handed back through shared memory.
+
+    Returns:
+        The algorithm's new attributes and every message it published, for the parent to apply and publish (after
+        shared.unpack).
+    """
+    node.PubSub = _CapturingPubSub(pubsub_message)
+    node.update(PubSubMessage(shared.unpack(message.pubsub_message)))
+    published = [shared.pack(published, readers=0) for published in node.PubSub.published]
+    del node.PubSub
+    return vars(node), published
+
+
+class _ScheduledNode(Observer):
+    """ Takes the place of an algorithm or output in its publishers' observer lists and queues their messages. """
+
+    def __init__(self, name: str, node: Any, in_process: bool, scheduler: 'DagScheduler'):
+        self.name = name
+        self.node = node
+        self.in_process = in_process
+        self.pending = deque()
+        self.running = False
+        self._scheduler = scheduler
+
+    def update(self, subject) -> None:
+        self._scheduler.submit(self, PubSubMessage(subject.pubsub_message))
+
+
+class DagScheduler():
+    """
+    Runs a graph built by RunLocal._build_graph on a pool of workers.
+
+    Args:
+        graph: the 'sources', 'algorithms', 'outputs' and 'edges' of one run.
+        executor: 'thread' runs every update on a thread pool. 'process' runs algorithm updates on a process pool
+        (algorithms must be picklable) while sources and outputs stay on threads of this process. Algorithms whose
+        update has been wrapped on the instance (e.g. by the result cache) also stay on threads, as the wrapper
+        keeps its state here.
+        max_workers: (optional) the size of the pool. Defaults to the pool's own default.
+        queue_size: (optional) the number of messages a node may have pending before the sources feeding it wait.
+
+    Attributes:
+        order: the node keys in topological order.
+    """
+
+    EXECUTORS = ('thread', 'process')
+    QUEUE_SIZE = 8
+
+    def __init__(self, graph: Dict[str, Any], executor: str = 'thread', max_workers: int = None,
+                 queue_size: int = QUEUE_SIZE):
+        if executor not in self.EXECUTORS:
+            raise NotImplementedError(f'Executor {executor} not implemented for {type(self).__name__}. Executor options include: "thread" or "process"')
+
+        self._graph = graph
+        self._executor = executor
+        self._max_workers = max_workers
+        self._queue_size = queue_size
+        self.order = graph.get('order') or topological_order(
+            {**graph['sources'], **graph['algorithms'], **graph['outputs']}.keys(), graph['edges'])
+
+        self._nodes: Dict[str, _ScheduledNode] = {}
+        for name, node in graph['algorithms'].items():
+            self._nodes[name] = _ScheduledNode(name, node, executor == 'process' and 'update' not in vars(node), self)
+        for name, node in graph['outputs'].items():
+            self._nodes[name] = _ScheduledNode(name, node, False, self)
+
+        publishers = {**graph['sources'], **graph['algorithms']}
+        for subject, observer in graph['edges']:
+            scheduled = self._nodes[observer]
+            publishers[subject].PubSub.replace(scheduled.node, scheduled)
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._source_thread = threading.local()
+        self._outstanding = 0
+        self._errors = []
+        self._threads = None
+        self._sources = None
+        self._processes = None
+
+    def run(self) -> None:
+        _LOGGER.debug('   DAG SCHEDULER              | running %d nodes on a %s pool: %s', len(self.order), self._executor,
+                      self.order)
+
+        if self._executor == 'process':
+            shared.prepare()
+            self._threads = ThreadPoolExecutor(thread_name_prefix='datapipes')
+            self._processes = ProcessPoolExecutor(max_workers=self._max_workers)
+        else:
+            self._threads = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix='datapipes')
+        # Sources get threads of their own: they block while the nodes they feed are full, and must never hold the
+        # pool's threads that would drain those nodes.
+        self._sources = ThreadPoolExecutor(max_workers=max(len(self._graph['sources']), 1),
+                                           thread_name_prefix='datapipes-source')
+        try:
+            for name in self.order:
+                if name in self._graph['sources']:
+                    self._start(name, self._sources.submit(self._read, self._graph['sources'][name]))
+
+            with self._idle:
+                self._idle.wait_for(lambda: self._outstanding == 0)
+        finally:
+            self._sources.shutdown()
+            self._threads.shutdown()
+            if self._processes is not None:
+                self._processes.shutdown()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def _read(self, source: Any) -> None:
+        self._source_thread.active = True
+        source.on()
+
+    def submit(self, scheduled: _ScheduledNode, message: PubSubMessage) -> None:
+        """
+        Queue a message for a node, starting it if it is idle. A source waits while the node has queue_size messages
+        pending; algorithms never wait, as they run on the threads that drain the queues.
+        """
+        with self._lock:
+            if getattr(self._source_thread, 'active', False):
+                self._not_full.wait_for(lambda: len(scheduled.pending) < self._queue_size)
+            self._outstanding += 1
+            scheduled.pending.append(message)
+            if scheduled.running:
+                return
+            scheduled.running = True
+        self._dispatch(scheduled)
+
+    def _start(self, name: str, future: Future) -> None:
+        with self._lock:
+            self._outstanding += 1
+        future.add_done_callback(lambda done: self._finish(name, done))
+
+    def _dispatch(self, scheduled: _ScheduledNode) -> None:
+        with self._lock:
+            message = scheduled.pending.popleft()
+            self._not_full.notify_all()
+
+        if scheduled.in_process:
+            future = self._threads.submit(self._update_in_process, scheduled, message)
+        else:
+            future = self._threads.submit(scheduled.node.update, message)
+        future.add_done_callback(lambda done: self._complete(scheduled, done))
+
+    def _update_in_process(self, scheduled: _ScheduledNode, message: PubSubMessage) -> None:
+        """ Run an algorithm update on the process pool, then apply its new state and publish what it produced. """
+        node = copy.copy(scheduled.node)
+        del node.PubSub
+        sent = shared.pack(message.pubsub_message)
+        try:
+            state, published = self._processes.submit(_update_in_process, node, scheduled.node.PubSub.pubsub_message,
+                                                       PubSubMessage(sent)).result()
+        finally:
+            shared.release(sent.get('data'))
+        vars(scheduled.node).update(state)
+        for pubsub_message in published:
+            scheduled.node.PubSub.pubsub_message = shared.unpack(pubsub_message)
+            scheduled.node.PubSub.notify()
+
+    def _complete(self, scheduled: _ScheduledNode, future: Future) -> None:
+        """ Run the node's next message, or mark it idle. """
+        with self._lock:
+            scheduled.running = bool(scheduled.pending)
+            more = scheduled.running
+        if more:
+            self._dispatch(scheduled)
+        self._finish(scheduled.name, future)
+
+    def _finish(self, name: str, future: Future) -> None:
+        error = future.exception()
+        with self._idle:
+            if error is not None:
+                _LOGGER.error(f'   DAG NODE FAILED            | {name}: {error!r}')
+                self._errors.append(error)
+            self._outstanding -= 1
+            if self._outstanding == 0:
+                self._idle.notify_all()
@@ -0,0 +1,214 @@
+"""
+Streaming execution of a run's PubSub graph.
+
+Every data source, algorithm and output runs as a stage on its own thread. Stages are connected by bounded queues,
+so micro-batches (the chunks a source yields) flow through the graph continuously, and a slow stage throttles the
+stages upstream of it instead of piling up memory.
+"""
+import logging, queue, threading, time
+from typing import Any, Dict, List
+
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes.observer import Observer, PubSubMessage
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+_END_OF_STREAM = object()
+
+
+def _rows(data) -> int:
+    """ Number of records in a published payload, 0 if it has no length. """
+    try:
+        return len(data)
+    except TypeError:
+        return 0
+
+
+class Stage(Observer):
+    """
+    Wraps one algorithm or output of the graph. Publishers put a snapshot of their message onto the stage's bounded
+    queue, blocking while it is full, and the stage's thread hands the snapshots to the node's update one at a time.
+
+    Args:
+        name: the config key of the node.
+        node: the algorithm or DataContext object.
+        queue_size: the maximum number of messages waiting for the node.
+
+    Attributes:
+        upstream: the number of stages publishing to this one. The stage ends once all of them have closed it.
+        error: the exception raised by the node, if any.
+        blocked: seconds publishers spent waiting on this stage's full queue.
+    """
+
+    def __init__(self, name: str, node: Any, queue_size: int):
+        self.name = name
+        self.node = node
+        self.upstream = 0
+        self.error = None
+        self.queue_size = queue_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = 0
+        self.messages = 0
+        self.rows = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self.started = None
+        self.finished = None
+
+    def update(self, subject) -> None:
+        """ Called from the publisher's notify. Queues a snapshot of its message. """
+        self.put(PubSubMessage(subject.pubsub_message))
+
+    def put(self, message: PubSubMessage) -> None:
+        start = time.perf_counter()
+        self._queue.put(message)
+        self.blocked += time.perf_counter() - start
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def close(self) -> None:
+        """ Called once by each upstream stage when it has nothing more to publish. """
+        self._queue.put(_END_OF_STREAM)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def downstream(self) -> List['Stage']:
+        """ The stages this node publishes to. """
+        pubsub = getattr(self.node, 'PubSub', None)
+        observers = pubsub._observers if pubsub is not None else []
+        return [observer for observer in observers if isinstance(observer, Stage) and observer is not self]
+
+    def run(self) -> None:
+        self.started = time.perf_counter()
+        while self._closed < self.upstream:
+            message = self._queue.get()
+            if message is _END_OF_STREAM:
+                self._closed += 1
+                continue
+            if self.error is not None:
+                continue  # keep draining, so publishers never block on a failed stage
+
+            start = time.perf_counter()
+            try:
+                self.node.update(message)
+            except Exception as error:
+                self.error = error
+                _LOGGER.error(f'   STREAM STAGE FAILED        | {self.name}: {error!r}')
+            self.busy += time.perf_counter() - start
+            self.messages += 1
+            self.rows += _rows(message.pubsub_message.get('data'))
+
+        self.finished = time.perf_counter()
+        for stage in self.downstream():
+            stage.close()
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        return {'messages': self.messages,
+                'rows': self.rows,
+                'queue_depth': self.depth,
+                'max_queue_depth': self.max_depth,
+                'queue_size': self.queue_size,
+                'busy_seconds': self.busy,
+                'blocked_seconds': self.blocked,
+                'elapsed_seconds': elapsed,
+                'rows_per_second': self.rows / elapsed if elapsed > 0 else 0.0}
+
+
+class SourceStage(Stage):
+    """
+    Drives a DataContext. The stage observes its own source to count what it publishes, then closes its
+    downstream stages once the source is exhausted.
+    """
+
+    def __init__(self, name: str, node: Any, queue_size: int):
+        super().__init__(name, node, queue_size)
+        node.PubSub.attach(self)
+
+    def update(self, subject) -> None:
+        self.messages += 1
+        self.rows += _rows(subject.pubsub_message.get('data'))
+
+    def run(self) -> None:
+        self.started = time.perf_counter()
+        try:
+            self.node.on()
+        except Exception as error:
+            self.error = error
+            _LOGGER.error(f'   STREAM SOURCE FAILED       | {self.name}: {error!r}')
+        self.finished = time.perf_counter()
+        self.busy = self.finished - self.started
+        for stage in self.downstream():
+            stage.close()
+
+
+class StreamEngine():
+    """
+    Runs a graph built by RunLocal._build_graph as a pipeline of stages connected by bounded queues.
+
+    Args:
+        graph: the 'sources', 'algorithms', 'outputs' and 'edges' of one run.
+        queue_size: the maximum number of micro-batches waiting in front of each stage (backpressure).
+        report_interval: (optional) seconds between progress logs of every stage's queue depth.
+
+    Returns:
+        The per-stage statistics from run(): messages, rows, queue depths, busy/blocked seconds and rows per second.
+    """
+
+    QUEUE_SIZE = 8
+
+    def __init__(self, graph: Dict[str, Any], queue_size: int = QUEUE_SIZE, report_interval: float = None):
+        self._report_interval = report_interval
+        self._stages: Dict[str, Stage] = {}
+
+        for name, node in graph['sources'].items():
+            self._stages[name] = SourceStage(name, node, queue_size)
+        for name, node in {**graph['algorithms'], **graph['outputs']}.items():
+            self._stages[name] = Stage(name, node, queue_size)
+
+        # Every publisher now notifies the observer's stage instead of the observer itself.
+        for subject, observer in graph['edges']:
+            stage = self._stages[observer]
+            self._stages[subject].node.PubSub.replace(stage.node, stage)
+            stage.upstream += 1
+
+    def run(self) -> Dict[str, Dict[str, Any]]:
+        threads = [threading.Thread(target=stage.run, name=f'datapipes-{name}', daemon=True)
+                   for name, stage in self._stages.items()]
+        for thread in threads:
+            thread.start()
+
+        finished = threading.Event()
+        if self._report_interval:
+            monitor = threading.Thread(target=self._monitor, args=(finished,), name='datapipes-monitor', daemon=True)
+            monitor.start()
+
+        for thread in threads:
+            thread.join()
+        finished.set()
+
+        self.report()
+        for stage in self._stages.values():
+            if stage.error is not None:
+                raise stage.error
+        return self.stats()
+
+    def stage(self, name: str) -> Stage:
+        """ The stage of a node, e.g. to feed it messages published somewhere else. """
+        return self._stages[name]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stage.stats() for name, stage in self._stages.items()}
+
+    def report(self) -> None:
+        for name, stats in self.stats().items():
+            _LOGGER.info(f'   STREAM STAGE               | {name}: {stats["messages"]} messages, {stats["rows"]} rows, '
+                         f'{stats["rows_per_second"]:.1f} rows/s, max queue {stats["max_queue_depth"]}/{stats["queue_size"]}, '
+                         f'busy {stats["busy_seconds"]:.3f}s, blocked {stats["blocked_seconds"]:.3f}s')
+
+    def _monitor(self, finished: threading.Event) -> None:
+        while not finished.wait(self._report_interval):
+            depths = ', '.join(f'{name}={stage.depth}' for name, stage in self._stages.items())
+            _LOGGER.info(f'   STREAM QUEUE DEPTHS        | {depths}')
@@ -0,0 +1,216 @@
+"""
+Per-node execution tracing of a run's PubSub graph.
+
+When tracing is configured, every data source load (one span per chunk), algorithm update and output save is timed
+and measured: wall and CPU time, rows and bytes in and out, and the growth of the process's peak resident memory.
+Each run logs a summary table and writes a Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev).
+Nothing is wrapped when tracing is off, so it costs nothing then.
+"""
+import json, logging, os, sys, threading, time
+from typing import Any, Dict, List
+
+from datapipes._utilities.frames import payload_size
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes.observer import Observer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+# ru_maxrss is in kilobytes on Linux and bytes on macOS.
+_MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+
+def _max_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_SCALE if resource is not None else 0
+
+
+class _Span():
+    """
+    Times one load, update or save on the current thread. Time spent in nested spans is not counted as self time.
+    A span marked empty (a load that found no more chunks) is not recorded.
+    """
+
+    __slots__ = ('tracer', 'node', 'kind', 'rows_in', 'bytes_in', 'rows_out', 'bytes_out', 'start', 'cpu', 'rss',
+                 'child_wall', 'child_cpu', 'empty')
+
+    def __init__(self, tracer: 'Tracer', node: str, kind: str, data: Any = None):
+        self.tracer = tracer
+        self.node = node
+        self.kind = kind
+        self.rows_in, self.bytes_in = payload_size(data) if data is not None else (0, 0)
+        self.rows_out = self.bytes_out = 0
+        self.child_wall = self.child_cpu = 0
+        self.empty = False
+
+    def __enter__(self) -> '_Span':
+        self.tracer._stack().append(self)
+        self.rss = _max_rss()
+        self.cpu = time.thread_time_ns()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        wall = time.perf_counter_ns() - self.start
+        cpu = time.thread_time_ns() - self.cpu
+        rss = _max_rss()
+        stack = self.tracer._stack()
+        stack.pop()
+        if self.empty:
+            return
+        if stack:
+            stack[-1].child_wall += wall
+            stack[-1].child_cpu += cpu
+        self.tracer._record(self, wall, cpu, rss)
+
+
+class _PublishCounter(Observer):
+    """ Attached to a publisher to count the rows and bytes it publishes. """
+
+    def __init__(self, tracer: 'Tracer', node: str):
+        self._tracer = tracer
+        self._node = node
+
+    def update(self, subject) -> None:
+        self._tracer._published(self._node, subject.pubsub_message.get('data'))
+
+
+class _TracedUpdate():
+    """ Replaces an algorithm's update (or an output's save) with one that runs inside a span. """
+
+    def __init__(self, tracer: 'Tracer', node: str, kind: str, method):
+        self._tracer = tracer
+        self._node = node
+        self._kind = kind
+        self._method = method
+
+    def __call__(self, message, *args, **kwargs):
+        data = message.pubsub_message.get('data') if self._kind == 'update' else message
+        with _Span(self._tracer, self._node, self._kind, data):
+            return self._method(message, *args, **kwargs)
+
+
+class Tracer():
+    """
+    Records the spans of one run.
+
+    Args:
+        name: the run's key, used in the log and the trace file name.
+
+    Attributes:
+        nodes: per node, the totals reported by summary().
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, int] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self._rss = _max_rss()
+
+    def instrument(self, graph: Dict[str, Any]) -> 'Tracer':
+        """ Wraps every source's load, algorithm's update and output's save of a graph built by RunLocal._build_graph. """
+        for name, source in graph['sources'].items():
+            source.load = self._traced_load(name, source.load)
+        for name, algorithm in graph['algorithms'].items():
+            algorithm.update = _TracedUpdate(self, name, 'update', algorithm.update)
+            algorithm.PubSub.attach(_PublishCounter(self, name))
+        for name, output in graph['outputs'].items():
+            output.save = _TracedUpdate(self, name, 'save', output.save)
+        return self
+
+    def _traced_load(self, name: str, load):
+        def traced_load():
+            chunks = iter(load())
+            while True:
+                with _Span(self, name, 'load') as span:
+                    try:
+                        key, data = next(chunks)
+                    except StopIteration:
+                        span.empty = True
+                        return
+                    span.rows_out, span.bytes_out = payload_size(data)
+                yield key, data
+        return traced_load
+
+    def _stack(self) -> List[_Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _node(self, name: str) -> Dict[str, Any]:
+        if name not in self.nodes:
+            self.nodes[name] = {'calls': 0, 'wall_seconds': 0.0, 'self_wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                'self_cpu_seconds': 0.0, 'max_wall_seconds': 0.0, 'rows_in': 0, 'rows_out': 0,
+                                'bytes_in': 0, 'bytes_out': 0, 'peak_rss_delta_bytes': 0}
+        return self.nodes[name]
+
+    def _record(self, span: _Span, wall: int, cpu: int, rss: int) -> None:
+        thread = threading.get_ident()
+        with self._lock:
+            if thread not in self._threads:
+                self._threads[thread] = len(self._threads)
+                self._events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': self._threads[thread],
+                                     'args': {'name': threading.current_thread().name}})
+            node = self._node(span.node)
+            node['calls'] += 1
+            node['wall_seconds'] += wall / 1e9
+            node['self_wall_seconds'] += (wall - span.child_wall) / 1e9
+            node['cpu_seconds'] += cpu / 1e9
+            node['self_cpu_seconds'] += (cpu - span.child_cpu) / 1e9
+            node['max_wall_seconds'] = max(node['max_wall_seconds'], wall / 1e9)
+            node['rows_in'] += span.rows_in
+            node['bytes_in'] += span.bytes_in
+            node['peak_rss_delta_bytes'] += rss - span.rss
+            if span.kind == 'load':
+                node['rows_out'] += span.rows_out
+                node['bytes_out'] += span.bytes_out
+
+            self._events.append({'name': span.node, 'cat': span.kind, 'ph': 'X', 'pid': os.getpid(),
+                                 'tid': self._threads[thread], 'ts': (span.start - self._origin) / 1e3,
+                                 'dur': wall / 1e3,
+                                 'args': {'cpu_ms': cpu / 1e6, 'rows_in': span.rows_in, 'bytes_in': span.bytes_in,
+                                          'rows_out': span.rows_out, 'bytes_out': span.bytes_out,
+                                          'peak_rss_delta_bytes': rss - span.rss}})
+            if rss != span.rss:
+                self._events.append({'name': 'peak_rss', 'ph': 'C', 'pid': os.getpid(),
+                                     'ts': (span.start + wall - self._origin) / 1e3, 'args': {'bytes': rss}})
+
+    def _published(self, name: str, data: Any) -> None:
+        """ Algorithms' rows and bytes out are counted as they publish (sources count theirs per loaded chunk). """
+        rows, size = payload_size(data)
+        with self._lock:
+            node = self._node(name)
+            node['rows_out'] += rows
+            node['bytes_out'] += size
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """ Per node totals, the nodes with the most self time first. """
+        return dict(sorted(self.nodes.items(), key=lambda item: -item[1]['self_wall_seconds']))
+
+    def report(self) -> None:
+        _LOGGER.info(f'   TRACE SUMMARY              | {self.name}: peak rss {_max_rss() - self._rss} bytes above the start of the run')
+        for name, node in self.summary().items():
+            _LOGGER.info(f'   TRACE NODE                 | {name:<20} calls {node["calls"]:>6}  '
+                         f'self wall {node["self_wall_seconds"]:9.3f}s  self cpu {node["self_cpu_seconds"]:9.3f}s  '
+                         f'max {node["max_wall_seconds"]:8.3f}s  rows in {node["rows_in"]:>10}  out {node["rows_out"]:>10}  '
+                         f'bytes in {node["bytes_in"]:>12}  out {node["bytes_out"]:>12}  '
+                         f'peak rss +{node["peak_rss_delta_bytes"]}')
+
+    def write(self, path: str) -> str:
+        """ Writes the Chrome trace (with the summary alongside) to path/<run>.trace.json. Returns the file name. """
+        os.makedirs(path, exist_ok=True)
+        file_name = os.path.join(path, f'{self.name}.trace.json')
+        with self._lock:
+            trace = {'traceEvents': list(self._events), 'displayTimeUnit': 'ms', 'summary': self.summary()}
+        with open(file_name, 'w') as fp:
+            json.dump(trace, fp)
+        _LOGGER.info(f'   TRACE WRITTEN              | {file_name}')
+        return file_name
@@ -0,0 +1,228 @@
+"""
+Watch mode: keep the graphs of a config alive and, whenever an input file or an algorithm module changes,
+re-execute only the nodes downstream of the change.
+
+Everything each data source and algorithm publishes is kept in memory, so a re-executed node is fed the unchanged
+outputs of its clean subjects from memory instead of recomputing them.
+"""
+import hashlib, importlib, logging, os, sys, time
+from typing import Any, Dict, List, Set
+
+from datapipes._utilities.frames import fanout_view
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes.observer import PubSubMessage
+
+_LOGGER = logging.getLogger(LOGGER_NAME)
+
+
+def _file_hash(file_name: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class _Recorder():
+    """ Replaces a publisher's notify, keeping a snapshot of every message before publishing it. """
+
+    def __init__(self, pubsub):
+        self.messages: List[PubSubMessage] = []
+        self._pubsub = pubsub
+        self._notify = pubsub.notify
+
+    def __call__(self):
+        self.messages.append(PubSubMessage(self._pubsub.pubsub_message))
+        return self._notify()
+
+
+class _WatchedRun():
+    """
+    The live graph of one independent run.
+
+    Args:
+        runner: the RunLocal whose _build_graph and _create_algorithm make the objects.
+        run_cfg: the run's configuration.
+        key: (optional) the run's key, to build it as compiled in the runner's execution plan.
+    """
+
+    def __init__(self, runner: Any, run_cfg: Dict[str, Any], key: str = None):
+        self._runner = runner
+        self._run_cfg = run_cfg
+        self.graph = runner._build_graph(run_cfg, key)
+        self.sources = self.graph['sources']
+        self.algorithms = self.graph['algorithms']
+        self.nodes = {**self.sources, **self.algorithms, **self.graph['outputs']}
+        self.order = self.graph['order']
+        self.subjects = {name: [subject for subject, observer in self.graph['edges'] if observer == name]
+                         for name in self.nodes}
+        self.recorders = {name: self._record(node) for name, node in {**self.sources, **self.algorithms}.items()}
+
+    @staticmethod
+    def _record(node) -> _Recorder:
+        recorder = _Recorder(node.PubSub)
+        node.PubSub.notify = recorder
+        return recorder
+
+    def files(self) -> Dict[str, List[str]]:
+        """ Every watched file and the nodes it makes dirty: source inputs and algorithm modules. """
+        files = {}
+        for name, source in self.sources.items():
+            for file_name in source.inputs():
+                files.setdefault(os.path.abspath(file_name), []).append(name)
+        for name, algorithm in self.algorithms.items():
+            module_file = getattr(sys.modules.get(type(algorithm).__module__), '__file__', None)
+            if module_file:
+                files.setdefault(os.path.abspath(module_file), []).append(name)
+        return files
+
+    def descendants(self, names: Set[str]) -> Set[str]:
+        dirty = set(names)
+        for name in self.order:
+            if any(subject in dirty for subject in self.subjects[name]):
+                dirty.add(name)
+        return dirty
+
+    def execute(self, changed: Set[str] = None) -> None:
+        """ Runs the whole graph, or, given the nodes that changed, only them and everything downstream. """
+        dirty = set(self.nodes) if changed is None else self.descendants(changed)
+        _LOGGER.info(f'   WATCH RE-EXECUTING         | {[name for name in self.order if name in dirty]}')
+
+        for name in self.order:
+            if name not in dirty:
+                continue
+            if name in self.graph['outputs']:
+                self.nodes[name].reset()
+            elif name in self.algorithms and changed is not None:
+                self._recreate(name)
+            if name in self.recorders:
+                self.recorders[name].messages.clear()
+
+        try:
+            for name in self.order:
+                if name not in dirty:
+                    continue
+                if name in self.sources:
+                    self.nodes[name].on()
+                    continue
+                # Dirty subjects publish to this node as they re-execute; clean ones are replayed from memory.
+                for subject in self.subjects[name]:
+                    if subject in dirty:
+                        continue
+                    fanout = self.nodes[subject].PubSub.fanout
+                    for message in self.recorders[subject].messages:
+                        replay = PubSubMessage(message.pubsub_message)
+                        replay.pubsub_message['data'] = fanout_view(replay.pubsub_message.get('data'), fanout)
+                        self.nodes[name].update(replay)
+        except BaseException:
+            self._runner._abort_outputs(self.graph)
+            raise
+        self._runner._close_outputs(self.graph)
+
+    def _recreate(self, name: str) -> None:
+        """ Swap a fresh instance of the (possibly reloaded) algorithm in place of the old one. """
+        old = self.algorithms[name]
+        new = self._runner._create_algorithm(name, self._run_cfg['algorithms'][name], len(self.subjects[name]))
+        new.PubSub = old.PubSub
+        for subject in self.subjects[name]:
+            self.nodes[subject].PubSub.replace(old, new)
+        self.algorithms[name] = self.nodes[name] = new
+
+
+class Watcher():
+    """
+    Runs every independent run of a config once, then polls the watched files and re-executes the dirty
+    subgraphs whenever one of them changes. A file counts as changed when its content hash changes, so touching a
+    file without editing it does nothing, and when it appears in or vanishes from a source (e.g. a new shard in a
+    directory or glob source). Changed algorithm modules are reloaded before their nodes re-execute.
+
+    Args:
+        runner: a RunLocal for the config.
+        interval: (optional) seconds between polls. Defaults to 1.
+    """
+
+    def __init__(self, runner: Any, interval: float = 1.0):
+        self._runner = runner
+        self._interval = interval
+        self._runs: Dict[str, _WatchedRun] = {}
+        self._stats: Dict[str, tuple] = {}
+        self._hashes: Dict[str, str] = {}
+        self._owners: Dict[str, List[tuple]] = {}
+        self._polled = False
+
+    def watch(self) -> None:
+        with self._runner._fanout_scope():
+            for key, run_cfg in self._runner._cfg['independent_runs'].items():
+                self._runs[key] = _WatchedRun(self._runner, run_cfg, key)
+                self._execute(key)
+            self._changed_files()
+
+            _LOGGER.info(f'   WATCHING                   | {len(self._watched())} files, polling every {self._interval}s')
+            while True:
+                time.sleep(self._interval)
+                changed_files = self._changed_files()
+                if changed_files:
+                    self._rerun(changed_files)
+
+    def _watched(self) -> Dict[str, List[tuple]]:
+        """ Every watched file and the (run, node) pairs it makes dirty. """
+        watched = {}
+        for key, run in self._runs.items():
+            for file_name, names in run.files().items():
+                watched.setdefault(file_name, []).extend((key, name) for name in names)
+        return watched
+
+    def _changed_files(self) -> Dict[str, List[tuple]]:
+        """
+        The watched files that appeared, vanished or whose content changed since the last poll (content is checked
+        by hash when the stat changed), each with the (run, node) pairs it makes dirty. The first poll only records
+        what is there.
+        """
+        watched = self._watched()
+        changed = {}
+        for file_name, owners in watched.items():
+            try:
+                stat = os.stat(file_name)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if self._stats.get(file_name) == signature:
+                    continue
+                content = _file_hash(file_name)
+            except OSError:  # vanished since the source listed it
+                continue
+            if self._polled and self._hashes.get(file_name) != content:
+                changed[file_name] = owners
+            self._stats[file_name] = signature
+            self._hashes[file_name] = content
+
+        # A file that is no longer listed, or no longer there, dirties the nodes that read it last time.
+        for file_name in [file_name for file_name in self._hashes
+                          if file_name not in watched or not os.path.exists(file_name)]:
+            changed[file_name] = watched.get(file_name) or self._owners.get(file_name, [])
+            del self._stats[file_name], self._hashes[file_name]
+
+        self._owners = watched
+        self._polled = True
+        return changed
+
+    def _rerun(self, changed_files: Dict[str, List[tuple]]) -> None:
+        _LOGGER.info(f'   WATCH CHANGE DETECTED      | {list(changed_files)}')
+
+        for file_name in changed_files:
+            for module in list(sys.modules.values()):
+                if os.path.abspath(getattr(module, '__file__', None) or '') == file_name:
+                    importlib.reload(module)
+
+        dirty: Dict[str, Set[str]] = {}
+        for owners in changed_files.values():
+            for key, name in owners:
+                dirty.setdefault(key, set()).add(name)
+
+        for key, names in dirty.items():
+            self._execute(key, names)
+
+    def _execute(self, key: str, names: Set[str] = None) -> None:
+        """ Execute a run, logging a failure instead of raising it so watching carries on. """
+        try:
+            self._runs[key].execute(names)
+        except Exception as error:
+            _LOGGER.error(f'   WATCH RUN FAILED           | {key}: {error!r}')
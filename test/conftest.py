@@ -0,0 +1,40 @@
+"""
+Shared helpers for the end-to-end tests: each test writes its inputs and a config into a temporary directory and
+runs the config with RunLocal, as DataSpigot would.
+"""
+import os, sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datapipes.run import RunLocal
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({'a': range(10), 'b': [float(i) / 2 for i in range(10)]})
+
+
+def csv_source(path, key, observers, **options):
+    return dict({'format': 'csv', 'key': key, 'path': str(path), 'observers': observers}, **options)
+
+
+def csv_output(path, key, **options):
+    return dict({'format': 'csv', 'key': key, 'path': str(path)}, **options)
+
+
+def config(data_sources, algorithms, data_output, **settings):
+    """ A config of one independent run 'r1'. """
+    return dict({'run_strategy': 'local', 'data_mode': 'batch',
+                 'independent_runs': {'r1': {'data_sources': data_sources, 'algorithms': algorithms,
+                                             'data_output': data_output}}}, **settings)
+
+
+def run(cfg):
+    RunLocal(cfg).execute()
+
+
+def read_output(path, key):
+    return pd.read_csv(os.path.join(str(path), f'{key}.csv'))
@@ -0,0 +1,101 @@
+import asyncio, threading
+
+import pandas as pd
+import pytest
+
+from datapipes.dataio import DataContext, _DataStrategy
+from datapipes.factory import Factory
+from datapipes.run import RunLocalAsync
+from conftest import config, csv_output, csv_source, read_output
+
+WRITTEN = {}
+
+
+class AsyncFrames(_DataStrategy):
+    """ An async-native strategy: reads chunks of a frame and collects what it writes, on the event loop only. """
+
+    def __init__(self, **kwargs):
+        self.key = kwargs['key']
+        self.rows = kwargs.get('rows', 10)
+        self.chunksize = kwargs.get('chunksize', 3)
+
+    async def aload(self):
+        for start in range(0, self.rows, self.chunksize):
+            await asyncio.sleep(0)
+            stop = min(start + self.chunksize, self.rows)
+            yield self.key, pd.DataFrame({'a': range(start, stop), 'b': [i / 2 for i in range(start, stop)]})
+
+    async def asave(self, result, append=False):
+        await asyncio.sleep(0)
+        assert threading.current_thread() is threading.main_thread()
+        WRITTEN[self.key] = pd.concat([WRITTEN[self.key], result]) if append else result
+
+    def load(self):
+        raise AssertionError('the async runner must use aload')
+
+    def save(self, result, append=False):
+        raise AssertionError('the async runner must use asave')
+
+
+@pytest.fixture
+def async_frames(monkeypatch):
+    monkeypatch.setitem(DataContext.STRATEGIES, 'test_async_frames', AsyncFrames)
+    WRITTEN.clear()
+
+
+@Factory.register('test_async_native')
+class Native:
+    async def update(self, subject):
+        await asyncio.sleep(0)
+        data = subject.pubsub_message['data']
+        self.PubSub.pubsub_message['data'] = data.assign(b=data['b'] * 2)
+        self.notify()
+
+
+@Factory.register('test_async_blocking')
+class Blocking:
+    """ A synchronous algorithm, run on the executor. """
+
+    def update(self, subject):
+        assert threading.current_thread() is not threading.main_thread()
+        data = subject.pubsub_message['data']
+        self.PubSub.pubsub_message['data'] = data.assign(a=data['a'] + 1)
+        self.notify()
+
+
+def test_async_strategies_and_algorithms(async_frames):
+    cfg = config({'src': {'format': 'test_async_frames', 'key': 'src', 'observers': ['test_async_native']}},
+                 {'test_async_native': {'observers': ['test_async_blocking']},
+                  'test_async_blocking': {'observers': ['out']}},
+                 {'out': {'format': 'test_async_frames', 'key': 'out'}},
+                 run_strategy='local_async')
+    RunLocalAsync(cfg).execute()
+
+    out = WRITTEN['out'].reset_index(drop=True)
+    assert out['a'].tolist() == list(range(1, 11))
+    assert out['b'].tolist() == [i for i in range(10)]
+
+
+def test_synchronous_strategies_run_on_the_executor(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_async_blocking'], chunksize=4)},
+                 {'test_async_blocking': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'out', 'out')},
+                 run_strategy='local_async', **{'async': {'queue_size': 1}})
+    RunLocalAsync(cfg).execute()
+    assert read_output(tmp_path / 'out', 'out')['a'].tolist() == [a + 1 for a in frame['a']]
+
+
+def test_independent_runs_share_the_loop_and_report_failures(async_frames):
+    cfg = config({'src': {'format': 'test_async_frames', 'key': 'src', 'observers': ['test_async_native']}},
+                 {'test_async_native': {'observers': ['out']}},
+                 {'out': {'format': 'test_async_frames', 'key': 'out'}},
+                 run_strategy='local_async')
+    cfg['independent_runs']['r2'] = {'data_sources': {'src': {'format': 'test_async_frames', 'key': 'src', 'rows': 'x',
+                                                              'observers': ['test_async_native']}},
+                                     'algorithms': {'test_async_native': {'observers': ['other']}},
+                                     'data_output': {'other': {'format': 'test_async_frames', 'key': 'other'}}}
+
+    with pytest.raises(RuntimeError, match=r"1 of 2 independent runs failed: \['r2'\]"):
+        RunLocalAsync(cfg).execute()
+    assert WRITTEN['out']['b'].tolist() == [float(i) for i in range(10)]
@@ -0,0 +1,146 @@
+import glob, os
+
+import pandas as pd
+
+from datapipes.cache import ResultCache
+from datapipes.factory import Factory
+from conftest import config, csv_output, csv_source, read_output, run
+
+
+@Factory.register('test_cache_square')
+class Square:
+    calls = 0
+
+    def update(self, subject):
+        Square.calls += 1
+        data = subject.pubsub_message['data'].copy()
+        data['b'] = data['b'] ** 2
+        self.PubSub.pubsub_message['data'] = data
+        self.notify()
+
+
+def cached(tmp_path, **cache):
+    return config({'src': csv_source(tmp_path, 'src', ['test_cache_square'])},
+                  {'test_cache_square': {'observers': ['out']}},
+                  {'out': csv_output(tmp_path / 'out', 'out')},
+                  cache=dict({'path': str(tmp_path / 'cache')}, **cache))
+
+
+def test_a_hit_publishes_the_stored_outputs_without_running(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    Square.calls = 0
+
+    run(cached(tmp_path))
+    first = read_output(tmp_path / 'out', 'out')
+    os.remove(tmp_path / 'out' / 'out.csv')
+    run(cached(tmp_path))
+
+    assert Square.calls == 1
+    assert read_output(tmp_path / 'out', 'out').equals(first)
+    assert first['b'].tolist() == [b ** 2 for b in frame['b']]
+
+
+def test_changed_data_misses(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    Square.calls = 0
+    run(cached(tmp_path))
+
+    frame.assign(b=frame['b'] + 1).to_csv(tmp_path / 'src.csv', index=False)
+    run(cached(tmp_path))
+
+    assert Square.calls == 2
+    assert read_output(tmp_path / 'out', 'out')['b'].tolist() == [(b + 1) ** 2 for b in frame['b']]
+
+
+def test_the_key_follows_the_code_version(frame):
+    algorithm = Factory.create('test_cache_square')
+    cache = ResultCache()
+    key = cache.key(algorithm, frame)
+    assert cache.key(algorithm, frame.copy()) == key
+
+    Square.__version__ = '2'
+    try:
+        assert ResultCache().key(algorithm, frame) != key
+    finally:
+        del Square.__version__
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, frame):
+    cache = ResultCache(str(tmp_path / 'cache'))
+    for key in ('aa1', 'bb2', 'cc3'):
+        staging = cache.stage(key)
+        cache.commit(key, staging, [cache.add(staging, {'data': frame, 'topic': key})])
+    os.utime(cache._entry('aa1'), (0, 0))
+    size = sum(os.path.getsize(os.path.join(cache._entry('bb2'), name)) for name in os.listdir(cache._entry('bb2')))
+
+    cache.max_bytes = 2 * size
+    cache.evict()
+
+    assert cache.get('aa1') is None
+    assert [message['topic'] for message in cache.get('cc3')] == ['cc3']
+
+
+def test_the_key_follows_the_node_config(frame):
+    algorithm = Factory.create('test_cache_square')
+    cache = ResultCache()
+    assert cache.key(algorithm, frame, {'threshold': 1}) != cache.key(algorithm, frame, {'threshold': 2})
+    cache.wrap(algorithm, 'test_cache_square', {'threshold': 1, 'observers': ['out']})
+    assert algorithm.update._node_cfg == {'threshold': 1}
+
+
+@Factory.register('test_cache_join')
+class Join:
+    calls = 0
+
+    def __init__(self):
+        self.left = None
+
+    def update(self, subject):
+        Join.calls += 1
+        data = subject.pubsub_message['data']
+        if self.left is None:
+            self.left = data
+            return
+        self.PubSub.pubsub_message['data'] = self.left.assign(other=data['b'].values)
+        self.notify()
+
+
+@Factory.register('test_cache_collect')
+class Collect:
+    """ One subject, but keeps every frame it received. """
+
+    def __init__(self):
+        self.frames = []
+
+    def update(self, subject):
+        self.frames.append(subject.pubsub_message['data'])
+        self.PubSub.pubsub_message['data'] = pd.concat(self.frames, ignore_index=True)
+        self.notify()
+
+
+def test_a_changed_input_of_a_two_input_node_is_seen(tmp_path, frame):
+    frame.to_csv(tmp_path / 'left.csv', index=False)
+    frame.to_csv(tmp_path / 'right.csv', index=False)
+    cfg = config({'left': csv_source(tmp_path, 'left', ['test_cache_join']),
+                  'right': csv_source(tmp_path, 'right', ['test_cache_join'])},
+                 {'test_cache_join': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'out', 'out')},
+                 cache={'path': str(tmp_path / 'cache')})
+    run(cfg)
+
+    frame.assign(b=-frame['b']).to_csv(tmp_path / 'right.csv', index=False)
+    run(cfg)
+
+    assert read_output(tmp_path / 'out', 'out')['other'].tolist() == (-frame['b']).tolist()
+
+
+def test_an_algorithm_keeping_state_is_not_cached(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_cache_collect'], chunksize=4)},
+                 {'test_cache_collect': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'out', 'out')},
+                 cache={'path': str(tmp_path / 'cache')})
+    run(cfg)
+    run(cfg)
+
+    assert not glob.glob(str(tmp_path / 'cache' / '*' / '*'))
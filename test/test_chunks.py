@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from datapipes.dataio import StrategyCSV
+from datapipes.factory import Factory
+from conftest import config, csv_output, csv_source, read_output, run
+
+
+@Factory.register('test_chunks_count')
+class Count:
+    def __init__(self):
+        self.rows = []
+
+    def update(self, subject):
+        data = subject.pubsub_message['data']
+        self.rows.append(len(data))
+        self.PubSub.pubsub_message['data'] = data.assign(chunk=len(self.rows))
+        self.notify()
+
+
+@pytest.mark.parametrize('options, rows', [({'chunksize': 4}, [4, 4, 2]),
+                                           ({'chunksize': 4, 'chunk_bytes': 1}, [4, 4, 2]),
+                                           ({'chunk_bytes': 1}, [1] * 10)],
+                         ids=['chunksize', 'chunksize-first', 'chunk_bytes'])
+def test_chunk_sizes(tmp_path, frame, options, rows):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    chunks = list(StrategyCSV(key='src', path=str(tmp_path), **options).load())
+
+    assert [len(data) for _, data in chunks] == rows
+    pd.testing.assert_frame_equal(pd.concat([data for _, data in chunks], ignore_index=True), frame)
+
+
+def test_chunk_bytes_estimates_rows_from_line_length(tmp_path):
+    pd.DataFrame({'a': range(1000)}).to_csv(tmp_path / 'src.csv', index=False)
+    line_bytes = sum(len(f'{a}\n') for a in range(1000)) / 1000
+
+    chunks = list(StrategyCSV(key='src', path=str(tmp_path), chunk_bytes='1KB').load())
+
+    assert len(chunks[0][1]) == int(1024 // line_bytes)
+    assert sum(len(data) for _, data in chunks) == 1000
+
+
+def test_chunks_are_published_one_by_one_and_appended(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    run(config({'src': csv_source(tmp_path, 'src', ['test_chunks_count'], chunksize=3)},
+               {'test_chunks_count': {'observers': ['out']}},
+               {'out': csv_output(tmp_path / 'out', 'out')}))
+
+    out = read_output(tmp_path / 'out', 'out')
+    pd.testing.assert_frame_equal(out[['a', 'b']], frame)
+    assert out['chunk'].tolist() == [1, 1, 1, 2, 2, 2, 3, 3, 3, 4]
@@ -0,0 +1,53 @@
+import gzip, importlib.util, io, os
+
+import pandas as pd
+import pytest
+
+from datapipes._utilities.compression import ParallelGzipWriter, open_read
+from datapipes.dataio import StrategyCSV
+from conftest import config, csv_output, csv_source, run
+
+COMPRESSIONS = ['gzip', pytest.param('zstd', marks=pytest.mark.skipif(importlib.util.find_spec('zstandard') is None,
+                                                                       reason='zstandard is not installed'))]
+
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_a_chunked_run_round_trips_compressed_csv(tmp_path, frame, compression):
+    extension = {'gzip': '.gz', 'zstd': '.zst'}[compression]
+    StrategyCSV(key='src', path=str(tmp_path), compression=compression).save(frame)
+    assert os.path.exists(tmp_path / f'src.csv{extension}')
+
+    run(config({'src': csv_source(tmp_path, 'src', ['out'], compression=compression, chunksize=3)}, {},
+               {'out': csv_output(tmp_path / 'out', 'out', compression=compression, compression_threads=2)}))
+
+    # every appended chunk is its own gzip member or zstd frame, all of which are read back
+    with open_read(str(tmp_path / 'out' / f'out.csv{extension}'), compression) as fp:
+        pd.testing.assert_frame_equal(pd.read_csv(fp), frame)
+    _, data = next(iter(StrategyCSV(key='out', path=str(tmp_path / 'out'), compression=compression).load()))
+    pd.testing.assert_frame_equal(data, frame)
+
+
+@pytest.mark.parametrize('compression', COMPRESSIONS)
+def test_a_directory_is_decompressed_by_extension(tmp_path, frame, compression):
+    extension = {'gzip': '.gz', 'zstd': '.zst'}[compression]
+    StrategyCSV(key='day1', path=str(tmp_path / 'daily'), compression=compression).save(frame.iloc[:5])
+    StrategyCSV(key='day2', path=str(tmp_path / 'daily')).save(frame.iloc[5:])
+    assert sorted(os.listdir(tmp_path / 'daily')) == [f'day1.csv{extension}', 'day2.csv']
+
+    _, data = next(iter(StrategyCSV(key='daily', path=str(tmp_path)).load()))
+    pd.testing.assert_frame_equal(data, frame)
+
+
+def test_parallel_gzip_writes_members_in_order():
+    payload = b''.join(b'%d,%d\n' % (i, i * i) for i in range(10000))
+    out = io.BytesIO()
+    out.close = lambda: None
+    with ParallelGzipWriter(out, level=6, threads=4, block_size=1000) as writer:
+        writer.write(payload)
+
+    assert gzip.decompress(out.getvalue()) == payload
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(NotImplementedError, match='Compression'):
+        StrategyCSV(key='src', path=str(tmp_path), compression='lzma')
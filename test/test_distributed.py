@@ -0,0 +1,56 @@
+import pytest
+
+from datapipes.factory import Factory
+from datapipes.run import RunDistributed
+from conftest import config, csv_output, csv_source, read_output
+
+
+@Factory.register('test_distributed_double')
+class Double:
+    def update(self, subject):
+        data = subject.pubsub_message['data'].copy()
+        data['b'] = data['b'] * 2
+        self.PubSub.pubsub_message['data'] = data
+        self.notify()
+
+
+@Factory.register('test_distributed_increment')
+class Increment:
+    def update(self, subject):
+        data = subject.pubsub_message['data'].copy()
+        data['a'] = data['a'] + 1
+        self.PubSub.pubsub_message['data'] = data
+        self.notify()
+
+
+def two_runs(tmp_path, frame, **distributed):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_distributed_double'])},
+                 {'test_distributed_double': {'observers': ['test_distributed_increment']},
+                  'test_distributed_increment': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'r1', 'out')},
+                 run_strategy='distributed', distributed=dict({'workers': 2}, **distributed))
+    second = cfg['independent_runs']['r1']
+    cfg['independent_runs']['r2'] = dict(second, data_output={'out': csv_output(tmp_path / 'r2', 'out')})
+    return cfg
+
+
+@pytest.mark.parametrize('distributed', [{'split': 'runs'},
+                                         {'split': 'graph', 'assign': {'test_distributed_increment': 1}}],
+                         ids=['runs', 'graph'])
+def test_runs_on_spawned_workers(tmp_path, frame, distributed):
+    RunDistributed(two_runs(tmp_path, frame, **distributed)).execute()
+
+    for key in ('r1', 'r2'):
+        out = read_output(tmp_path / key, 'out')
+        assert out['a'].tolist() == [a + 1 for a in frame['a']]
+        assert out['b'].tolist() == [b * 2 for b in frame['b']]
+
+
+def test_a_failed_run_is_reported(tmp_path, frame):
+    cfg = two_runs(tmp_path, frame)
+    cfg['independent_runs']['r2']['data_sources'] = {'src': csv_source(tmp_path / 'missing', 'src',
+                                                                      ['test_distributed_double'])}
+    with pytest.raises(RuntimeError, match=r"1 of 2 independent runs failed: \['r2'\]"):
+        RunDistributed(cfg).execute()
+    assert read_output(tmp_path / 'r1', 'out')['a'].tolist() == [a + 1 for a in frame['a']]
@@ -0,0 +1,22 @@
+import importlib, sys
+
+import pytest
+
+from datapipes.factory import Factory
+
+
+def test_a_failed_lazy_import_can_be_retried(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    Factory.declare('test_factory_retried', 'test_factory_plugin:Plugin')
+
+    with pytest.raises(ImportError):
+        Factory.create('test_factory_retried')
+    assert 'test_factory_retried' in Factory.declared()
+
+    (tmp_path / 'test_factory_plugin.py').write_text('class Plugin:\n    pass\n')
+    importlib.invalidate_caches()
+    try:
+        assert type(Factory.create('test_factory_retried')).__name__ == 'Plugin'
+        assert 'test_factory_retried' not in Factory.declared()
+    finally:
+        sys.modules.pop('test_factory_plugin', None)
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from datapipes.factory import Factory
+from conftest import config, csv_output, csv_source, read_output, run
+
+pytestmark = pytest.mark.skipif(int(pd.__version__.split('.')[0]) >= 3, reason='copy-on-write is always on')
+
+
+@Factory.register('test_fanout_mutate')
+class Mutate:
+    seen = []
+
+    def update(self, subject):
+        Mutate.seen.append(pd.get_option('mode.copy_on_write'))
+        data = subject.pubsub_message['data']
+        data['a'] *= 10
+        self.PubSub.pubsub_message['data'] = data
+        self.notify()
+
+
+def test_copy_on_write_is_scoped_to_the_run(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_fanout_mutate', 'raw'])},
+                 {'test_fanout_mutate': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'out', 'out'), 'raw': csv_output(tmp_path / 'raw', 'raw')},
+                 fanout='copy_on_write')
+    Mutate.seen.clear()
+    before = pd.get_option('mode.copy_on_write')
+
+    run(cfg)
+
+    assert Mutate.seen == [True]
+    assert pd.get_option('mode.copy_on_write') == before
+    assert read_output(tmp_path / 'out', 'out')['a'].tolist() == [a * 10 for a in frame['a']]
+    assert read_output(tmp_path / 'raw', 'raw')['a'].tolist() == frame['a'].tolist()
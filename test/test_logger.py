@@ -0,0 +1,70 @@
+import json, logging
+from logging.handlers import QueueHandler
+
+import pytest
+
+from datapipes._utilities import logger
+
+
+@pytest.fixture
+def package_logger():
+    """ The package logger, restored to its handlers and level after the test. """
+    log = logging.getLogger(logger.LOGGER_NAME)
+    handlers, level, installed = list(log.handlers), log.level, logger._HANDLER
+    yield log
+    logger._stop_listener()
+    for handler in log.handlers:
+        log.removeHandler(handler)
+    for handler in handlers:
+        log.addHandler(handler)
+    log.setLevel(level)
+    logger._HANDLER = installed
+
+
+def lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+
+
+def test_json_lines(package_logger, capsys):
+    logger.configure_logger('debug', background=False)
+    package_logger.debug('   NODE                       | %s "quoted"', 'first', extra={'node': 'n1'})
+    try:
+        raise ValueError('multi\nline')
+    except ValueError:
+        package_logger.exception('failed')
+
+    first, second = lines(capsys)
+    assert first['message'] == '   NODE                       | first "quoted"'
+    assert first['level'] == 'DEBUG' and first['node'] == 'n1'
+    assert second['message'] == 'failed' and 'ValueError: multi\nline' in second['exception']
+
+
+def test_background_records_are_written_by_the_listener(package_logger, capsys):
+    logger.configure_logger('info')
+    handlers = [handler for handler in package_logger.handlers if handler is logger._HANDLER]
+    assert len(handlers) == 1 and isinstance(handlers[0], QueueHandler)
+
+    for i in range(100):
+        package_logger.info('record %d', i)
+    package_logger.debug('below the level')
+    logger._stop_listener()
+
+    assert [entry['message'] for entry in lines(capsys)] == [f'record {i}' for i in range(100)]
+
+
+def test_reconfiguring_replaces_the_handler(package_logger, capsys):
+    logger.configure_logger('info', 'text')
+    logger.configure_logger('info', 'json', background=False)
+    package_logger.info('once')
+
+    assert [entry['message'] for entry in lines(capsys)] == ['once']
+
+
+def test_debug_records_are_sampled_per_node(package_logger, capsys):
+    logger.configure_logger('debug', background=False, sample=3)
+    for i in range(6):
+        package_logger.debug('a %d', i, extra={'node': 'a'})
+        package_logger.debug('b %d', i, extra={'node': 'b'})
+    package_logger.info('kept')
+
+    assert [entry['message'] for entry in lines(capsys)] == ['a 0', 'b 0', 'a 3', 'b 3', 'kept']
@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datapipes.factory import Factory
+from conftest import config, run
+
+pa = pytest.importorskip('pyarrow')
+
+
+@Factory.register('test_memmap_passthrough')
+class Passthrough:
+    def update(self, subject):
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data']
+        self.notify()
+
+
+def test_npy_frames_with_projected_columns(tmp_path):
+    np.save(tmp_path / 'grid.npy', np.arange(20, dtype='float64').reshape(10, 2))
+    cfg = config({'grid': {'format': 'memmap', 'key': 'grid', 'path': str(tmp_path), 'as_frame': True,
+                           'column_names': ['a', 'b'], 'columns': ['b'], 'chunksize': 4,
+                           'observers': ['test_memmap_passthrough']}},
+                 {'test_memmap_passthrough': {'observers': ['out'], 'columns': ['b']}},
+                 {'out': {'format': 'csv', 'key': 'out', 'path': str(tmp_path / 'out')}})
+    run(cfg)
+    written = pd.read_csv(tmp_path / 'out' / 'out.csv')
+    assert list(written.columns) == ['b']
+    assert written.b.tolist() == list(np.arange(1, 20, 2, dtype='float64'))
+
+
+def test_arrow_file_to_arrow_output(tmp_path):
+    table = pa.table({'a': list(range(6)), 'b': [str(i) for i in range(6)]})
+    with pa.ipc.new_file(str(tmp_path / 'src.arrow'), table.schema) as writer:
+        writer.write_table(table)
+    cfg = config({'src': {'format': 'memmap', 'key': 'src', 'path': str(tmp_path), 'columns': ['a'],
+                          'observers': ['test_memmap_passthrough']}},
+                 {'test_memmap_passthrough': {'observers': ['out']}},
+                 {'out': {'format': 'arrow', 'key': 'out', 'path': str(tmp_path / 'out')}})
+    run(cfg)
+    written = pa.ipc.open_file(os.path.join(tmp_path, 'out', 'out.arrow')).read_all()
+    assert written.column_names == ['a']
+    assert written.column('a').to_pylist() == list(range(6))
+
+
+def mapped_ranges(file_name):
+    """ The address ranges of this process's mappings of a file, from /proc/self/maps. """
+    ranges = []
+    with open('/proc/self/maps') as fp:
+        for line in fp:
+            if line.rstrip().endswith(str(file_name)):
+                low, high = (int(address, 16) for address in line.split()[0].split('-'))
+                ranges.append((low, high))
+    return ranges
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason='reads the mappings from /proc/self/maps')
+@pytest.mark.parametrize('chunksize', [None, 250])
+def test_arrow_batches_are_published_as_views_of_the_map(tmp_path, chunksize):
+    from datapipes.dataio import StrategyMemmap
+
+    rows = 1000
+    table = pa.table({'a': np.arange(rows), 'b': np.arange(rows) / 2, 'c': [str(i % 3) for i in range(rows)]})
+    with pa.ipc.new_file(str(tmp_path / 'src.arrow'), table.schema) as writer:
+        writer.write_table(table, max_chunksize=400)
+    strategy = StrategyMemmap(key='src', path=str(tmp_path), columns=['a', 'b'], chunksize=chunksize)
+
+    chunks = [data for _, data in strategy.load()]
+
+    assert [len(data) for data in chunks] == ([400, 400, 200] if chunksize is None else [250, 150, 250, 150, 200])
+    assert pd.concat(chunks, ignore_index=True).equals(table.select(['a', 'b']).to_pandas())
+    ranges = mapped_ranges(tmp_path / 'src.arrow')
+    for data in chunks:
+        for column in ('a', 'b'):
+            address = data[column].to_numpy().ctypes.data
+            assert any(low <= address < high for low, high in ranges)
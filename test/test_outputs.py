@@ -0,0 +1,69 @@
+import glob, os, threading
+
+import pandas as pd
+import pytest
+
+from datapipes.dataio import DataContext, StrategyCSV
+from datapipes.factory import Factory
+from datapipes.observer import PubSub
+from conftest import config, csv_output, csv_source, run
+
+
+@Factory.register('test_outputs_fail_second')
+class FailSecond:
+    def __init__(self):
+        self.chunks = 0
+
+    def update(self, subject):
+        self.chunks += 1
+        if self.chunks == 2:
+            raise ValueError('second chunk')
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data']
+        self.notify()
+
+
+def writers():
+    return [thread for thread in threading.enumerate() if thread.name.startswith('datapipes-writer-')]
+
+
+@pytest.mark.parametrize('settings', [{}, {'executor': 'thread'}, {'data_mode': 'stream'}],
+                         ids=['sync', 'scheduler', 'stream'])
+def test_a_failed_run_leaves_no_temporary_outputs(tmp_path, frame, settings):
+    pytest.importorskip('pyarrow')
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_outputs_fail_second'], chunksize=3)},
+                 {'test_outputs_fail_second': {'observers': ['behind', 'atomic']}},
+                 {'behind': csv_output(tmp_path / 'out', 'behind', write_behind={'buffer': 1}),
+                  'atomic': {'format': 'parquet', 'key': 'atomic', 'path': str(tmp_path / 'out'), 'atomic': True}},
+                 **settings)
+
+    with pytest.raises(ValueError, match='second chunk'):
+        run(cfg)
+
+    assert not glob.glob(str(tmp_path / 'out' / '.*.tmp'))
+    assert not os.path.exists(tmp_path / 'out' / 'behind.csv')
+    assert not os.path.exists(tmp_path / 'out' / 'atomic.parquet')
+    assert not writers()
+
+
+def test_a_failed_write_behind_surfaces_at_close(tmp_path, frame, monkeypatch):
+    batch_write = StrategyCSV.batch_write
+
+    def fail_second(self, data=None, append=False):
+        if append:
+            raise OSError('disk full')
+        return batch_write(self, data, append=append)
+
+    monkeypatch.setattr(StrategyCSV, 'batch_write', fail_second)
+    output = DataContext(csv_output(tmp_path, 'behind', write_behind={'buffer': 1}))
+    subject = PubSub()
+    for start in range(0, 10, 3):
+        subject.pubsub_message = {'data': frame.iloc[start:start + 3]}
+        output.update(subject)
+
+    with pytest.raises(OSError, match='disk full'):
+        output.close()
+
+    assert not glob.glob(str(tmp_path / '.*.tmp'))
+    assert not os.path.exists(tmp_path / 'behind.csv')
+    assert not writers()
@@ -0,0 +1,45 @@
+import os, time
+
+import pandas as pd
+import pytest
+
+from datapipes.factory import Factory
+from conftest import config, csv_output, csv_source, read_output, run
+
+
+@Factory.register('test_parallel_meet')
+class Meet:
+    """ Waits until every run due to meet has arrived, which only happens if they execute at the same time. """
+    def update(self, subject):
+        data = subject.pubsub_message['data']
+        run, markers, expected = data['run'][0], data['markers'][0], data['expected'][0]
+        if run == 'bad':
+            raise ValueError('bad run')
+        open(os.path.join(markers, run), 'w').close()
+        deadline = time.monotonic() + 20
+        while len(os.listdir(markers)) < expected:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'{run} waited for the other runs alone')
+            time.sleep(0.01)
+        self.PubSub.pubsub_message['data'] = data[['run']]
+        self.notify()
+
+
+def test_runs_execute_in_parallel_and_a_failed_run_is_reported(tmp_path):
+    markers = tmp_path / 'markers'
+    markers.mkdir()
+    runs = ('r1', 'r2', 'bad')
+    cfg = config({}, {}, {}, max_parallel_runs=len(runs))
+    for key in runs:
+        pd.DataFrame({'run': [key], 'markers': [str(markers)], 'expected': [len(runs) - 1]}).to_csv(
+            tmp_path / f'{key}.csv', index=False)
+        cfg['independent_runs'][key] = {'data_sources': {'src': csv_source(tmp_path, key, ['test_parallel_meet'])},
+                                        'algorithms': {'test_parallel_meet': {'observers': ['out']}},
+                                        'data_output': {'out': csv_output(tmp_path / key, 'out')}}
+
+    with pytest.raises(RuntimeError, match=r"1 of 3 independent runs failed: \['bad'\]"):
+        run(cfg)
+
+    for key in ('r1', 'r2'):
+        assert read_output(tmp_path / key, 'out')['run'].tolist() == [key]
+    assert not os.path.exists(tmp_path / 'bad' / 'out.csv')
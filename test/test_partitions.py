@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+import pytest
+
+from datapipes.dataio import StrategyCSV, StrategyParquet
+from datapipes.factory import Factory
+from conftest import config, csv_output, csv_source, run
+
+
+@Factory.register('test_partitions_passthrough')
+class Passthrough:
+    def update(self, subject):
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data']
+        self.notify()
+
+
+@pytest.fixture
+def regions(tmp_path):
+    data = pd.DataFrame({'a': range(10), 'region': ['eu', 'us'] * 5})
+    data.to_csv(tmp_path / 'src.csv', index=False)
+    return data
+
+
+def partitioned_config(tmp_path, output):
+    return config({'src': csv_source(tmp_path, 'src', ['test_partitions_passthrough'], chunksize=4)},
+                  {'test_partitions_passthrough': {'observers': ['out']}},
+                  {'out': output})
+
+
+def files(directory):
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, names in os.walk(directory) for name in names)
+
+
+def test_csv_partitions_are_hive_directories_read_back_with_their_columns(tmp_path, regions):
+    run(partitioned_config(tmp_path, csv_output(tmp_path / 'out', 'regions', partition_by='region', partition_rows=1)))
+
+    # three chunks of 4, 4 and 2 rows, split by region and then into files of at most one row
+    layout = files(tmp_path / 'out' / 'regions')
+    assert len(layout) == 10
+    assert {os.path.dirname(name) for name in layout} == {'region=eu', 'region=us'}
+    assert 'region=eu/part-00002-00000.csv' in layout
+    assert 'region' not in pd.read_csv(tmp_path / 'out' / 'regions' / 'region=eu' / 'part-00000-00000.csv')
+
+    _, data = next(iter(StrategyCSV(key='regions', path=str(tmp_path / 'out')).load()))
+    pd.testing.assert_frame_equal(data.sort_values('a', ignore_index=True), regions)
+
+
+def test_csv_partition_glob_reads_only_its_partition(tmp_path, regions):
+    run(partitioned_config(tmp_path, csv_output(tmp_path / 'out', 'regions', partition_by='region')))
+
+    _, data = next(iter(StrategyCSV(key='regions', path=str(tmp_path / 'out'), glob='regions/region=us/*.csv').load()))
+    assert sorted(data['a']) == [1, 3, 5, 7, 9]
+    assert set(data['region']) == {'us'}
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+def test_a_partitioned_run_overwrites_and_its_chunks_append(tmp_path, regions, output_format):
+    if output_format == 'parquet':
+        pytest.importorskip('pyarrow')
+    output = {'format': output_format, 'key': 'regions', 'path': str(tmp_path / 'out'), 'partition_by': ['region']}
+    stale = tmp_path / 'out' / 'regions' / 'region=eu' / 'stale.csv'
+    stale.parent.mkdir(parents=True)
+    stale.write_text('a\n100\n')
+
+    cfg = partitioned_config(tmp_path, output)
+    run(cfg)
+    run(cfg)
+
+    assert not stale.exists()
+    strategy = {'csv': StrategyCSV, 'parquet': StrategyParquet}[output_format]
+    _, data = next(iter(strategy(key='regions', path=str(tmp_path / 'out')).load()))
+    assert sorted(data['a']) == list(range(10))
+    assert sorted(data.loc[data['region'].astype(str) == 'eu', 'a']) == [0, 2, 4, 6, 8]
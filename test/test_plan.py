@@ -0,0 +1,73 @@
+import os
+
+import pytest
+import yaml
+
+from datapipes import plan, run as run_module
+from datapipes.factory import Factory
+from datapipes.run import DataSpigot
+from conftest import config, csv_output, csv_source, read_output
+
+
+@Factory.register('test_plan_double')
+class Double:
+    def update(self, subject):
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data'] * 2
+        self.notify()
+
+
+def write_config(tmp_path, frame, algorithms=None):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_plan_double'])},
+                 algorithms or {'test_plan_double': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'out', 'out')})
+    path = tmp_path / 'config.yml'
+    path.write_text(yaml.safe_dump(cfg))
+    return str(path)
+
+
+def test_plan_is_cached_next_to_the_config(tmp_path, frame, monkeypatch):
+    path = write_config(tmp_path, frame)
+    monkeypatch.chdir(tmp_path.parent)
+    compiled = plan.compile_config(path)
+    assert os.listdir(tmp_path / plan.PLAN_CACHE) == [f'{compiled.key}.plan']
+    assert compiled.runs['r1'].order == ('src', 'test_plan_double', 'out')
+
+    monkeypatch.setattr(plan, 'parse', lambda path: pytest.fail('a cached plan was parsed again'))
+    assert plan.compile_config(path).key == compiled.key
+
+
+def test_runs_are_built_from_the_plan(tmp_path, frame, monkeypatch):
+    path = write_config(tmp_path, frame)
+    spigot = DataSpigot(path)
+    monkeypatch.setattr(run_module, 'run_edges', lambda run_cfg: pytest.fail('the graph was derived again'))
+    spigot.on()
+    assert read_output(tmp_path / 'out', 'out').a.tolist() == [2 * a for a in frame.a]
+
+
+def test_check_reports_cycles_and_dangling_observers(tmp_path, frame, capsys):
+    path = write_config(tmp_path, frame, {'test_plan_double': {'observers': ['test_plan_double', 'missing']}})
+    problems = plan.check(path)
+    assert any("observes 'missing'" in problem for problem in problems)
+
+    path = write_config(tmp_path, frame, {'test_plan_double': {'observers': ['test_plan_double']}})
+    problems = plan.check(path)
+    assert any('cycle' in problem for problem in problems)
+    with pytest.raises(plan.ConfigurationError):
+        DataSpigot(path)
+
+
+def test_a_cache_that_cannot_be_written_or_read_is_skipped(tmp_path, frame, monkeypatch):
+    path = write_config(tmp_path, frame)
+
+    def read_only(*args, **kwargs):
+        raise PermissionError(13, 'Permission denied', args[0])
+
+    with monkeypatch.context() as patched:
+        patched.setattr(plan.os, 'makedirs', read_only)
+        assert plan.compile_config(path).runs['r1'].order == ('src', 'test_plan_double', 'out')
+    assert not os.path.exists(tmp_path / plan.PLAN_CACHE)
+
+    compiled = plan.compile_config(path)
+    (tmp_path / plan.PLAN_CACHE / f'{compiled.key}.plan').write_bytes(b'not a pickle')
+    assert plan.compile_config(path).runs['r1'].order == ('src', 'test_plan_double', 'out')
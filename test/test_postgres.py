@@ -0,0 +1,165 @@
+"""
+The Postgres strategy against a real server: set DATAPIPES_TEST_POSTGRES to a libpq connection string of a scratch
+database to run these, e.g. DATAPIPES_TEST_POSTGRES='dbname=datapipes_test user=postgres'.
+"""
+import os, threading, uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from datapipes import dataio
+from datapipes.dataio import StrategyPostgres
+
+DSN = os.environ.get('DATAPIPES_TEST_POSTGRES')
+needs_server = pytest.mark.skipif(not DSN, reason='set DATAPIPES_TEST_POSTGRES to run against a Postgres server')
+
+
+class FakePool:
+    opened = 0
+
+    def __init__(self, minconn, maxconn, **connect_kwargs):
+        FakePool.opened += 1
+        self.maxconn = maxconn
+        self.connect_kwargs = connect_kwargs
+        self.closed = False
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+        self.copied = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+    def copy_expert(self, statement, buffer):
+        self.copied.append(buffer.getvalue())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.cursor_ = RecordingCursor()
+        self.commits = 0
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_strategies_with_the_same_settings_share_a_pool(monkeypatch):
+    monkeypatch.setattr(dataio.pg_pool, 'ThreadedConnectionPool', FakePool)
+    monkeypatch.setattr(StrategyPostgres, '_POOLS', {})
+    FakePool.opened = 0
+
+    pools = []
+    threads = [threading.Thread(target=lambda: pools.append(StrategyPostgres(key='t', host='db', pool_size=3)._pool()))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    other = StrategyPostgres(key='t', host='elsewhere')._pool()
+
+    assert FakePool.opened == 2
+    assert all(pool is pools[0] for pool in pools)
+    assert pools[0].maxconn == 3 and pools[0].connect_kwargs == {'host': 'db'}
+    assert other is not pools[0]
+
+
+def test_batches_are_copied_and_committed_one_by_one(monkeypatch, frame):
+    connection = RecordingConnection()
+    monkeypatch.setattr(StrategyPostgres, '_pg_connect', contextmanager(lambda self: (yield connection)))
+    strategy = StrategyPostgres(key='public.scores', chunksize=4, upsert_keys=['a'])
+
+    strategy.batch_write(frame)
+
+    assert [len(copied.splitlines()) for copied in connection.cursor_.copied] == [4, 4, 2]
+    # Each upsert batch creates its staging table and merges it; every batch is committed.
+    assert len(connection.cursor_.statements) == 6
+    assert connection.commits == 4
+
+
+@pytest.fixture
+def table():
+    import psycopg2
+    name = f'datapipes_test_{uuid.uuid4().hex[:8]}'
+    with psycopg2.connect(DSN) as conn, conn.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (a integer PRIMARY KEY, b double precision)')
+    yield name
+    with psycopg2.connect(DSN) as conn, conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {name}')
+
+
+def insert(table, frame):
+    import psycopg2
+    with psycopg2.connect(DSN) as conn, conn.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {table} (a, b) VALUES (%s, %s)',
+                           [(int(a), float(b)) for a, b in frame.itertuples(index=False)])
+
+
+def read(table, **options):
+    strategy = StrategyPostgres(key=table, dsn=DSN, **options)
+    return pd.concat([data for _, data in strategy.load()], ignore_index=True).sort_values('a', ignore_index=True)
+
+
+@needs_server
+@pytest.mark.parametrize('read_via', ['cursor', 'copy'])
+def test_reads_stream_in_batches(table, frame, read_via):
+    insert(table, frame)
+    strategy = StrategyPostgres(key=table, dsn=DSN, read_via=read_via, chunksize=4)
+    assert [len(data) for _, data in strategy.load()] == [4, 4, 2]
+    assert read(table, read_via=read_via).equals(frame)
+
+
+@needs_server
+def test_a_query_is_read_instead_of_the_table(table, frame):
+    insert(table, frame)
+    result = read(table, query=f'SELECT a, b FROM {table} WHERE a < 3')
+    assert result.equals(frame.iloc[:3])
+
+
+@needs_server
+@pytest.mark.parametrize('read_via', ['cursor', 'copy'])
+def test_copy_write_then_read(table, frame, read_via):
+    StrategyPostgres(key=table, dsn=DSN, chunksize=3).save(frame)
+    assert read(table, read_via=read_via, chunksize=4).equals(frame)
+
+
+@needs_server
+def test_upsert_updates_existing_keys(table, frame):
+    StrategyPostgres(key=table, dsn=DSN).save(frame)
+    changed = frame.iloc[5:].assign(b=-1.0)
+    new = pd.DataFrame({'a': [10, 11], 'b': [5.0, 5.5]})
+    StrategyPostgres(key=table, dsn=DSN, upsert_keys=['a']).save(pd.concat([changed, new], ignore_index=True))
+
+    result = read(table)
+    assert result['a'].tolist() == list(range(12))
+    assert result['b'].tolist() == frame['b'].tolist()[:5] + [-1.0] * 5 + [5.0, 5.5]
+
+
+@needs_server
+def test_truncate_replaces_the_table(table, frame):
+    StrategyPostgres(key=table, dsn=DSN).save(frame)
+    StrategyPostgres(key=table, dsn=DSN, truncate=True).save(frame.iloc[:3])
+    assert read(table).equals(frame.iloc[:3])
+
+
+def test_provenance_names_the_repository_and_commit(monkeypatch):
+    outputs = {('git', 'rev-parse', '--show-toplevel'): '/home/me/models\n', ('git', 'describe', '--always'): 'abc123\n'}
+    monkeypatch.setattr(dataio.subprocess, 'check_output', lambda command, text: outputs[tuple(command)])
+    rows = []
+    monkeypatch.setattr(StrategyPostgres, '_create_row', lambda self, **row: rows.append(row))
+
+    StrategyPostgres(key='provenance').write_provenance()
+
+    assert rows[0]['name'] == 'models/abc123'
+    assert rows[0]['VERSION'] == 'abc123'
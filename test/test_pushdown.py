@@ -0,0 +1,45 @@
+import pytest
+
+from datapipes.factory import Factory
+from datapipes.run import RunLocal
+from conftest import config, csv_output, csv_source, read_output, run
+
+
+@Factory.register('test_pushdown_low')
+@Factory.register('test_pushdown_high')
+class Passthrough:
+    def update(self, subject):
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data']
+        self.notify()
+
+
+ALGORITHMS = {'test_pushdown_low': {'observers': ['low'], 'filters': [['a', '<', 3]], 'columns': ['b']},
+              'test_pushdown_high': {'observers': ['high'], 'filters': [['a', '>=', 8]], 'columns': ['b']}}
+OUTPUTS = lambda path: {'low': csv_output(path, 'low'), 'high': csv_output(path, 'high')}
+
+
+def test_pushdown_only_into_formats_that_apply_it():
+    observers = {'alg': {'filters': [['a', '<', 3]], 'columns': ['b']}}
+    csv = RunLocal._pushdown({'format': 'csv', 'observers': ['alg']}, observers)
+    parquet = RunLocal._pushdown({'format': 'parquet', 'observers': ['alg']}, observers)
+    memmap = RunLocal._pushdown({'format': 'memmap', 'observers': ['alg']}, observers)
+
+    assert csv == {'format': 'csv', 'observers': ['alg'], 'columns': ['b', 'a']}
+    assert parquet['filters'] == [[['a', '<', 3]]] and parquet['columns'] == ['b', 'a']
+    assert memmap == {'format': 'memmap', 'observers': ['alg']}
+
+
+@pytest.mark.parametrize('source_format', ['csv', 'parquet'])
+def test_each_observer_receives_only_its_rows(tmp_path, frame, source_format):
+    if source_format == 'parquet':
+        pytest.importorskip('pyarrow')
+        frame.to_parquet(tmp_path / 'src.parquet')
+        source = {'format': 'parquet', 'key': 'src', 'path': str(tmp_path), 'observers': list(ALGORITHMS)}
+    else:
+        frame.to_csv(tmp_path / 'src.csv', index=False)
+        source = csv_source(tmp_path, 'src', list(ALGORITHMS))
+
+    run(config({'src': source}, ALGORITHMS, OUTPUTS(tmp_path / 'out')))
+
+    assert read_output(tmp_path / 'out', 'low').a.tolist() == [0, 1, 2]
+    assert read_output(tmp_path / 'out', 'high').a.tolist() == [8, 9]
@@ -0,0 +1,57 @@
+import threading, time
+
+import pytest
+
+from datapipes._utilities.utilities import topological_order
+from datapipes.observer import PubSub
+from datapipes.scheduler import DagScheduler
+
+
+class Source:
+    def __init__(self, messages):
+        self.PubSub = PubSub()
+        self.messages = messages
+
+    def on(self):
+        for i in range(self.messages):
+            self.PubSub.pubsub_message = {'data': i}
+            self.PubSub.notify()
+
+
+class Slow:
+    def __init__(self, scheduler_ref):
+        self.PubSub = PubSub()
+        self.seen = []
+        self.max_pending = 0
+        self._scheduler_ref = scheduler_ref
+
+    def update(self, subject):
+        time.sleep(0.002)
+        pending = self._scheduler_ref[0]._nodes['slow'].pending
+        self.max_pending = max(self.max_pending, len(pending))
+        self.seen.append(subject.pubsub_message['data'])
+
+
+@pytest.mark.parametrize('max_workers', [1, None])
+def test_a_fast_source_waits_for_a_slow_node(max_workers):
+    scheduler_ref = []
+    source, slow = Source(100), Slow(scheduler_ref)
+    source.PubSub.attach(slow)
+    graph = {'sources': {'src': source}, 'algorithms': {'slow': slow}, 'outputs': {}, 'edges': [('src', 'slow')]}
+
+    scheduler = DagScheduler(graph, 'thread', max_workers, queue_size=2)
+    scheduler_ref.append(scheduler)
+    runner = threading.Thread(target=scheduler.run)
+    runner.start()
+    runner.join(timeout=30)
+
+    assert not runner.is_alive()
+    assert slow.seen == list(range(100))
+    assert slow.max_pending <= 2
+
+
+def test_cycle_error_names_only_the_cycle():
+    edges = [('src', 'a'), ('a', 'b'), ('b', 'a'), ('b', 'downstream'), ('downstream', 'out')]
+    with pytest.raises(ValueError) as error:
+        topological_order(['src', 'a', 'b', 'downstream', 'out'], edges)
+    assert str(error.value).endswith("['a', 'b']")
@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pytest
+
+from datapipes.dataio import StrategyCSV
+
+
+@pytest.fixture
+def shards(tmp_path, frame):
+    """ The frame split over three files of a directory, one of them in a subdirectory. """
+    for name, start in (('day1', 0), ('day2', 4), (os.path.join('late', 'day3'), 8)):
+        os.makedirs(tmp_path / 'daily' / os.path.dirname(name), exist_ok=True)
+        frame.iloc[start:start + 4].to_csv(tmp_path / 'daily' / f'{name}.csv', index=False)
+    return tmp_path
+
+
+def test_concat_reads_a_directory_as_one_frame(shards, frame):
+    chunks = list(StrategyCSV(key='daily', path=str(shards), read_workers=3).load())
+
+    assert len(chunks) == 1
+    key, data = chunks[0]
+    assert key == 'daily'
+    pd.testing.assert_frame_equal(data, frame)
+    assert [(os.path.basename(entry['file']), entry['rows'], entry['first_row']) for entry in data.attrs['files']] == \
+        [('day1.csv', 4, 0), ('day2.csv', 4, 4), ('day3.csv', 2, 8)]
+
+
+def test_each_publishes_one_frame_per_file_in_order(shards, frame):
+    chunks = list(StrategyCSV(key='daily', path=str(shards), shard_mode='each', read_workers=1).load())
+
+    assert [len(data) for _, data in chunks] == [4, 4, 2]
+    pd.testing.assert_frame_equal(pd.concat([data for _, data in chunks], ignore_index=True), frame)
+
+
+def test_glob_and_file_column(shards):
+    strategy = StrategyCSV(key='daily', path=str(shards), glob='daily/day*.csv', file_column='file')
+    _, data = next(iter(strategy.load()))
+
+    assert data['a'].tolist() == list(range(8))
+    assert sorted({os.path.basename(name) for name in data['file']}) == ['day1.csv', 'day2.csv']
+
+
+def test_unknown_shard_mode(tmp_path):
+    with pytest.raises(NotImplementedError, match='Shard mode'):
+        StrategyCSV(key='daily', path=str(tmp_path), shard_mode='zip')
+
+
+def test_an_empty_glob(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(StrategyCSV(key='daily', path=str(tmp_path), glob='daily/*.csv').load())
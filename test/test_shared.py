@@ -0,0 +1,165 @@
+import glob, os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datapipes._utilities import shared
+from datapipes.factory import Factory
+from conftest import config, csv_output, csv_source, read_output, run
+
+
+def mixed():
+    rows = 6
+    return pd.DataFrame({'x': np.arange(rows, dtype=float),
+                         'tz': pd.date_range('2024-03-09', periods=rows, freq='12h', tz='US/Eastern'),
+                         'naive': pd.date_range('2024-03-09', periods=rows, freq='12h'),
+                         'category': pd.Categorical(list('abcabc')),
+                         'nullable': pd.array([1, None, 3, 4, None, 6], dtype='Int64'),
+                         'flag': pd.array([True, None, False, True, False, None], dtype='boolean'),
+                         'text': list('uvwxyz')})
+
+
+def dev_shm_segments():
+    return set(glob.glob('/dev/shm/dp_*'))
+
+
+@pytest.mark.parametrize('index', [None,
+                                   pd.date_range('2024-01-01', periods=6, tz='Europe/Amsterdam', name='when'),
+                                   pd.date_range('2024-01-01', periods=6, name='when'),
+                                   pd.CategoricalIndex(list('pqrstu'), name='label'),
+                                   pd.Index([10, 20, 30, 40, 50, 60], name='id')],
+                         ids=['range', 'tz', 'naive', 'categorical', 'int'])
+def test_round_trip_keeps_every_dtype_and_the_index(index):
+    frame = mixed() if index is None else mixed().set_axis(index)
+    handle = shared.share(frame)
+    try:
+        # A shared DatetimeIndex comes back without its freq, which is not part of the data.
+        pd.testing.assert_frame_equal(shared.attach(handle), frame, check_freq=False)
+        pd.testing.assert_frame_equal(shared.attach(handle.partition(2, 5)), frame.iloc[2:5], check_freq=False)
+    finally:
+        shared.release(handle)
+
+
+def test_numpy_columns_are_views_of_the_segment():
+    handle = shared.share(mixed())
+    try:
+        assert [place is not None for place in handle.buffers] == [True, False, True, False, False, False, False]
+        frame = shared.attach(handle)
+        assert not frame['x'].to_numpy().flags.owndata
+    finally:
+        shared.release(handle)
+
+
+def _attach_in_worker(handle):
+    return shared.attach(handle)
+
+
+def test_round_trip_across_processes():
+    shared.prepare()
+    frame = mixed()
+    handle = shared.share(frame)
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            pd.testing.assert_frame_equal(pool.submit(_attach_in_worker, handle).result(), frame)
+    finally:
+        shared.release(handle)
+
+
+def test_segments_are_unlinked_by_the_last_release_or_by_take():
+    handle = shared.share(mixed(), readers=2)
+    shared.release(handle)
+    shared_memory.SharedMemory(name=handle.name).close()  # still there for the second reader
+    shared.release(handle)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle.name)
+
+    handed_over = shared.share(mixed(), readers=0)
+    taken = shared.take(handed_over)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handed_over.name)
+    pd.testing.assert_frame_equal(taken, mixed())
+
+
+@Factory.register('test_shared_stamp')
+class Stamp:
+    def update(self, subject):
+        data = subject.pubsub_message['data'].copy()
+        data['tz'] = pd.date_range('2024-03-09', periods=len(data), freq='h', tz='US/Eastern')
+        self.PubSub.pubsub_message['data'] = data
+        self.notify()
+
+
+@Factory.register('test_shared_describe')
+class Describe:
+    def update(self, subject):
+        data = subject.pubsub_message['data'].copy()
+        data['tz_dtype'] = str(data['tz'].dtype)
+        data['tz_hour'] = data['tz'].dt.hour
+        self.PubSub.pubsub_message['data'] = data
+        self.notify()
+
+
+def test_process_executor_keeps_timezones(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    before = dev_shm_segments()
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_shared_stamp'])},
+                 {'test_shared_stamp': {'observers': ['test_shared_describe']},
+                  'test_shared_describe': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'out', 'out')},
+                 executor='process', max_workers=1, shared_memory={'min_bytes': 0})
+    try:
+        run(cfg)
+    finally:
+        shared.configure()
+
+    out = read_output(tmp_path / 'out', 'out')
+    assert set(out['tz_dtype']) == {'datetime64[ns, US/Eastern]'}
+    assert out['tz_hour'].tolist() == list(range(10))
+    assert not shared._owned
+    assert dev_shm_segments() <= before
+
+
+@Factory.register('test_shared_scale', partitionable=True)
+class Scale:
+    def update(self, subject):
+        data = subject.pubsub_message['data']
+        self.PubSub.pubsub_message['data'] = data.assign(c=data['a'] * 3 + data['b'], tz=data['a'].map(
+            lambda hours: pd.Timestamp('2024-01-01', tz='UTC') + pd.Timedelta(hours=hours)))
+        self.PubSub.pubsub_message['topic'] = 'scaled'
+        self.notify()
+
+
+@Factory.register('test_shared_sum')
+class Sum:
+    def map_partition(self, data):
+        return data.assign(total=data['a'] + data['b'])
+
+    def update(self, subject):
+        self.PubSub.pubsub_message['data'] = self.map_partition(subject.pubsub_message['data'])
+        self.notify()
+
+
+@pytest.mark.parametrize('algorithm', ['test_shared_scale', 'test_shared_sum'])
+def test_partitioned_results_match_the_whole_run(tmp_path, algorithm):
+    frame = pd.DataFrame({'a': range(1000), 'b': [float(i) / 4 for i in range(1000)]})
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    before = dev_shm_segments()
+
+    def run_with(key, **settings):
+        run(config({'src': csv_source(tmp_path, 'src', [algorithm])}, {algorithm: {'observers': [key]}},
+                   {key: csv_output(tmp_path / key, key)}, shared_memory={'min_bytes': 0}, **settings))
+        return read_output(tmp_path / key, key)
+
+    try:
+        whole = run_with('whole', partition={'workers': 1})
+        split = run_with('split', partition={'workers': 3, 'min_rows': 10})
+    finally:
+        shared.configure()
+
+    pd.testing.assert_frame_equal(split, whole)
+    assert len(split) == 1000
+    assert not shared._owned
+    assert dev_shm_segments() <= before
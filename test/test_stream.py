@@ -0,0 +1,79 @@
+import threading, time
+
+import pytest
+
+from datapipes.factory import Factory
+from datapipes.run import RunLocal
+from conftest import config, csv_output, csv_source, read_output, run
+
+
+@Factory.register('test_stream_double')
+class Double:
+    def update(self, subject):
+        data = subject.pubsub_message['data'].copy()
+        data['b'] = data['b'] * 2
+        self.PubSub.pubsub_message['data'] = data
+        self.notify()
+
+
+@Factory.register('test_stream_slow')
+class Slow:
+    def update(self, subject):
+        time.sleep(0.01)
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data']
+        self.notify()
+
+
+@Factory.register('test_stream_fail')
+class Fail:
+    def update(self, subject):
+        if subject.pubsub_message['data']['a'].iloc[0] >= 4:
+            raise ValueError('bad chunk')
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data']
+        self.notify()
+
+
+def chain(tmp_path, out, first, **settings):
+    """ src -> first -> test_stream_double -> out, read in chunks of 2 rows. """
+    return config({'src': csv_source(tmp_path, 'src', [first], chunksize=2)},
+                  {first: {'observers': ['test_stream_double']}, 'test_stream_double': {'observers': ['out']}},
+                  {'out': csv_output(tmp_path / out, 'out')}, **settings)
+
+
+def test_stream_output_matches_batch(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    run(chain(tmp_path, 'batch', 'test_stream_slow'))
+    run(chain(tmp_path, 'stream', 'test_stream_slow', data_mode='stream'))
+
+    assert read_output(tmp_path / 'stream', 'out').equals(read_output(tmp_path / 'batch', 'out'))
+    assert read_output(tmp_path / 'stream', 'out')['b'].tolist() == [b * 2 for b in frame['b']]
+
+
+def test_queues_stay_bounded(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = chain(tmp_path, 'out', 'test_stream_slow', data_mode='stream', stream={'queue_size': 1})
+    cfg['independent_runs']['r1']['data_sources']['src']['chunksize'] = 1
+
+    stats = RunLocal(cfg)._handle_stream(cfg['independent_runs']['r1'], 'r1')
+
+    assert stats['src']['messages'] == 10
+    assert all(stage['max_queue_depth'] <= 1 for stage in stats.values())
+    assert stats['test_stream_slow']['blocked_seconds'] > 0  # the source waited on the slow stage
+
+
+def test_a_failing_stage_raises_instead_of_hanging(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    errors = []
+
+    def execute():
+        try:
+            run(chain(tmp_path, 'out', 'test_stream_fail', data_mode='stream', stream={'queue_size': 1}))
+        except Exception as error:
+            errors.append(error)
+
+    runner = threading.Thread(target=execute, daemon=True)
+    runner.start()
+    runner.join(timeout=30)
+
+    assert not runner.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)
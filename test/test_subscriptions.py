@@ -0,0 +1,108 @@
+from datapipes.factory import Factory
+from datapipes.observer import PubSub
+from conftest import config, csv_output, csv_source, read_output, run
+
+CALLS = []
+
+
+@Factory.register('test_sub_tagger')
+class Tagger:
+    """ Publishes the even rows under topic 'even' and the odd rows under topic 'odd'. """
+    def update(self, subject):
+        CALLS.append(1)
+        data = subject.pubsub_message['data']
+        for topic, remainder in (('even', 0), ('odd', 1)):
+            self.PubSub.pubsub_message['topic'] = topic
+            self.PubSub.pubsub_message['data'] = data[data.a % 2 == remainder]
+            self.notify()
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+
+    def update(self, subject):
+        self.messages.append(dict(subject.pubsub_message))
+
+
+def publisher(data, topic=None):
+    pubsub = PubSub()
+    pubsub.pubsub_message = {'data': data, 'topic': topic}
+    return pubsub
+
+
+def test_topic_routing(frame):
+    pubsub = publisher(frame, 'x')
+    on_x, on_y, on_all = Recorder(), Recorder(), Recorder()
+    pubsub.attach(on_x, topic='x')
+    pubsub.attach(on_y, topic=['y', 'z'])
+    pubsub.attach(on_all)
+
+    pubsub.notify()
+    pubsub.pubsub_message['topic'] = 'z'
+    pubsub.notify()
+
+    assert [m['topic'] for m in on_x.messages] == ['x']
+    assert [m['topic'] for m in on_y.messages] == ['z']
+    assert [m['topic'] for m in on_all.messages] == ['x', 'z']
+
+
+def test_where_and_columns_slice_the_data(frame):
+    pubsub = publisher(frame)
+    query, filters, none_match = Recorder(), Recorder(), Recorder()
+    pubsub.attach(query, where='a >= 7', columns=['a'])
+    pubsub.attach(filters, where=[[('a', '<', 2)], [('a', 'in', [5])]])
+    pubsub.attach(none_match, where='a > 100')
+
+    pubsub.notify()
+
+    assert query.messages[0]['data'].to_dict('list') == {'a': [7, 8, 9]}
+    assert filters.messages[0]['data'].a.tolist() == [0, 1, 5]
+    assert list(filters.messages[0]['data'].columns) == ['a', 'b']
+    assert none_match.messages == []
+    assert pubsub.pubsub_message['data'] is frame
+
+
+def test_shared_filter_is_evaluated_once(frame):
+    calls = []
+
+    def where(data):
+        calls.append(1)
+        return data.a > 4
+
+    pubsub = publisher(frame)
+    observers = [Recorder() for _ in range(3)]
+    for observer in observers:
+        pubsub.attach(observer, where=where)
+    pubsub.notify()
+
+    assert len(calls) == 1
+    assert all(observer.messages[0]['data'].a.tolist() == [5, 6, 7, 8, 9] for observer in observers)
+
+
+def test_replace_keeps_the_subscription(frame):
+    pubsub = publisher(frame, 'y')
+    old, new = Recorder(), Recorder()
+    pubsub.attach(old, topic='x')
+    pubsub.replace(old, new)
+    pubsub.notify()
+    assert new.messages == []
+
+
+def test_cached_topics_are_published_again(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_sub_tagger'])},
+                 {'test_sub_tagger': {'observers': ['even', 'odd']}},
+                 {'even': csv_output(tmp_path / 'out', 'even', subscribe={'topic': 'even'}),
+                  'odd': csv_output(tmp_path / 'out', 'odd', subscribe={'topic': 'odd', 'where': 'a > 4'})},
+                 cache={'path': str(tmp_path / 'cache')})
+    CALLS.clear()
+
+    for attempt in range(2):
+        for output in ('even', 'odd'):
+            (tmp_path / 'out' / f'{output}.csv').unlink(missing_ok=True)
+        run(cfg)
+        assert read_output(tmp_path / 'out', 'even').a.tolist() == [0, 2, 4, 6, 8]
+        assert read_output(tmp_path / 'out', 'odd').a.tolist() == [5, 7, 9]
+
+    assert len(CALLS) == 1  # the second run was a cache hit
@@ -0,0 +1,28 @@
+import json
+
+from datapipes.factory import Factory
+from conftest import config, csv_output, csv_source, run
+
+
+@Factory.register('test_trace_passthrough')
+class Passthrough:
+    def update(self, subject):
+        self.PubSub.pubsub_message['data'] = subject.pubsub_message['data']
+        self.notify()
+
+
+def test_spans_are_counted_once_per_chunk(tmp_path, frame):
+    frame.to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_trace_passthrough'], chunksize=4)},
+                 {'test_trace_passthrough': {'observers': ['out']}},
+                 {'out': csv_output(tmp_path / 'out', 'out')},
+                 trace={'path': str(tmp_path / 'traces')})
+    run(cfg)
+
+    with open(tmp_path / 'traces' / 'r1.trace.json') as fp:
+        trace = json.load(fp)
+    calls = {name: node['calls'] for name, node in trace['summary'].items()}
+    assert calls == {'src': 3, 'test_trace_passthrough': 3, 'out': 3}
+    assert trace['summary']['src']['rows_out'] == 10
+    spans = [event['name'] for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert sorted(spans) == sorted(['src', 'test_trace_passthrough', 'out'] * 3)
@@ -0,0 +1,90 @@
+import importlib, logging, sys
+
+import pandas as pd
+
+from datapipes._utilities.logger import LOGGER_NAME
+from datapipes.factory import Factory
+from datapipes.run import RunLocal
+from datapipes.watch import Watcher, _WatchedRun
+from conftest import config, csv_output, csv_source, read_output
+
+
+@Factory.register('test_watch_total')
+class Total:
+    def update(self, subject):
+        self.PubSub.pubsub_message['data'] = pd.DataFrame({'total': [int(subject.pubsub_message['data'].a.sum())]})
+        self.notify()
+
+
+def started(cfg) -> Watcher:
+    """ A Watcher that ran the config once and recorded its files, as Watcher.watch does before polling. """
+    watcher = Watcher(RunLocal(cfg))
+    for key, run_cfg in cfg['independent_runs'].items():
+        watcher._runs[key] = _WatchedRun(watcher._runner, run_cfg)
+        watcher._execute(key)
+    assert watcher._changed_files() == {}
+    return watcher
+
+
+def poll(watcher: Watcher) -> dict:
+    changed = watcher._changed_files()
+    if changed:
+        watcher._rerun(changed)
+    return changed
+
+
+def test_added_and_removed_shards_rerun(tmp_path):
+    shards = tmp_path / 'src'
+    shards.mkdir()
+    pd.DataFrame({'a': [1, 2]}).to_csv(shards / 'part-0.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_watch_total'])},
+                 {'test_watch_total': {'observers': ['total']}},
+                 {'total': csv_output(tmp_path / 'out', 'total')})
+    watcher = started(cfg)
+    assert read_output(tmp_path / 'out', 'total').total.tolist() == [3]
+    assert poll(watcher) == {}
+
+    pd.DataFrame({'a': [10]}).to_csv(shards / 'part-1.csv', index=False)
+    assert list(poll(watcher)) == [str(shards / 'part-1.csv')]
+    assert read_output(tmp_path / 'out', 'total').total.tolist() == [13]
+
+    (shards / 'part-0.csv').unlink()
+    assert list(poll(watcher)) == [str(shards / 'part-0.csv')]
+    assert read_output(tmp_path / 'out', 'total').total.tolist() == [10]
+    assert poll(watcher) == {}
+
+
+def test_edited_input_reruns(tmp_path):
+    pd.DataFrame({'a': [1, 2]}).to_csv(tmp_path / 'src.csv', index=False)
+    cfg = config({'src': csv_source(tmp_path, 'src', ['test_watch_total'])},
+                 {'test_watch_total': {'observers': ['total']}},
+                 {'total': csv_output(tmp_path / 'out', 'total')})
+    watcher = started(cfg)
+
+    pd.DataFrame({'a': [5, 6]}).to_csv(tmp_path / 'src.csv', index=False)
+    assert list(poll(watcher)) == [str(tmp_path / 'src.csv')]
+    assert read_output(tmp_path / 'out', 'total').total.tolist() == [11]
+
+
+def test_reloading_a_module_reregisters_quietly(tmp_path, monkeypatch):
+    (tmp_path / 'test_watch_plugin.py').write_text(
+        "from datapipes.factory import Factory\n\n"
+        "@Factory.register('test_watch_plugin')\n"
+        "class Plugin:\n"
+        "    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('test_watch_plugin')
+
+    records = []
+    handler = logging.Handler(logging.CRITICAL)
+    handler.emit = records.append
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.addHandler(handler)
+    try:
+        importlib.reload(module)
+    finally:
+        logger.removeHandler(handler)
+        sys.modules.pop('test_watch_plugin', None)
+
+    assert records == []
+    assert Factory.registered()['test_watch_plugin'] is module.Plugin